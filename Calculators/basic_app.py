@@ -1,4 +1,9 @@
 import tkinter as tk
+from calc_backends import NAMES, get_backend
+from calc_engine import evaluate
+from calc_history import HistoryStore
+
+DECIMAL_PRECISION = 50
 
 # Create the main window
 root = tk.Tk()
@@ -10,13 +15,76 @@ root.resizable(False, False)
 entry = tk.Entry(root, font=("Arial", 20), borderwidth=2, relief="solid", justify="right")
 entry.pack(fill="both", ipadx=8, ipady=15, padx=10, pady=10)
 
+# Numeric mode: float, decimal or exact fraction
+mode_var = tk.StringVar(value="float")
+tk.OptionMenu(root, mode_var, *NAMES).pack(anchor="e", padx=10)
+
+# Calculation history, kept across sessions; the calculator works without
+# it if the log can't be read or written (read-only home, full disk)
+try:
+    history = HistoryStore()
+except OSError:
+    history = None
+recall_pos = -1
+completion = None  # [text completed, past expressions starting with it, position]
+
+# Evaluate, reusing the stored result for expressions seen before
+def calculate(text):
+    mode = mode_var.get()
+    result = None if history is None else history.lookup(text, mode)
+    if result is None:
+        result = evaluate(text, get_backend(mode, DECIMAL_PRECISION))
+    if history is not None:
+        try:
+            history.record(text, result, mode)
+        except OSError:
+            pass
+    return result
+
+# Step through past expressions (Up = older, Down = newer)
+def recall(step):
+    global recall_pos
+    pos = recall_pos + step
+    if pos < 0 or history is None:
+        return
+    try:
+        entries = history.recent(pos + 1)
+    except OSError:
+        return
+    if len(entries) <= pos:
+        return
+    recall_pos = pos
+    entry.delete(0, tk.END)
+    entry.insert(0, entries[pos][2])
+
+# Complete to a past expression starting with what is typed (Tab again for the next)
+def complete(event=None):
+    global completion
+    text = entry.get()
+    if history is None:
+        return "break"
+    if completion is None or completion[1][completion[2]] != text:
+        try:
+            matches = history.search(text)
+        except OSError:
+            return "break"
+        if not matches:
+            return "break"
+        completion = [text, matches, -1]
+    completion[2] = (completion[2] + 1) % len(completion[1])
+    entry.delete(0, tk.END)
+    entry.insert(0, completion[1][completion[2]])
+    return "break"
+
 # Function to handle button click
 def on_click(symbol):
+    global recall_pos
+    recall_pos = -1
     if symbol == "C":
         entry.delete(0, tk.END)
     elif symbol == "=":
         try:
-            result = eval(entry.get())
+            result = calculate(entry.get())
             entry.delete(0, tk.END)
             entry.insert(0, str(result))
         except:
@@ -50,5 +118,9 @@ for i in range(5):  # 5 rows
 for j in range(4):  # 4 columns
     button_frame.columnconfigure(j, weight=1)
 
+root.bind("<Up>", lambda event: recall(1))
+root.bind("<Down>", lambda event: recall(-1))
+root.bind("<Tab>", complete)
+
 # Start the GUI loop
 root.mainloop()
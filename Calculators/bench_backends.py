@@ -0,0 +1,54 @@
+import random
+import time
+from fractions import Fraction
+
+from calc_backends import get_backend
+from calc_engine import compile_expr, evaluate
+
+# Benchmark: cost of each numeric backend on long chained expressions,
+# with integer-only and mixed (division / decimal literal) input, and how
+# far each result drifts from the exact answer.
+# Run: python bench_backends.py [terms]
+
+BACKENDS = [("float", 28), ("decimal", 28), ("decimal", 100), ("fraction", 28)]
+
+
+def make_chain(terms, integer_only, seed=1):
+    rng = random.Random(seed)
+    ops = ["+", "-", "*"] if integer_only else ["+", "-", "*", "/"]
+    parts = [str(rng.randint(1, 9))]
+    for _ in range(terms - 1):
+        op = rng.choice(ops)
+        parts.append(op)
+        if integer_only or rng.random() < 0.5:
+            parts.append(str(rng.randint(1, 9)))
+        else:
+            parts.append(f"{rng.randint(1, 9)}.{rng.randint(1, 9)}")
+    return "".join(parts)
+
+
+def drift(value, exact):
+    if exact == 0:
+        return abs(Fraction(value))
+    return abs((Fraction(value) - exact) / exact)
+
+
+def main(terms=2000, repeat=20):
+    for integer_only in (True, False):
+        text = make_chain(terms, integer_only)
+        exact = evaluate(text, get_backend("fraction"))
+        print(f"\n{'integer-only' if integer_only else 'mixed'} chain, {terms} terms")
+        for name, precision in BACKENDS:
+            backend = get_backend(name, precision)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                compile_expr.cache_clear()
+                value = evaluate(text, backend)
+            elapsed = (time.perf_counter() - start) / repeat
+            label = f"{name} (prec {precision})" if name == "decimal" else name
+            print(f"  {label:<20}{elapsed * 1000:>10.2f} ms   rel. error {float(drift(value, exact)):.3e}")
+
+
+if __name__ == "__main__":
+    import sys
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
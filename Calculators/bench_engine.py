@@ -0,0 +1,47 @@
+import random
+import time
+
+from calc_engine import compile_expr, evaluate
+
+# Benchmark: calc_engine.evaluate vs the old eval() path.
+# Run: python bench_engine.py [count]
+
+OPS = ["+", "-", "*", "/", "%"]
+
+
+def make_expressions(count, terms=8, seed=1):
+    rng = random.Random(seed)
+    exprs = []
+    for _ in range(count):
+        parts = [str(rng.randint(1, 999))]
+        for _ in range(terms - 1):
+            parts.append(rng.choice(OPS))
+            parts.append(str(rng.randint(1, 999)) if rng.random() < 0.7 else f"{rng.uniform(1, 99):.3f}")
+        exprs.append("".join(parts))
+    return exprs
+
+
+def run(label, fn, exprs):
+    start = time.perf_counter()
+    for e in exprs:
+        fn(e)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{len(exprs) / elapsed:>14,.0f} expr/s")
+    return elapsed
+
+
+def main(count=20000):
+    unique = make_expressions(count)
+    repeated = make_expressions(200) * (count // 200)
+
+    run("eval (unique)", eval, unique)
+    compile_expr.cache_clear()
+    run("engine (unique, cold)", evaluate, unique)
+    run("eval (repeated)", eval, repeated)
+    compile_expr.cache_clear()
+    run("engine (repeated, cached)", evaluate, repeated)
+
+
+if __name__ == "__main__":
+    import sys
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,63 @@
+import random
+import time
+
+from calc_engine import compile_expr, evaluate
+from calc_live import LiveExpression
+
+# Benchmark: per-keystroke latency of the live preview as the expression
+# grows, against re-evaluating the whole expression on every key.
+# Run: python bench_live.py
+
+SIZES = (100, 1000, 5000)
+WINDOW = 200  # keystrokes timed at the end of each expression
+
+
+def make_keys(tokens, seed=1):
+    rng = random.Random(seed)
+    parts = [str(rng.randint(1, 99))]
+    for _ in range(tokens // 2):
+        parts.append(rng.choice("+-*/"))
+        parts.append(str(rng.randint(1, 99)))
+    return "".join(parts)
+
+
+def time_live(keys):
+    live = LiveExpression()
+    live.push(keys[:-WINDOW])
+    start = time.perf_counter()
+    for key in keys[-WINDOW:]:
+        live.push(key)
+        live.preview()
+    typing = (time.perf_counter() - start) / WINDOW
+    start = time.perf_counter()
+    for _ in range(WINDOW):
+        live.backspace()
+        live.preview()
+    deleting = (time.perf_counter() - start) / WINDOW
+    return typing, deleting
+
+
+def time_full(keys):
+    prefix = keys[:-WINDOW]
+    start = time.perf_counter()
+    for key in keys[-WINDOW:]:
+        prefix += key
+        compile_expr.cache_clear()
+        try:
+            evaluate(prefix)
+        except Exception:
+            pass
+    return (time.perf_counter() - start) / WINDOW
+
+
+def main():
+    print(f"{'tokens':>8}{'live type':>14}{'live delete':>14}{'full re-eval':>16}")
+    for size in SIZES:
+        keys = make_keys(size)
+        typing, deleting = time_live(keys)
+        full = time_full(keys)
+        print(f"{size:>8}{typing * 1e6:>12.1f}us{deleting * 1e6:>12.1f}us{full * 1e6:>14.1f}us")
+
+
+if __name__ == "__main__":
+    main()
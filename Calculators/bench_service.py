@@ -0,0 +1,90 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_engine import make_expressions
+
+# Benchmark: throughput of calc_cli.py and calc_server.py, on cheap
+# expressions and on CPU-heavy ones (products of big integer powers, each
+# under the service's MAX_DIGITS), with and without the worker pool.
+# Fails if any line comes back as an error, so it can't time error messages.
+# Run: python bench_service.py [lines]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKER_COUNTS = (0, 2, 4)
+CLIENTS = 8
+
+
+def heavy_expressions(count):
+    # 16 powers of up to ~4,060 digits multiplied together, then reduced
+    return ["*".join(f"{3 + (i + k) % 9}**{3000 + (i * 7 + k) % 900}" for k in range(16)) + "%1000003"
+            for i in range(count)]
+
+
+def check(results, what):
+    errors = [r for r in results if r.startswith("Error")]
+    if errors:
+        raise SystemExit(f"{what}: {len(errors)} lines failed, e.g. {errors[0]}")
+
+
+def bench_cli(lines, workers, tmp):
+    src = os.path.join(tmp, "input.txt")
+    dst = os.path.join(tmp, "output.txt")
+    with open(src, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(HERE, "calc_cli.py"), src, "-o", dst,
+                    "--workers", str(workers)], check=True)
+    rate = len(lines) / (time.perf_counter() - start)
+    with open(dst) as f:
+        check(f.read().splitlines(), f"cli workers={workers}")
+    return rate
+
+
+async def _client(path, lines):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(("\n".join(lines) + "\n").encode())
+    await writer.drain()
+    results = [(await reader.readline()).decode().rstrip("\n") for _ in lines]
+    writer.close()
+    return results
+
+
+async def _clients(path, lines):
+    share = len(lines) // CLIENTS
+    results = await asyncio.gather(*(_client(path, lines[i * share:(i + 1) * share]) for i in range(CLIENTS)))
+    return [r for part in results for r in part]
+
+
+def bench_server(lines, workers, tmp):
+    path = os.path.join(tmp, "calc.sock")
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "calc_server.py"), "--unix", path,
+                             "--workers", str(workers)], stdout=subprocess.PIPE, text=True)
+    try:
+        proc.stdout.readline()  # "listening" once ready
+        start = time.perf_counter()
+        results = asyncio.run(_clients(path, lines))
+        rate = len(lines) / (time.perf_counter() - start)
+        check(results, f"server workers={workers}")
+        return rate
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(count=100000):
+    workloads = [("cheap", make_expressions(count)), ("heavy", heavy_expressions(count // 100))]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, lines in workloads:
+            print(f"\n{name} expressions ({len(lines)} lines)")
+            for workers in WORKER_COUNTS:
+                cli = bench_cli(lines, workers, tmp)
+                server = bench_server(lines, workers, tmp)
+                print(f"  workers={workers}   cli {cli:>12,.0f} lines/s   server {server:>12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
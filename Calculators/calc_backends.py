@@ -0,0 +1,220 @@
+import decimal
+import math
+import operator
+from contextlib import nullcontext
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Numeric backends for calc_engine.
+# A backend decides how literals are read and how division, powers and the
+# scientific functions behave. In every backend integer literals stay plain
+# Python ints, and + - * // % and non-negative ** on ints never leave int,
+# so integer-only input takes the fast int path until the first division
+# or non-integer literal.
+# A backend made with max_digits refuses an exact power with more digits
+# than that instead of spending seconds or minutes on it.
+
+NAMES = ("float", "decimal", "fraction")
+DEFAULT_PRECISION = 28
+
+
+class Backend:
+    """How numbers behave for one numeric mode."""
+
+    def __init__(self, name, number, functions, truediv=operator.truediv,
+                 power=operator.pow, context=None, max_digits=None):
+        self.name = name
+        self.number = number
+        self.functions = functions
+        self.context = context
+        self.binary = {
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": truediv,
+            "//": operator.floordiv,
+            "%": operator.mod,
+            "**": power if max_digits is None else _limited(power, max_digits),
+        }
+
+    def __repr__(self):
+        return f"<Backend {self.name}>"
+
+    def localcontext(self):
+        """Context manager to evaluate under (decimal precision)."""
+        if self.context is None:
+            return nullcontext()
+        return decimal.localcontext(self.context)
+
+    def wrap(self, fn):
+        # Make sure calls run under the backend's context
+        if self.context is None:
+            return fn
+        ctx = self.context
+
+        def run(x):
+            with decimal.localcontext(ctx):
+                return fn(x)
+        return run
+
+
+def power_digits(base, exp):
+    """Rough number of digits of base ** exp when it is exact (ints and
+    fractions to an int power); 0 for powers that are rounded anyway."""
+    if type(exp) is not int or not isinstance(base, (int, Fraction)):
+        return 0
+    if isinstance(base, Fraction):
+        size = max(abs(base.numerator), base.denominator)
+    elif exp < 0:
+        return 0  # an int to a negative power is a float
+    else:
+        size = abs(base)
+    return abs(exp) * math.log10(size) if size > 1 else 0
+
+
+def _limited(power, max_digits):
+    def checked(a, b):
+        if power_digits(a, b) > max_digits:
+            raise OverflowError(f"result has more than {max_digits} digits")
+        return power(a, b)
+    return checked
+
+
+def _int_or(convert):
+    def number(text):
+        return int(text) if text.isdigit() else convert(text)
+    return number
+
+
+# -------------------- float --------------------
+
+def _float_pow(a, b):
+    # A negative number to a fractional power is complex in Python
+    result = a ** b
+    if isinstance(result, complex):
+        raise ValueError("math domain error")
+    return result
+
+
+FLOAT_FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "sin": lambda x: math.sin(math.radians(x)),
+    "cos": lambda x: math.cos(math.radians(x)),
+    "tan": lambda x: math.tan(math.radians(x)),
+    "log": math.log10,
+}
+
+
+# -------------------- decimal --------------------
+
+def _decimal_div(a, b):
+    return Decimal(a) / b
+
+
+def _decimal_pow(a, b):
+    if type(a) is int and type(b) is int and b >= 0:
+        return a ** b
+    try:
+        return Decimal(a) ** b
+    except decimal.InvalidOperation:
+        raise ValueError("math domain error") from None
+
+
+def _via_float(fn):
+    # No Decimal trig in the stdlib, so these run at float precision
+    return lambda x: Decimal(repr(fn(float(x))))
+
+
+DECIMAL_FUNCTIONS = {
+    "sqrt": lambda x: Decimal(x).sqrt(),
+    "sin": _via_float(FLOAT_FUNCTIONS["sin"]),
+    "cos": _via_float(FLOAT_FUNCTIONS["cos"]),
+    "tan": _via_float(FLOAT_FUNCTIONS["tan"]),
+    "log": lambda x: Decimal(x).log10(),
+}
+
+
+# -------------------- fraction --------------------
+
+def _fraction_div(a, b):
+    return Fraction(a, b)
+
+
+def _fraction_pow(a, b):
+    if type(b) is int:
+        if b >= 0 and type(a) is int:
+            return a ** b
+        return Fraction(a) ** b
+    result = Fraction(a) ** b
+    if isinstance(result, complex):
+        raise ValueError("math domain error")
+    return Fraction(result) if isinstance(result, float) else result
+
+
+def _fraction_sqrt(x):
+    x = Fraction(x)
+    if x < 0:
+        raise ValueError("math domain error")
+    num, den = math.isqrt(x.numerator), math.isqrt(x.denominator)
+    if num * num == x.numerator and den * den == x.denominator:
+        return Fraction(num, den)
+    return Fraction(math.sqrt(x))
+
+
+def _approx(fn):
+    # Irrational results can't be exact; keep the float value as a Fraction
+    return lambda x: Fraction(fn(x))
+
+
+FRACTION_FUNCTIONS = {
+    "sqrt": _fraction_sqrt,
+    "sin": _approx(FLOAT_FUNCTIONS["sin"]),
+    "cos": _approx(FLOAT_FUNCTIONS["cos"]),
+    "tan": _approx(FLOAT_FUNCTIONS["tan"]),
+    "log": _approx(math.log10),
+}
+
+
+# -------------------- numpy --------------------
+
+def _numpy_functions():
+    return {
+        "sqrt": np.sqrt,
+        "sin": lambda a: np.sin(np.radians(a)),
+        "cos": lambda a: np.cos(np.radians(a)),
+        "tan": lambda a: np.tan(np.radians(a)),
+        "log": np.log10,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_backend(name="float", precision=DEFAULT_PRECISION, max_digits=None):
+    """Return the backend called `name` ("float", "decimal", "fraction").
+
+    `precision` is the number of significant digits for "decimal". The
+    "numpy" backend is float with NumPy ufuncs, for array arguments. With
+    `max_digits`, exact powers longer than that raise OverflowError.
+    """
+    if name == "float":
+        return Backend("float", _int_or(float), FLOAT_FUNCTIONS, power=_float_pow, max_digits=max_digits)
+    if name == "decimal":
+        context = decimal.Context(prec=precision)
+        return Backend("decimal", _int_or(Decimal), DECIMAL_FUNCTIONS,
+                       truediv=_decimal_div, power=_decimal_pow, context=context, max_digits=max_digits)
+    if name == "fraction":
+        return Backend("fraction", _int_or(Fraction), FRACTION_FUNCTIONS,
+                       truediv=_fraction_div, power=_fraction_pow, max_digits=max_digits)
+    if name == "numpy":
+        if np is None:
+            raise ValueError("NumPy is not installed")
+        return Backend("numpy", _int_or(float), _numpy_functions())
+    raise ValueError(f"Unknown backend {name!r}")
+
+
+FLOAT = get_backend("float")
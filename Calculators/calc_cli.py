@@ -0,0 +1,38 @@
+import argparse
+import sys
+
+from calc_backends import DEFAULT_PRECISION, NAMES
+from calc_service import evaluate_stream
+
+# Batch calculator: one expression per line from a file or stdin, one
+# result per line to stdout. Streams, so memory doesn't grow with input.
+#   python calc_cli.py expressions.txt --mode decimal --precision 50
+#   cat expressions.txt | python calc_cli.py --workers 4
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate calculator expressions line by line.")
+    parser.add_argument("input", nargs="?", default="-", help="input file (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--mode", choices=NAMES, default="float", help="numeric backend")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="significant digits in decimal mode")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes for CPU-heavy input (default: none)")
+    args = parser.parse_args(argv)
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for result in evaluate_stream(src, args.mode, args.precision, args.workers):
+            dst.write(result)
+            dst.write("\n")
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+
+if __name__ == "__main__":
+    main()
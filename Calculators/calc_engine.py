@@ -0,0 +1,314 @@
+import decimal
+import operator
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from calc_backends import FLOAT, get_backend, power_digits
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Headless expression engine for the calculators.
+# Tokenizes, parses (Pratt style) and compiles calculator expressions into
+# cached closures, so nothing goes through eval() and no Tk is needed.
+
+CACHE_SIZE = 4096
+FOLD_DIGITS = 10000  # constant powers with more digits are left to run time, not folded
+
+
+class CalcError(ValueError):
+    """Raised when an expression is not valid calculator input."""
+
+
+# -------------------- Tokenizer --------------------
+
+TOKEN_RE = re.compile(r"""
+    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<op>\*\*|//|[-+*/%()])
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<space>\s+)
+  | (?P<bad>.)
+""", re.VERBOSE)
+
+
+def tokenize(text):
+    """Split an expression into (kind, value, position) tuples."""
+    tokens = []
+    for m in TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        value = m.group()
+        if kind == "space":
+            continue
+        elif kind == "bad":
+            raise CalcError(f"Unexpected character {value!r} at {m.start()}")
+        tokens.append((kind, value, m.start()))
+    tokens.append(("end", None, len(text)))
+    return tokens
+
+
+# -------------------- Parser --------------------
+
+# Binding powers, same precedence as Python for the operators we accept
+BINARY = {"+": 10, "-": 10, "*": 20, "/": 20, "//": 20, "%": 20, "**": 40}
+UNARY_BP = 30
+
+# Scientific functions, with the same meaning as the calculator buttons.
+# Their implementation comes from the numeric backend.
+FUNCTIONS = ("sqrt", "sin", "cos", "tan", "log")
+
+
+class Parser:
+    """Pratt parser producing a small tuple-based AST.
+
+    Nodes: ("num", text), ("var",), ("neg", node), ("pos", node),
+    ("pow", base, exp), ("call", name, arg) and ("chain", first, [(op, node), ...]) for runs of
+    left-associative operators of equal precedence (1+2-3, 4*5/6 ...).
+    Chains keep the tree shallow, so long inputs don't hit the recursion limit.
+    """
+
+    def __init__(self, tokens, var=None):
+        self.tokens = tokens
+        self.index = 0
+        self.var = var
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        tok = self.tokens[self.index]
+        self.index += 1
+        return tok
+
+    def expect(self, value):
+        kind, val, pos = self.advance()
+        if val != value or kind != "op":
+            raise CalcError(f"Expected {value!r} at {pos}")
+
+    def parse(self):
+        node = self.expression(0)
+        kind, _, pos = self.peek()
+        if kind != "end":
+            raise CalcError(f"Unexpected token at {pos}")
+        return node
+
+    def expression(self, min_bp):
+        left = self.prefix()
+        chain_bp = None
+        while True:
+            kind, op, _ = self.peek()
+            if kind != "op" or op not in BINARY:
+                return left
+            bp = BINARY[op]
+            if bp <= min_bp:
+                return left
+            self.advance()
+            if op == "**":
+                # Right associative
+                left = ("pow", left, self.expression(bp - 1))
+                chain_bp = None
+                continue
+            right = self.expression(bp)
+            if chain_bp == bp:
+                left[2].append((op, right))
+            else:
+                left = ("chain", left, [(op, right)])
+                chain_bp = bp
+
+    def prefix(self):
+        kind, val, pos = self.advance()
+        if kind == "num":
+            return ("num", val)
+        if kind == "op" and val in ("-", "+"):
+            operand = self.expression(UNARY_BP)
+            return ("neg", operand) if val == "-" else ("pos", operand)
+        if kind == "op" and val == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if kind == "name":
+            if val == self.var:
+                return ("var",)
+            if val not in FUNCTIONS:
+                raise CalcError(f"Unknown name {val!r} at {pos}")
+            self.expect("(")
+            arg = self.expression(0)
+            self.expect(")")
+            return ("call", val, arg)
+        if kind == "end":
+            raise CalcError("Unexpected end of expression")
+        raise CalcError(f"Unexpected token {val!r} at {pos}")
+
+
+def parse(text, var=None):
+    return Parser(tokenize(text), var).parse()
+
+
+# -------------------- Compiler --------------------
+
+# Compiled expressions are functions of one argument, the value of the
+# variable (if any). compile_node() returns (True, value) for constant
+# subtrees, which are folded at compile time, and (False, fn) otherwise.
+# A fold that fails (1/0, sqrt(-1) ...) is left as a function so the error
+# surfaces on call, and so is an exact power too big to fold cheaply.
+
+def _identity(x):
+    return x
+
+
+def _as_fn(compiled):
+    const, value = compiled
+    return (lambda x: value) if const else value
+
+
+def _unary(fn, compiled):
+    const, value = compiled
+    if const:
+        try:
+            return True, fn(value)
+        except (ArithmeticError, ValueError):
+            pass
+    if value is _identity:
+        return False, fn
+    inner = _as_fn(compiled)
+    return False, lambda x: fn(inner(x))
+
+
+def compile_node(node, backend=FLOAT):
+    tag = node[0]
+    if tag == "num":
+        return True, backend.number(node[1])
+    if tag == "var":
+        return False, _identity
+    if tag == "neg":
+        return _unary(operator.neg, compile_node(node[1], backend))
+    if tag == "pos":
+        return _unary(operator.pos, compile_node(node[1], backend))
+    if tag == "call":
+        return _unary(backend.functions[node[1]], compile_node(node[2], backend))
+    if tag == "pow":
+        power = backend.binary["**"]
+        base = compile_node(node[1], backend)
+        exp = compile_node(node[2], backend)
+        if base[0] and exp[0] and power_digits(base[1], exp[1]) <= FOLD_DIGITS:
+            try:
+                return True, power(base[1], exp[1])
+            except (ArithmeticError, ValueError):
+                pass
+        base, exp = _as_fn(base), _as_fn(exp)
+        return False, lambda x: power(base(x), exp(x))
+    if tag == "chain":
+        binary = backend.binary
+        const, acc = compile_node(node[1], backend)
+        steps = node[2]
+        i = 0
+        # Fold the constant prefix of the chain
+        while const and i < len(steps):
+            op, operand = steps[i]
+            rconst, rvalue = compile_node(operand, backend)
+            if not rconst:
+                break
+            try:
+                acc = binary[op](acc, rvalue)
+            except (ArithmeticError, ValueError):
+                break
+            i += 1
+        if const and i == len(steps):
+            return True, acc
+        first = _as_fn((const, acc))
+        rest = [(binary[op], _as_fn(compile_node(operand, backend)))
+                for op, operand in steps[i:]]
+
+        def run(x):
+            value = first(x)
+            for fn, arg in rest:
+                value = fn(value, arg(x))
+            return value
+        return False, run
+    raise CalcError(f"Unknown node {tag!r}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_expr(text, var=None, backend=FLOAT):
+    """Compile an expression into a one-argument callable (cached).
+
+    `var` names the variable the argument binds to. `backend` is a numeric
+    backend from calc_backends.get_backend().
+    """
+    node = parse(text, var)
+    with backend.localcontext():
+        return backend.wrap(_as_fn(compile_node(node, backend)))
+
+
+def evaluate(text, backend=FLOAT):
+    """Evaluate a calculator expression. Raises CalcError on bad syntax."""
+    return compile_expr(text, None, backend)(None)
+
+
+# -------------------- Batch evaluation --------------------
+
+# values: results in input order, None (or NaN for NumPy) where it failed
+# errors: {index: message} for every element that failed (flat index for NumPy)
+BatchResult = namedtuple("BatchResult", "values errors")
+
+
+def evaluate_many(text, values, var="x", use_numpy=None, backend=FLOAT):
+    """Evaluate `text` once per element of `values`, bound to `var`.
+
+    `values` may be a list, an array.array or a NumPy array. The expression
+    is compiled once. NumPy is used when installed (or forced with
+    use_numpy=True) with the float backend; otherwise a plain loop runs
+    over the values. Syntax errors raise CalcError, errors on single
+    elements land in `errors`.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None and backend is FLOAT
+    if use_numpy:
+        return _evaluate_numpy(text, values, var)
+
+    fn = compile_expr(text, var, backend)
+    results = []
+    errors = {}
+    append = results.append
+    for i, value in enumerate(values):
+        try:
+            append(fn(value))
+        except (ArithmeticError, ValueError, TypeError) as e:
+            append(None)
+            errors[i] = error_message(e)
+    return BatchResult(results, errors)
+
+
+def error_message(e):
+    """Readable message for an evaluation error, whatever the backend."""
+    if isinstance(e, ZeroDivisionError):
+        return "division by zero"
+    if isinstance(e, decimal.DecimalException):
+        return "math domain error"
+    return str(e) or type(e).__name__
+
+
+def _evaluate_numpy(text, values, var):
+    if np is None:
+        raise CalcError("NumPy is not installed")
+    fn = compile_expr(text, var, get_backend("numpy"))
+    arr = np.asarray(values, dtype=np.float64)
+    with np.errstate(all="ignore"):
+        out = np.broadcast_to(fn(arr), arr.shape).astype(np.float64)
+    # NumPy doesn't raise, so failures show up as non-finite results. Those
+    # elements run again one at a time, as in the plain loop, for the same
+    # value or error message; errors are keyed by flat index
+    bad = np.flatnonzero(~np.isfinite(out) & np.isfinite(arr))
+    errors = {}
+    if len(bad):
+        one = compile_expr(text, var, FLOAT)
+        for i in bad:
+            i = int(i)
+            try:
+                out.flat[i] = one(float(arr.flat[i]))
+            except (ArithmeticError, ValueError, TypeError) as e:
+                out.flat[i] = np.nan
+                errors[i] = error_message(e)
+    return BatchResult(out, errors)
@@ -0,0 +1,198 @@
+import bisect
+import os
+import re
+import time
+from collections import OrderedDict
+
+# Calculation history shared by basic_app.py and smart_app.py.
+# Entries go to an append-only log, one per line:
+#   <timestamp>\t<mode>\t<expression>\t<result>
+# Recent results are kept in an in-memory LRU keyed by (mode, normalized
+# expression). Recall reads the log backwards from the end, so it only
+# touches the last few blocks however long the log is. Once the log holds
+# more than MAX_ENTRIES (plus some slack, so it isn't rewritten on every
+# append) it is cut back to the newest MAX_ENTRIES.
+
+HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".calc_history.log")
+CACHE_SIZE = 1024
+MAX_ENTRIES = 100000
+SLACK = 0.1  # the log may grow this fraction past MAX_ENTRIES before it is compacted
+BLOCK_SIZE = 64 * 1024
+_LOOSE_SPACE = re.compile(r" (?![\w.])|(?<![\w.]) ")
+
+
+def normalize(expression):
+    # Whitespace goes, but for one space between two characters of numbers
+    # or names, so "1 + 2" is "1+2" while "1 2" stays apart from "12"
+    return _LOOSE_SPACE.sub("", " ".join(expression.split()))
+
+
+class HistoryStore:
+    """Append-only calculation log with an LRU of results."""
+
+    def __init__(self, path=HISTORY_FILE, cache_size=CACHE_SIZE, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.cache_size = cache_size
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.entries = None  # lines in the log, counted on the first append
+        self._index = None  # sorted distinct expressions, built on first search
+        for entry in reversed(self.recent(cache_size)):
+            self._remember(entry[1], entry[2], entry[3])
+
+    # -------------------- Writing --------------------
+
+    def record(self, expression, result, mode="float"):
+        expression = normalize(expression)
+        result = str(result)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{time.time():.3f}\t{mode}\t{expression}\t{result}\n")
+        self._remember(mode, expression, result)
+        if self._index is not None:
+            i = bisect.bisect_left(self._index, expression)
+            if i == len(self._index) or self._index[i] != expression:
+                self._index.insert(i, expression)
+        if self.entries is None:
+            self.entries = self._count_lines()
+        else:
+            self.entries += 1
+        if self.entries > self.max_entries * (1 + SLACK):
+            self.compact()
+
+    def _remember(self, mode, expression, result):
+        key = (mode, expression)
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    # -------------------- Reading --------------------
+
+    def lookup(self, expression, mode="float"):
+        """Cached result string for an expression, or None."""
+        key = (mode, normalize(expression))
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def recent(self, count):
+        """Last `count` entries, newest first, as (time, mode, expression, result)."""
+        entries = []
+        for _, line in self._lines_backwards():
+            entry = _parse(line.decode("utf-8", "replace"))
+            if entry:
+                entries.append(entry)
+                if len(entries) >= count:
+                    break
+        return entries
+
+    def search(self, prefix, limit=20):
+        """Distinct past expressions starting with `prefix`, in sorted order."""
+        if self._index is None:
+            self._index = sorted(set(entry[2] for entry in self._entries()))
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(self._index, prefix)
+        found = []
+        for expression in self._index[start:start + limit]:
+            if not expression.startswith(prefix):
+                break
+            found.append(expression)
+        return found
+
+    def _entries(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    entry = _parse(line)
+                    if entry:
+                        yield entry
+        except FileNotFoundError:
+            return
+
+    def _count_lines(self):
+        count = 0
+        try:
+            with open(self.path, "rb") as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                    count += block.count(b"\n")
+        except FileNotFoundError:
+            pass
+        return count
+
+    def _lines_backwards(self):
+        # Yield (offset, raw line without newline) from the end of the file
+        # backwards, reading one block at a time
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            size = pos = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(pos - 1)
+            if f.read(1) == b"\n":
+                pos -= 1
+            tail = b""
+            while pos > 0:
+                step = min(BLOCK_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + tail
+                end = pos + len(buf)
+                lines = buf.split(b"\n")
+                tail = lines.pop(0)
+                for line in reversed(lines):
+                    end -= len(line)
+                    yield end, line
+                    end -= 1
+            yield 0, tail
+
+    # -------------------- Compaction --------------------
+
+    def compact(self, keep=None):
+        """Drop all but the newest `keep` entries (default max_entries).
+
+        Finds the cut point by scanning backwards, then streams the tail to
+        a temp file and renames it over the log, so memory use stays at one
+        block whatever the file size.
+        """
+        keep = self.max_entries if keep is None else keep
+        if keep <= 0:
+            open(self.path, "w").close()
+            self.entries = 0
+            self._index = None
+            return
+        left = keep
+        for start, _ in self._lines_backwards():
+            left -= 1
+            if left == 0:
+                break
+        else:
+            self.entries = keep - left
+            return  # nothing to drop
+        self.entries = keep
+        if start == 0:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            src.seek(start)
+            while True:
+                block = src.read(BLOCK_SIZE)
+                if not block:
+                    break
+                dst.write(block)
+        os.replace(tmp_path, self.path)
+        self._index = None
+
+
+def _parse(line):
+    parts = line.rstrip("\n").split("\t")
+    if len(parts) != 4:
+        return None
+    try:
+        stamp = float(parts[0])
+    except ValueError:
+        return None
+    return stamp, parts[1], parts[2], parts[3]
@@ -0,0 +1,210 @@
+from fractions import Fraction
+
+from calc_backends import FLOAT, power_digits
+from calc_engine import BINARY, FUNCTIONS, UNARY_BP
+
+# Incremental evaluation for the live result preview.
+# Each committed token is folded into a shunting-yard state built from
+# immutable linked stacks, so every token keeps a snapshot of the state
+# before it. Appending a key folds at most the operators it closes, and
+# backspace just restores the previous snapshot: both O(1) amortized, no
+# matter how long the expression is.
+#
+# A state is (values, ops, expect_operand, error). values and ops are
+# linked stacks: None or (top, rest). ops entries are (kind, name, bp)
+# with kind "bin", "unary", "(" or "call".
+# The preview runs on every key, so an exact power with more than
+# PREVIEW_DIGITS digits (9**9**8) isn't computed, and no exact result of
+# another operator may pass that length either (9**4000*9**4000): the
+# preview shows nothing, and the result waits for "=".
+
+EMPTY = (None, None, True, None)
+RIGHT_ASSOC = ("**",)
+EVAL_ERRORS = (ArithmeticError, ValueError, TypeError)
+PREVIEW_DIGITS = 4000  # under the 4300 digits Python will turn into a str
+PREVIEW_BITS = int(PREVIEW_DIGITS * 3.32)  # bits of a number of PREVIEW_DIGITS digits
+
+
+class LiveExpression:
+    """Expression typed key by key, with a cheap running result."""
+
+    def __init__(self, backend=FLOAT):
+        self.backend = backend
+        self.clear()
+
+    def clear(self):
+        self.state = EMPTY
+        self.history = []  # (state before the token, token text)
+        self.pending = ""  # last token, may still grow ("1" -> "12")
+
+    @property
+    def text(self):
+        return "".join(token for _, token in self.history) + self.pending
+
+    def set_text(self, text):
+        self.clear()
+        self.push(text)
+
+    def set_backend(self, backend):
+        text = self.text
+        self.backend = backend
+        self.set_text(text)
+
+    def push(self, keys):
+        """Append one or more characters."""
+        for char in keys:
+            if self.pending and _continues(self.pending, char):
+                self.pending += char
+                continue
+            self._commit()
+            self.pending = char
+
+    def backspace(self):
+        """Remove the last character."""
+        if not self.pending:
+            if not self.history:
+                return
+            self.state, self.pending = self.history.pop()
+        self.pending = self.pending[:-1]
+
+    def preview(self):
+        """Value of the expression typed so far, or None if there isn't one.
+
+        Trailing operators and open brackets are ignored, so "1+2*" shows 3
+        and "(1+2" shows 3.
+        """
+        with self.backend.localcontext():
+            state = self.state
+            if self.pending:
+                state = self._feed(state, self.pending)
+            return self._finish(state)
+
+    # -------------------- Internals --------------------
+
+    def _commit(self):
+        if not self.pending:
+            return
+        with self.backend.localcontext():
+            new_state = self._feed(self.state, self.pending)
+        self.history.append((self.state, self.pending))
+        self.state = new_state
+        self.pending = ""
+
+    def _feed(self, state, token):
+        values, ops, expect, error = state
+        if error or token.isspace():
+            return state
+        if token != "(" and _awaiting_bracket(ops):
+            return _error(state, "Expected '('")
+        try:
+            first = token[0]
+            if first.isdigit() or first == ".":
+                if not expect:
+                    return _error(state, "Missing operator")
+                return ((self.backend.number(token), values), ops, False, None)
+            if first.isalpha() or first == "_":
+                if not expect or token not in FUNCTIONS:
+                    return _error(state, f"Unexpected name {token!r}")
+                return (values, (("call", token, 0), ops), True, None)
+            if token == "(":
+                if not expect:
+                    return _error(state, "Missing operator")
+                if _awaiting_bracket(ops):
+                    # Opening bracket of a function call
+                    kind, name, _ = ops[0]
+                    return (values, ((kind, name, 1), ops[1]), True, None)
+                return (values, (("(", None, 0), ops), True, None)
+            if token == ")":
+                if expect:
+                    return _error(state, "Unexpected ')'")
+                values, ops = self._reduce(values, ops, 0)
+                if not ops:
+                    return _error(state, "Unmatched ')'")
+                (kind, name, _), ops = ops
+                if kind == "call":
+                    value, values = values
+                    values = (self.backend.functions[name](value), values)
+                return (values, ops, False, None)
+            if expect:
+                if token in ("-", "+"):
+                    return (values, (("unary", token, UNARY_BP), ops), True, None)
+                return _error(state, f"Unexpected {token!r}")
+            bp = BINARY.get(token)
+            if bp is None:
+                return _error(state, f"Unexpected {token!r}")
+            values, ops = self._reduce(values, ops, bp + 1 if token in RIGHT_ASSOC else bp)
+            return (values, (("bin", token, bp), ops), True, None)
+        except EVAL_ERRORS as e:
+            return _error(state, str(e))
+
+    def _reduce(self, values, ops, min_bp):
+        # Fold operators on top of the stack that bind at least as tightly
+        # as min_bp (stops at brackets).
+        binary = self.backend.binary
+        while ops and ops[0][0] in ("bin", "unary") and ops[0][2] >= min_bp:
+            (kind, name, _), ops = ops
+            right, values = values
+            if kind == "unary":
+                values = (-right if name == "-" else +right, values)
+            else:
+                left, values = values
+                if name == "**" and power_digits(left, right) > PREVIEW_DIGITS:
+                    raise OverflowError("Too big to preview")
+                value = binary[name](left, right)
+                if _too_long(value):
+                    raise OverflowError("Too big to preview")
+                values = (value, values)
+        return values, ops
+
+    def _finish(self, state):
+        values, ops, expect, error = state
+        if error:
+            return None
+        # Drop whatever is still waiting for an operand
+        while expect and ops:
+            (kind, _, _), ops = ops
+            if kind == "bin":
+                expect = False
+        if expect:
+            return None
+        try:
+            while True:
+                values, ops = self._reduce(values, ops, 0)
+                if not ops:
+                    return values[0]
+                (kind, name, _), ops = ops
+                if kind == "call":
+                    value, values = values
+                    values = (self.backend.functions[name](value), values)
+        except EVAL_ERRORS:
+            return None
+
+
+def _continues(pending, char):
+    # Whether char extends the pending token instead of starting a new one
+    first = pending[0]
+    if first.isdigit() or first == ".":
+        if char.isdigit() or char == ".":
+            return True
+        if char in "eE":
+            return "e" not in pending and "E" not in pending
+        return char in "+-" and pending[-1] in "eE"
+    if first.isalpha() or first == "_":
+        return char.isalnum() or char == "_"
+    return pending in ("*", "/") and char == pending
+
+
+def _too_long(value):
+    # Only exact numbers grow without bound; floats and Decimals are rounded
+    if isinstance(value, (int, Fraction)):
+        return max(value.numerator.bit_length(), value.denominator.bit_length()) > PREVIEW_BITS
+    return False
+
+
+def _awaiting_bracket(ops):
+    return ops is not None and ops[0][0] == "call" and ops[0][2] == 0
+
+
+def _error(state, message):
+    values, ops, expect, _ = state
+    return (values, ops, expect, message)
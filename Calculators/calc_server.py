@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import os
+import stat
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from calc_backends import DEFAULT_PRECISION, NAMES
+from calc_service import evaluate_batch
+
+# Calculator server: a line protocol over a Unix or localhost TCP socket.
+# Each line sent is an expression, each line back its result (or
+# "Error: ..."), in order. Many clients share one warm process.
+#   python calc_server.py --port 8765
+#   python calc_server.py --unix /tmp/calc.sock --workers 4
+
+HOST = "127.0.0.1"
+PORT = 8765
+READ_SIZE = 64 * 1024
+MAX_LINE = 1024 * 1024
+
+
+async def handle_client(reader, writer, mode="float", precision=DEFAULT_PRECISION, pool=None):
+    # Everything a client has pipelined so far is evaluated as one batch,
+    # so the pool sees one task per read rather than one per line.
+    loop = asyncio.get_running_loop()
+    partial_line = b""
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if data:
+                lines = (partial_line + data).split(b"\n")
+                partial_line = lines.pop()
+            elif partial_line:
+                lines, partial_line = [partial_line], b""
+            else:
+                break
+            if len(partial_line) > MAX_LINE:
+                break
+            if not lines:
+                continue
+            texts = [line.decode("utf-8", "replace") for line in lines]
+            if pool is None:
+                results = evaluate_batch(texts, mode, precision)
+            else:
+                results = await loop.run_in_executor(pool, evaluate_batch, texts, mode, precision)
+            writer.write(("\n".join(results) + "\n").encode("utf-8"))
+            await writer.drain()
+    except ConnectionError:
+        pass  # client went away
+    finally:
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT, unix=None, mode="float", precision=DEFAULT_PRECISION,
+                workers=0):
+    pool = ProcessPoolExecutor(workers) if workers else None
+    handler = partial(handle_client, mode=mode, precision=precision, pool=pool)
+    try:
+        if unix:
+            try:
+                mode_bits = os.stat(unix).st_mode
+            except FileNotFoundError:
+                pass
+            else:
+                # A socket left by an earlier run is replaced; anything else is not ours to delete
+                if not stat.S_ISSOCK(mode_bits):
+                    raise FileExistsError(f"{unix} exists and is not a socket")
+                os.remove(unix)
+            server = await asyncio.start_unix_server(handler, path=unix)
+            where = unix
+        else:
+            server = await asyncio.start_server(handler, host, port)
+            where = f"{host}:{port}"
+        print(f"Calculator server listening on {where}", flush=True)
+        async with server:
+            await server.serve_forever()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve calculator expressions over a socket.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--mode", choices=NAMES, default="float", help="numeric backend")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="significant digits in decimal mode")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes for CPU-heavy expressions (default: none)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.mode, args.precision, args.workers))
+    except FileExistsError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
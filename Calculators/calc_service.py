@@ -0,0 +1,63 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from calc_backends import DEFAULT_PRECISION, get_backend
+from calc_engine import error_message, evaluate
+
+# Shared evaluation helpers for the headless entry points (calc_cli.py and
+# calc_server.py). One expression per line in, one result per line out;
+# failures come back as "Error: <message>" so a bad line never stops a run.
+# Exact powers are capped at MAX_DIGITS, as a longer int couldn't be sent
+# back as text anyway, so one line like 9**9**8 can't tie up a worker or
+# the server's event loop for minutes.
+
+BATCH_SIZE = 256
+EVAL_ERRORS = (ArithmeticError, ValueError, TypeError, RecursionError)
+MAX_DIGITS = 4300  # the longest int Python turns into a str by default
+
+
+def evaluate_line(text, mode="float", precision=DEFAULT_PRECISION):
+    """Result of one input line, as the text to send back."""
+    text = text.strip()
+    if not text:
+        return ""
+    try:
+        return str(evaluate(text, get_backend(mode, precision, MAX_DIGITS)))
+    except EVAL_ERRORS as e:
+        return f"Error: {error_message(e)}"
+
+
+def evaluate_batch(lines, mode="float", precision=DEFAULT_PRECISION):
+    return [evaluate_line(line, mode, precision) for line in lines]
+
+
+def batches(lines, size=BATCH_SIZE):
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+def evaluate_stream(lines, mode="float", precision=DEFAULT_PRECISION, workers=0,
+                    batch_size=BATCH_SIZE):
+    """Yield results for `lines` in input order.
+
+    With workers > 0 batches are spread over a process pool, with at most
+    two batches per worker in flight, so memory stays bounded for any
+    input length.
+    """
+    if not workers:
+        for line in lines:
+            yield evaluate_line(line, mode, precision)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for batch in batches(lines, batch_size):
+            pending.append(pool.submit(evaluate_batch, batch, mode, precision))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -1,5 +1,10 @@
 import tkinter as tk
-import math
+from calc_backends import NAMES, get_backend
+from calc_engine import evaluate
+from calc_history import HistoryStore
+from calc_live import LiveExpression
+
+DECIMAL_PRECISION = 50
 
 # Initialize window
 root = tk.Tk()
@@ -16,85 +21,159 @@ entry_var = tk.StringVar()
 entry = tk.Entry(root, textvariable=entry_var, font=("Arial", 24), bg="#1e1e1e", fg="white", bd=0, relief="flat", justify="right")
 entry.pack(fill="both", ipadx=8, ipady=20, padx=10, pady=10)
 
+# Numeric mode: float, decimal or exact fraction
+mode_var = tk.StringVar(value="float")
+mode_menu = tk.OptionMenu(root, mode_var, *NAMES)
+mode_menu.config(bg="#3e3e3e", fg="white", activebackground="#5e5e5e", bd=0, highlightthickness=0)
+mode_menu.pack(anchor="e", padx=10)
+
+# Live result, updated on every key press
+preview_var = tk.StringVar()
+tk.Label(root, textvariable=preview_var, font=("Arial", 14), bg="#2e2e2e", fg="gray", anchor="e").pack(fill="x", padx=10)
+
+# Current numeric backend
+def backend():
+    return get_backend(mode_var.get(), DECIMAL_PRECISION)
+
+live = LiveExpression(backend())
+
+def update_preview():
+    value = live.preview()
+    preview_var.set("" if value is None else f"= {value}")
+
+def change_mode(*args):
+    live.set_backend(backend())
+    update_preview()
+
+mode_var.trace_add("write", change_mode)
+
 # Function to update expression
 def press(key):
     global expression
     expression += str(key)
     entry_var.set(expression)
+    live.push(str(key))
+    update_preview()
 
 # Function to clear
 def clear():
     global expression
     expression = ""
     entry_var.set("")
+    live.clear()
+    update_preview()
 
 # Function to delete last character
 def backspace():
     global expression
     expression = expression[:-1]
     entry_var.set(expression)
+    live.backspace()
+    update_preview()
+
+# Calculation history, kept across sessions; the calculator works without
+# it if the log can't be read or written (read-only home, full disk)
+try:
+    history = HistoryStore()
+except OSError:
+    history = None
+recall_pos = -1
+completion = None  # [text completed, past expressions starting with it, position]
+
+# Evaluate, reusing the stored result for expressions seen before
+def calculate(text):
+    mode = mode_var.get()
+    result = None if history is None else history.lookup(text, mode)
+    if result is None:
+        result = evaluate(text, backend())
+    if history is not None:
+        try:
+            history.record(text, result, mode)
+        except OSError:
+            pass
+    return result
+
+# Step through past expressions (Up = older, Down = newer)
+def recall(step):
+    global expression, recall_pos
+    pos = recall_pos + step
+    if pos < 0 or history is None:
+        return
+    try:
+        entries = history.recent(pos + 1)
+    except OSError:
+        return
+    if len(entries) <= pos:
+        return
+    recall_pos = pos
+    expression = entries[pos][2]
+    entry_var.set(expression)
+    live.set_text(expression)
+    update_preview()
+
+# Complete to a past expression starting with what is typed (Tab again for the next)
+def complete(event=None):
+    global expression, completion
+    if history is None:
+        return "break"
+    if completion is None or completion[1][completion[2]] != expression:
+        try:
+            matches = history.search(expression)
+        except OSError:
+            return "break"
+        if not matches:
+            return "break"
+        completion = [expression, matches, -1]
+    completion[2] = (completion[2] + 1) % len(completion[1])
+    expression = completion[1][completion[2]]
+    entry_var.set(expression)
+    live.set_text(expression)
+    update_preview()
+    return "break"
+
+# Show a final result (or an error) and restart from it
+def show_result(result):
+    global expression, recall_pos
+    recall_pos = -1
+    if result is None:
+        entry_var.set("Error")
+        expression = ""
+    else:
+        entry_var.set(result)
+        expression = str(result)
+    live.set_text(expression)
+    update_preview()
 
 # Function to calculate result
 def equal():
-    global expression
     try:
-        result = eval(expression)
-        entry_var.set(result)
-        expression = str(result)
+        result = calculate(expression)
     except:
-        entry_var.set("Error")
-        expression = ""
+        result = None
+    show_result(result)
 
-# Scientific functions
-def sqrt():
-    global expression
+# Scientific functions, applied to the whole expression
+def scientific(name):
     try:
-        result = math.sqrt(eval(expression))
-        entry_var.set(result)
-        expression = str(result)
+        result = calculate(f"{name}({expression})")
     except:
-        entry_var.set("Error")
-        expression = ""
+        result = None
+    show_result(result)
+
+def sqrt():
+    scientific("sqrt")
 
 def sin():
-    global expression
-    try:
-        result = math.sin(math.radians(eval(expression)))
-        entry_var.set(result)
-        expression = str(result)
-    except:
-        entry_var.set("Error")
-        expression = ""
+    scientific("sin")
 
 def cos():
-    global expression
-    try:
-        result = math.cos(math.radians(eval(expression)))
-        entry_var.set(result)
-        expression = str(result)
-    except:
-        entry_var.set("Error")
-        expression = ""
+    scientific("cos")
 
 def tan():
-    global expression
-    try:
-        result = math.tan(math.radians(eval(expression)))
-        entry_var.set(result)
-        expression = str(result)
-    except:
-        entry_var.set("Error")
-        expression = ""
+    scientific("tan")
 
 def log():
-    global expression
-    try:
-        result = math.log10(eval(expression))
-        entry_var.set(result)
-        expression = str(result)
-    except:
-        entry_var.set("Error")
-        expression = ""
+    scientific("log")
 
 # Button layout
 buttons = [
@@ -148,6 +227,9 @@ def key_input(event):
         backspace()
 
 root.bind("<Key>", key_input)
+root.bind("<Up>", lambda event: recall(1))
+root.bind("<Down>", lambda event: recall(-1))
+root.bind("<Tab>", complete)
 
 # Start app
 root.mainloop()
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import lzma
+import os
+import time
+import weakref
+import zlib
+
+from serpad_io import Cancelled
+
+# Content-addressed auto-backup store for Serpad.
+# A backup is a manifest listing the chunks of the document; each chunk is
+# stored once, compressed, under the hash of its content, so backups of a
+# large file that changed in a few places only add those few chunks.
+# Chunks are cut at fixed offsets of the piece table's buffers rather than
+# of the document, so an edit leaves the chunks around it as they were.
+# Those buffers never change once written, so a chunk's hash is remembered
+# from one backup to the next and only new text is read and hashed.
+# Old backups are thinned out (all from the last hour, then one per hour,
+# then one per day) and chunks no backup uses any more are deleted.
+#
+#   <root>/objects/ab/abcdef...   codec byte + compressed chunk
+#   <root>/snapshots/<doc>/<time>.json
+
+CHUNK_SIZE = 64 * 1024
+RETENTION = (  # (age up to, keep one per this many seconds; 0 keeps all)
+    (3600, 0),
+    (24 * 3600, 3600),
+    (30 * 24 * 3600, 24 * 3600),
+)
+GRACE = 3600  # unused chunks newer than this are kept; another process may be about to use them
+CODECS = {
+    "zlib": (b"z", zlib.compress, zlib.decompress),
+    "lzma": (b"x", lzma.compress, lzma.decompress),
+}
+
+
+def _segments(pieces):
+    # (source, start, end) slices of the piece buffers, cut at CHUNK_SIZE multiples
+    for source, s, e, _ in pieces:
+        while s < e:
+            cut = min(e, (s // CHUNK_SIZE + 1) * CHUNK_SIZE)
+            yield source, s, cut
+            s = cut
+
+
+def _groups(pieces):
+    """Tuples of segments, one per chunk. Whole aligned blocks are chunks
+    of their own; the bits between them are grouped up to CHUNK_SIZE."""
+    run = []
+    size = 0
+    for segment in _segments(pieces):
+        source, s, e = segment
+        if e - s == CHUNK_SIZE:
+            if run:
+                yield tuple(run)
+                run, size = [], 0
+            yield (segment,)
+            continue
+        run.append(segment)
+        size += e - s
+        if size >= CHUNK_SIZE:
+            yield tuple(run)
+            run, size = [], 0
+    if run:
+        yield tuple(run)
+
+
+def thin(times, now, retention=RETENTION):
+    """The subset of backup times to keep: the newest one in each period."""
+    keep = set()
+    seen = set()
+    for t in sorted(times, reverse=True):
+        age = now - t
+        for limit, period in retention:
+            if age <= limit:
+                bucket = (limit, t // period if period else t)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(t)
+                break
+    if times:
+        keep.add(max(times))
+    return keep
+
+
+class BackupStore:
+    """Backups of documents under `root`, deduplicated by chunk."""
+
+    def __init__(self, root, compression="zlib", level=None):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.snapshots = os.path.join(root, "snapshots")
+        self.codec = compression
+        self.level = level
+        self._hashes = weakref.WeakKeyDictionary()  # document -> {segments: (digest, size)} as of its last backup
+        self._last = {}  # document key -> chunk list of its last backup
+
+    def _compress(self, data):
+        tag, compress, _ = CODECS[self.codec]
+        if self.level is None:
+            return tag + compress(data)
+        if self.codec == "lzma":
+            return tag + compress(data, preset=self.level)
+        return tag + compress(data, self.level)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    @staticmethod
+    def key(path, untitled=None):
+        """Directory name for a document's backups. `untitled` tells apart
+        documents that have no path."""
+        if not path:
+            return f"untitled-{untitled}" if untitled else "untitled"
+        tag = hashlib.blake2b(os.path.abspath(path).encode("utf-8", "surrogateescape"),
+                              digest_size=4).hexdigest()
+        return f"{os.path.basename(path)}-{tag}"
+
+    # -------------------- Writing --------------------
+
+    def _put(self, data):
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        path = self._object_path(digest)
+        try:
+            os.utime(path)  # already stored; mark it as in use for collect()
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self._compress(data))
+            os.replace(tmp_path, path)
+        return digest
+
+    def backup(self, doc, snapshot, path=None, cancel=None, now=None, untitled=None):
+        """Store a snapshot() of `doc`. Returns the manifest path, or None
+        if the content is the same as in the last backup of this document."""
+        key = self.key(path, untitled)
+        pieces, length = snapshot
+        known = self._hashes.get(doc, {})
+        hashes = {}
+        chunks = []
+        for group in _groups(pieces):
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            entry = known.get(group) or hashes.get(group)
+            if entry is not None:
+                try:
+                    os.utime(self._object_path(entry[0]))
+                except FileNotFoundError:
+                    entry = None
+            if entry is None:
+                data = b"".join(doc.span(source, s, e) for source, s, e in group)
+                entry = (self._put(data), len(data))
+            hashes[group] = entry
+            chunks.append(entry)
+        self._hashes[doc] = hashes
+        if key not in self._last:
+            self._last[key] = self._latest_chunks(key)
+        if chunks == self._last[key]:
+            return None
+        self._last[key] = chunks
+        manifest = {"path": path, "time": time.time() if now is None else now, "length": length,
+                    "chunks": [list(entry) for entry in chunks]}
+        folder = os.path.join(self.snapshots, key)
+        os.makedirs(folder, exist_ok=True)
+        manifest_path = os.path.join(folder, f"{int(manifest['time'] * 1000)}.json")
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        return manifest_path
+
+    def _latest_chunks(self, key):
+        # Chunks of the newest backup on disk, from an earlier session
+        backups = self.list(key)
+        if not backups:
+            return None
+        with open(backups[-1], encoding="utf-8") as f:
+            return [tuple(entry) for entry in json.load(f)["chunks"]]
+
+    # -------------------- Reading --------------------
+
+    def list(self, key):
+        """Manifest paths of a document's backups, oldest first."""
+        folder = os.path.join(self.snapshots, key)
+        try:
+            names = [n for n in os.listdir(folder) if n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        return [os.path.join(folder, n) for n in sorted(names, key=lambda n: int(n[:-5]))]
+
+    def read(self, manifest_path):
+        """Yield the content of a backup chunk by chunk."""
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        decompress = {tag: fn for tag, _, fn in CODECS.values()}
+        for digest, size in manifest["chunks"]:
+            with open(self._object_path(digest), "rb") as f:
+                raw = f.read()
+            data = decompress[raw[:1]](raw[1:])
+            if len(data) != size:
+                raise ValueError(f"Backup chunk {digest} is damaged")
+            yield data
+
+    # -------------------- Pruning --------------------
+
+    def prune(self, now=None, retention=RETENTION):
+        """Thin out old backups of every document, then collect(). Returns
+        the number of backups removed."""
+        now = time.time() if now is None else now
+        removed = 0
+        try:
+            keys = os.listdir(self.snapshots)
+        except FileNotFoundError:
+            return 0
+        for key in keys:
+            backups = {int(os.path.basename(p)[:-5]) / 1000: p for p in self.list(key)}
+            keep = thin(list(backups), now, retention)
+            for t, p in backups.items():
+                if t not in keep:
+                    os.remove(p)
+                    removed += 1
+        if removed:
+            self.collect(now)
+        return removed
+
+    def collect(self, now=None):
+        """Delete chunks that no backup refers to."""
+        now = time.time() if now is None else now
+        if not os.path.isdir(self.objects):
+            return
+        used = set()
+        for key in os.listdir(self.snapshots):
+            for p in self.list(key):
+                with open(p, encoding="utf-8") as f:
+                    used.update(digest for digest, _ in json.load(f)["chunks"])
+        for folder in os.listdir(self.objects):
+            folder = os.path.join(self.objects, folder)
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                if name not in used and now - os.path.getmtime(path) > GRACE:
+                    os.remove(path)
+
+    def disk_usage(self):
+        total = 0
+        for top in (self.objects, self.snapshots):
+            for folder, _, names in os.walk(top):
+                total += sum(os.path.getsize(os.path.join(folder, n)) for n in names)
+        return total
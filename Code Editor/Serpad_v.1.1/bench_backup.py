@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from backup_store import BackupStore
+from piece_table import PieceTable
+
+# Benchmark: auto backups over a long editing session.
+# Run: python bench_backup.py [size in MB] [backups] [--baseline]
+# Between backups a few lines are edited at random places, as if typed
+# during the 5 minutes between auto backups. Backups are dated 5 minutes
+# apart, so thinning and chunk collection happen as they would in a
+# session of that length. Reports the pause on the Tk thread (taking the
+# snapshot), the time spent on the worker and the disk used. --baseline
+# also times one full copy, what every auto backup used to write.
+
+LINE = b"2025-06-29 12:00:00,123 INFO [worker-7] request %08x handled in %dms path=/api/v1/items\n"
+EDITS = 20
+
+
+def make_doc(size, rng):
+    lines = size // len(LINE % (0, 0))
+    return PieceTable(b"".join(LINE % (rng.getrandbits(32), rng.randrange(100)) for _ in range(lines)))
+
+
+def edit(doc, rng):
+    for _ in range(EDITS):
+        offset = doc.line_start(rng.randrange(doc.line_count()))
+        if rng.random() < 0.7:
+            doc.insert(offset, b"edited %d\n" % rng.randrange(10 ** 6))
+        else:
+            doc.delete(offset, min(80, len(doc) - offset))
+
+
+def main(size_mb=100, backups=96, baseline=False):
+    rng = random.Random(0)
+    doc = make_doc(size_mb * 1024 * 1024, rng)
+    print(f"document         {len(doc) / 1e6:10.1f} MB, {backups} backups, {EDITS} edits between")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BackupStore(os.path.join(tmp, "store"))
+        clock = time.time()
+        for n in range(backups):
+            start = time.perf_counter()
+            snapshot = doc.snapshot()
+            pause = time.perf_counter() - start
+            start = time.perf_counter()
+            store.backup(doc, snapshot, "bench.log", now=clock)
+            store.prune(now=clock)
+            worker = time.perf_counter() - start
+            if n in (0, 1) or (n + 1) % 12 == 0:
+                print(f"backup {n + 1:4}      pause {pause * 1e3:7.3f} ms  worker {worker * 1e3:8.1f} ms  "
+                      f"disk {store.disk_usage() / 1e6:7.1f} MB  kept {len(store.list(store.key('bench.log')))}")
+            if n + 1 < backups:
+                edit(doc, rng)
+            clock += 300
+
+        latest = store.list(store.key("bench.log"))[-1]
+        same = b"".join(store.read(latest)) == doc.read()
+        print(f"restore latest   {'ok' if same else 'MISMATCH'}")
+
+        if baseline:
+            start = time.perf_counter()
+            with open(os.path.join(tmp, "full.bak"), "wb") as f:
+                for chunk in doc.chunks():
+                    f.write(chunk)
+            print(f"full copy (old)  {(time.perf_counter() - start) * 1e3:10.1f} ms, "
+                  f"{len(doc) / 1e6:.1f} MB per backup")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:] if not a.startswith("--")]
+    main(*args, baseline="--baseline" in sys.argv)
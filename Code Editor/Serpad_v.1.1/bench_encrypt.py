@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from encrypted_file import EncryptedFile, EncryptedWriter, Plaintext, new_header, read_header
+from key_cache import KeyCache
+from piece_table import PieceTable
+from serpad_io import read_file, replace_temp, write_temp
+
+# Benchmark: encrypted save and load.
+# Run: python bench_encrypt.py [size in MB] [--baseline]
+# Times a full save and load in the segmented format, opening the file
+# as the editor does (decrypting only the first screen), decrypting one
+# screen from the middle of the file, and a save after a one-line edit,
+# which copies every untouched segment, after timing the key derivation
+# and a cached key lookup. --baseline also times the old
+# whole-document Fernet path (needs RAM for several copies of the file).
+
+LINE = b"2025-06-29 12:00:00,123 INFO [worker-7] request handled in 12ms path=/api/v1/items\n"
+
+
+def rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(label, elapsed, size):
+    print(f"{label:<18}{elapsed:8.2f} s   ({size / elapsed / 1e6:.0f} MB/s)")
+
+
+def save(path, doc, key, header, origin=None):
+    writer = EncryptedWriter(key, header, origin)
+    snapshot = doc.snapshot()
+    tmp_path = write_temp(path, writer.chunks(doc, snapshot), snapshot[1],
+                          lambda done, total: None, threading.Event())
+    replace_temp(tmp_path, path)
+    return writer
+
+
+def main(size_mb=1024, baseline=False):
+    block = LINE * (1024 * 1024 // len(LINE))
+    data = block * max(1, size_mb * 1024 * 1024 // len(block))
+    size = len(data)
+    header = new_header()
+    keys = KeyCache()
+    start = time.perf_counter()
+    key = keys.derive(header, "benchmark")
+    print(f"derive key        {time.perf_counter() - start:8.2f} s")
+    start = time.perf_counter()
+    keys.get(header)
+    print(f"cached key        {(time.perf_counter() - start) * 1e6:8.1f} us")
+    print(f"document          {size / 1e6:8.1f} MB")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.enc")
+        doc = PieceTable(data)
+        del data
+
+        start = time.perf_counter()
+        save(path, doc, key, header)
+        report("save", time.perf_counter() - start, size)
+        print(f"file size         {os.path.getsize(path) / 1e6:8.1f} MB")
+
+        before = rss_mb()
+        start = time.perf_counter()
+        with EncryptedFile(path, key) as f:
+            plain, segments = f.load()
+        report("load", time.perf_counter() - start, size)
+        print(f"load RSS          +{rss_mb() - before:.0f} MB")
+
+        start = time.perf_counter()
+        opened = PieceTable(Plaintext(path, key))
+        opened.read(0, opened.line_start(100))
+        print(f"open, first screen{(time.perf_counter() - start) * 1000:8.2f} ms")
+        opened.close()
+
+        start = time.perf_counter()
+        with EncryptedFile(path, key) as f:
+            f.read(size // 2, size // 2 + 64 * 1024)
+        print(f"read one screen   {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+        doc = PieceTable(plain)
+        doc.insert(size // 2, b"edited\n")
+        start = time.perf_counter()
+        writer = save(path, doc, key, read_header(path), (path, segments))
+        print(f"save after edit   {time.perf_counter() - start:8.2f} s   "
+              f"({writer.reused} of {writer.count} segments copied)")
+        del plain, doc
+
+        if baseline:
+            # Last, since ru_maxrss only ever grows
+            from cryptography.fernet import Fernet
+            fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(b"benchmark").digest()))
+            text = (block * max(1, size // len(block))).decode("utf-8")
+            start = time.perf_counter()
+            token = fernet.encrypt(text.encode())
+            with open(path + ".old", "wb") as f:
+                f.write(token)
+            report("save (old)", time.perf_counter() - start, size)
+            print(f"file size (old)   {len(token) / 1e6:8.1f} MB")
+            del token, text
+            before = rss_mb()
+            start = time.perf_counter()
+            fernet.decrypt(read_file(path + ".old", lambda done, total: None, threading.Event())).decode()
+            report("load (old)", time.perf_counter() - start, size)
+            print(f"load RSS (old)    +{rss_mb() - before:.0f} MB")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(int(args[0]) if args else 1024, "--baseline" in sys.argv)
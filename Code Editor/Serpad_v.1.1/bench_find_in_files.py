@@ -0,0 +1,86 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from find_engine import compile_search
+from project_search import WORKERS, compile_literal, project_files, search_tree
+
+# Benchmark: Find in Files over a large tree.
+# Run: python bench_find_in_files.py [files] [KB per file]
+# Writes a tree of text files, with some binary files and an ignored build
+# folder that must be skipped, then searches it for a literal word, a
+# whole word ignoring case and a regex, each found on a few lines in 1000, with 1 worker and with every
+# power of two up to the number of cores. Reports MB/s and the speed-up
+# over one worker; the speed-up can't exceed the cores this machine has.
+# The first run of each size also warms the page cache, so every timing
+# is of a tree already in memory.
+
+WORDS = ["alpha", "beta", "gamma", "delta", "piece", "table", "search", "index", "cursor", "buffers",
+         "render", "thread", "worker", "return", "import", "class", "def", "self", "None", "True"]
+RARE = ["self.viewport.show(offset)", "buffer = None", "offset = 42"]  # each on about 1 line in 200
+QUERIES = [("literal", "viewport", False, False, False),
+           ("whole word", "Buffer", False, True, False),
+           ("regex", r"off\w+ = \d+", True, False, False)]
+
+
+def make_tree(root, files, kb, rng):
+    for i in range(files):
+        path = os.path.join(root, f"pkg{i % 40}", f"mod{i % 7}", f"file{i}.py")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lines = []
+        size = 0
+        while size < kb * 1024:
+            line = " ".join(rng.choices(WORDS, k=rng.randint(3, 12)))
+            if rng.random() < 0.015:
+                line += " " + rng.choice(RARE)
+            lines.append(line)
+            size += len(line) + 1
+        with open(path, "w") as f:
+            f.write("\n".join(lines))
+    os.makedirs(os.path.join(root, "build"))
+    for i in range(files // 10):
+        with open(os.path.join(root, "build", f"out{i}.py"), "w") as f:
+            f.write("viewport\n" * 100)
+        with open(os.path.join(root, f"pkg{i % 40}", f"blob{i}.bin"), "wb") as f:
+            f.write(b"\0" + rng.randbytes(kb * 1024))
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("/build/\n")
+
+
+def main(files=4000, kb=16):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, files, kb, rng)
+        listed = list(project_files(root))
+        size = sum(os.path.getsize(os.path.join(root, rel)) for rel in listed)
+        print(f"tree              {len(listed):,} files searched of {files + files // 5:,}, "
+              f"{size / 1e6:.0f} MB, {os.cpu_count()} cores")
+        counts = sorted({2 ** n for n in range(WORKERS.bit_length())} | {2, WORKERS})
+        for label, query, regex, whole_word, case in QUERIES:
+            pattern = compile_search(query, regex, whole_word, case)
+            literal = compile_literal(query, regex, whole_word, case)
+            base = None
+            for workers in counts:
+                found = []
+                search_tree(root, pattern, literal, found.append, workers)  # warm up
+                found = []
+                arrived = []  # when each result came in
+
+                def on_found(result):
+                    found.append(result)
+                    arrived.append(time.perf_counter())
+
+                start = time.perf_counter()
+                searched = search_tree(root, pattern, literal, on_found, workers)
+                seconds = time.perf_counter() - start
+                base = base or seconds
+                first = (arrived[0] - start) * 1e3 if arrived else 0
+                print(f"  {label:<12}{workers:>3} workers  {seconds:6.2f} s  {size / 1e6 / seconds:7.1f} MB/s  "
+                      f"x{base / seconds:4.2f}  first result {first:6.1f} ms  "
+                      f"{sum(r[2] for r in found):,} matches in {len(found):,} of {searched:,} files")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,118 @@
+import os
+import random
+import statistics
+import sys
+import time
+
+from pygments.lexers import PythonLexer
+
+from highlighter import MARGIN, LexCache
+
+# Benchmark: per-keystroke highlighting latency against file size.
+# Run: python bench_highlight.py [max lines] [--baseline]
+# Once the idle lexer has filled the cache, each keystroke inserts one
+# character into a random line on screen and re-lexes until the lexer
+# state converges, as Highlighter does after an edit. Every 20th keystroke
+# opens a triple-quoted string instead, which changes the state of
+# everything below it. --baseline also times lexing
+# the whole document once, the least a re-lex-everything highlighter
+# pays per keystroke. With a display the real Tk widget is timed too.
+
+SOURCE = '''\
+class Item{n}:
+    """Item number {n}."""
+
+    def __init__(self, name, price=0.0):
+        self.name = name  # shown in the list
+        self.price = float(price)
+
+    def total(self, count):
+        return round(self.price * count * 1.{n}, 2)
+
+
+'''
+VIEW = 40  # lines on screen
+KEYS = 200
+
+
+def make_source(lines):
+    block = SOURCE.count("\n")
+    return [line + "\n" for n in range(lines // block + 1)
+            for line in SOURCE.format(n=n).split("\n")[:-1]][:lines]
+
+
+def idle_lex(doc):
+    """A filled cache, and the time the idle lexer spends filling it."""
+    cache = LexCache(PythonLexer(), lambda first, last: doc[first:last])
+    start = time.perf_counter()
+    cache.advance(len(doc))
+    return cache, time.perf_counter() - start
+
+
+def keystrokes(doc, cache, keys=KEYS):
+    rng = random.Random(0)
+    times = []
+    for k in range(keys):
+        top = rng.randrange(max(1, len(doc) - VIEW))
+        line = top + rng.randrange(VIEW)
+        start = time.perf_counter()
+        doc[line] = ('"""' if k % 20 == 19 else "x") + doc[line]
+        cache.edited(line, 0, 0)
+        for _, _, converged in cache.tokens(line, top + VIEW + MARGIN):
+            if converged:
+                break
+        times.append(time.perf_counter() - start)
+        doc[line] = doc[line][3 if k % 20 == 19 else 1:]
+        cache.edited(line, 0, 0)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99)]
+
+
+def keystrokes_tk(doc, keys=KEYS):
+    import tkinter as tk
+    from highlighter import Highlighter
+    root = tk.Tk()
+    try:
+        text = tk.Text(root, width=100, height=VIEW)
+        text.pack()
+        Highlighter(text, PythonLexer())
+        text.insert("1.0", "".join(doc))
+        root.update()
+        rng = random.Random(0)
+        times = []
+        for _ in range(keys):
+            line = rng.randrange(len(doc)) + 1
+            text.see(f"{line}.0")
+            root.update()
+            start = time.perf_counter()
+            text.insert(f"{line}.0", "x")
+            root.update_idletasks()
+            times.append(time.perf_counter() - start)
+        times.sort()
+        return statistics.median(times), times[int(len(times) * 0.99)]
+    finally:
+        root.destroy()
+
+
+def main(max_lines=100000, baseline=False):
+    lines = 1000
+    while lines <= max_lines:
+        doc = make_source(lines)
+        cache, elapsed = idle_lex(doc)
+        median, p99 = keystrokes(doc, cache)
+        print(f"{lines:>9,} lines  keystroke median {median * 1000:7.3f} ms  p99 {p99 * 1000:7.3f} ms  "
+              f"idle lex {elapsed:6.2f} s")
+        if os.environ.get("DISPLAY"):
+            median, p99 = keystrokes_tk(doc)
+            print(f"{'':>9}        Tk        median {median * 1000:7.3f} ms  p99 {p99 * 1000:7.3f} ms")
+        if baseline:
+            start = time.perf_counter()
+            for _ in PythonLexer().get_tokens_unprocessed("".join(doc)):
+                pass
+            print(f"{'':>9}        lex all (old)     {(time.perf_counter() - start) * 1000:10.1f} ms")
+        lines *= 10
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(int(args[0]) if args else 100000, "--baseline" in sys.argv)
@@ -0,0 +1,105 @@
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from piece_table import PieceTable
+from serpad_io import write_temp
+from viewport import WINDOW_BYTES, WINDOW_LINES
+
+# Benchmark: time to first screen when opening a large file, background line
+# indexing, and streaming save throughput.
+# Run: python bench_open.py [size in MB] [--baseline]
+# --baseline also times the old read-everything path (needs RAM for
+# several copies of the file). With a display the real Tk viewport is
+# timed too.
+
+LINE = b"2025-06-29 12:00:00,123 INFO [worker-7] request handled in 12ms path=/api/v1/items\n"
+
+
+def rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_file(path, size):
+    block = LINE * (1024 * 1024 // len(LINE))
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+
+
+def first_screen(path):
+    # What SecureEditor does before the first paint: map, estimate, render a window
+    doc = PieceTable.open(path)
+    doc.line_count(estimate=True)
+    doc.read(0, min(doc.line_start(WINDOW_LINES), WINDOW_BYTES)).decode("utf-8", "surrogateescape")
+    return doc
+
+
+def first_screen_tk(path):
+    import tkinter as tk
+    from viewport import TextViewport
+    root = tk.Tk()
+    try:
+        view = TextViewport(root, wrap="none")
+        view.pack(fill=tk.BOTH, expand=True)
+        start = time.perf_counter()
+        view.set_document(PieceTable.open(path))
+        root.update()
+        return time.perf_counter() - start
+    finally:
+        root.destroy()
+
+
+def main(size_mb=1024, baseline=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.log")
+        make_file(path, size_mb * 1024 * 1024)
+        size = os.path.getsize(path)
+        print(f"file             {size / 1e6:10.1f} MB")
+
+        before = rss_mb()
+        start = time.perf_counter()
+        doc = first_screen(path)
+        print(f"first screen     {(time.perf_counter() - start) * 1000:10.2f} ms, "
+              f"RSS +{rss_mb() - before:.0f} MB")
+        if os.environ.get("DISPLAY"):
+            print(f"first screen Tk  {first_screen_tk(path) * 1000:10.2f} ms")
+
+        start = time.perf_counter()
+        doc.lines.scan(cancel=threading.Event())
+        elapsed = time.perf_counter() - start
+        print(f"index lines      {elapsed:10.2f} s   ({size / elapsed / 1e6:.0f} MB/s, "
+              f"{doc.line_count():,} lines)")
+
+        start = time.perf_counter()
+        doc.insert(len(doc) // 2, b"edited\n")
+        print(f"edit             {(time.perf_counter() - start) * 1e6:10.1f} us")
+
+        snapshot = doc.snapshot()
+        start = time.perf_counter()
+        tmp_path = write_temp(os.path.join(tmp, "saved.log"), doc.chunks(snapshot=snapshot),
+                              snapshot[1], lambda done, total: None, threading.Event())
+        elapsed = time.perf_counter() - start
+        print(f"save (streamed)  {elapsed:10.2f} s   ({size / elapsed / 1e6:.0f} MB/s)")
+        os.remove(tmp_path)
+        doc.close()
+
+        if baseline:
+            # Last, since ru_maxrss only ever grows
+            before = rss_mb()
+            start = time.perf_counter()
+            with open(path, "r", encoding="utf-8") as f:
+                f.read()
+            print(f"read all (old)   {(time.perf_counter() - start) * 1000:10.1f} ms, "
+                  f"RSS +{rss_mb() - before:.0f} MB")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(int(args[0]) if args else 1024, "--baseline" in sys.argv)
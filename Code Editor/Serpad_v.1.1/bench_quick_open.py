@@ -0,0 +1,99 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from path_index import Matcher, PathIndex, index_file
+
+# Benchmark: Quick Open over a large project.
+# Run: python bench_quick_open.py [paths to search] [files on disk]
+# Searches a synthetic list of paths for queries as they grow key by key
+# and reports the search times, the time to set up the matcher and its
+# memory. Then writes a tree of files, indexes it (a full listing), saves
+# and reloads the index, and refreshes it after touching a few
+# directories, which is what reopening Quick Open costs.
+
+SYLLABLES = ["ab", "ac", "al", "an", "ar", "ba", "be", "bi", "ca", "ce", "co", "da", "de", "di", "do", "el",
+             "en", "er", "es", "fa", "fi", "ga", "ge", "ha", "he", "in", "is", "ka", "la", "le", "li", "lo",
+             "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "or", "pa", "pe", "pi", "po", "ra", "re", "ri",
+             "ro", "sa", "se", "si", "so", "ta", "te", "ti", "to", "un", "va", "ve", "vi", "za"]
+EXTENSIONS = ["py", "c", "h", "js", "ts", "md", "txt", "json", "go", "rs"]
+QUERIES = ["piecetable", "viewport.py", "editor/view", "jsonl", "rdmtest", "tests", "q", "zzzzxq"]
+
+
+def words(rng, count):
+    return list({"".join(rng.choices(SYLLABLES, k=rng.randint(1, 4))) for _ in range(count)})
+
+
+def make_paths(count, rng):
+    vocab = words(rng, 3000) + ["src", "lib", "test", "tests", "core", "docs", "util", "editor", "piece", "table"]
+    dirs = ["/".join(rng.choices(vocab, k=rng.randint(1, 6))) for _ in range(max(1, count // 15))]
+    paths = set()
+    while len(paths) < count:
+        name = "_".join(rng.choices(vocab, k=rng.randint(1, 3)))
+        if rng.random() < 0.2:
+            name = "".join(w.capitalize() for w in name.split("_"))
+        paths.add(f"{rng.choice(dirs)}/{name}.{rng.choice(EXTENSIONS)}")
+    return list(paths) + ["src/editor/piece_table.py", "src/editor/viewport.py", "docs/PieceTable.md"]
+
+
+def bench_search(count, rng):
+    paths = make_paths(count, rng)
+    start = time.perf_counter()
+    matcher = Matcher(paths)
+    print(f"matcher           {len(paths):,} paths, built in {time.perf_counter() - start:.2f} s, "
+          f"{(len(matcher._names.text) + len(matcher._folders.text)) / 1e6:.0f} MB of text")
+    times = []
+    for query in QUERIES:
+        per_key = []
+        for n in range(1, len(query) + 1):
+            start = time.perf_counter()
+            results = matcher.search(query[:n])
+            per_key.append(time.perf_counter() - start)
+        times += per_key
+        print(f"  {query!r:<16}max {max(per_key) * 1e3:6.1f} ms per key   {len(results):>3} results"
+              f"   first: {results[0] if results else '-'}")
+    times.sort()
+    print(f"search            median {statistics.median(times) * 1e3:6.2f} ms   "
+          f"95% {times[int(len(times) * 0.95)] * 1e3:6.2f} ms   max {times[-1] * 1e3:6.2f} ms")
+
+
+def bench_walk(count, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "project")
+        for rel in make_paths(count, rng):
+            path = os.path.join(root, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+        index_path = index_file(os.path.join(tmp, "index"), root)
+
+        index = PathIndex.load(root, index_path)
+        start = time.perf_counter()
+        index.refresh()
+        print(f"full index        {len(index):,} files in {len(index.dirs):,} folders, "
+              f"{time.perf_counter() - start:.2f} s, index file {os.path.getsize(index_path) / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        index = PathIndex.load(root, index_path)
+        print(f"load index        {time.perf_counter() - start:.2f} s")
+
+        folders = rng.sample(sorted(index.dirs), min(10, len(index.dirs)))
+        time.sleep(0.01)  # so the new mtimes differ
+        for rel in folders:
+            open(os.path.join(root, *rel.split("/"), "added.txt"), "wb").close()
+        start = time.perf_counter()
+        index.refresh()
+        print(f"refresh           {time.perf_counter() - start:.2f} s, {index.listed} folders listed again, "
+              f"{len(index):,} files")
+
+
+def main(count=500000, files=50000):
+    rng = random.Random(0)
+    bench_search(count, rng)
+    bench_walk(files, rng)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
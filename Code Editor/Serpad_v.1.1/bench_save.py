@@ -0,0 +1,89 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from journal import CHECKPOINT, Journal, journal_path, replay
+from piece_table import PieceTable
+from serpad_io import replace_temp, write_temp
+
+# Benchmark: saving a large file after small edits.
+# Run: python bench_save.py [size in MB] [saves]
+# Each round edits a few lines at random places and saves through the
+# journal, then checkpoints once more. Reports the time per save and the
+# journal size, the time to replay the journal as when reopening the file,
+# and whether a journal cut off mid-record (a crash during a save) still
+# replays to the last complete save. Ends with one full rewrite through a
+# temp file, which is what every save used to cost and what compaction costs.
+
+LINE = b"2025-06-29 12:00:00,123 INFO [worker-7] request %08x handled in %dms path=/api/v1/items\n"
+EDITS = 5
+
+
+def edit(doc, rng):
+    for _ in range(EDITS):
+        offset = doc.line_start(rng.randrange(doc.line_count()))
+        if rng.random() < 0.7:
+            doc.insert(offset, b"edited %d\n" % rng.randrange(10 ** 6))
+        else:
+            doc.delete(offset, min(80, len(doc) - offset))
+
+
+def main(size_mb=1024, saves=50):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.log")
+        block = b"".join(LINE % (rng.getrandbits(32), rng.randrange(100)) for _ in range(10000))
+        with open(path, "wb") as f:
+            for _ in range(max(1, size_mb * 1024 * 1024 // len(block))):
+                f.write(block)
+        doc = PieceTable.open(path)
+        print(f"document          {len(doc) / 1e6:8.1f} MB, {saves} saves, {EDITS} edits between")
+        journal = Journal.start(doc, path)
+        times = []
+        for _ in range(saves):
+            edit(doc, rng)
+            start = time.perf_counter()
+            journal.append(doc.snapshot(), len(doc.added), doc.version)
+            times.append(time.perf_counter() - start)
+        saved = doc.read()
+        edit(doc, rng)
+        journal.append(doc.snapshot(), len(doc.added), doc.version, CHECKPOINT)
+        unsaved = doc.read()
+        journal.close()
+        times.sort()
+        print(f"journaled save    median {times[len(times) // 2] * 1e3:6.2f} ms   "
+              f"max {times[-1] * 1e3:6.2f} ms   journal {journal.size / 1e3:.1f} KB")
+
+        start = time.perf_counter()
+        replayed, journal, checkpoint = replay(path)
+        elapsed = time.perf_counter() - start
+        same = replayed.read() == saved
+        replayed.restore(checkpoint)
+        same = same and replayed.read() == unsaved
+        print(f"replay            {elapsed * 1e3:8.2f} ms   {'ok' if same else 'MISMATCH'}")
+        journal.close()
+        replayed.close()
+
+        # A crash halfway through writing the checkpoint
+        with open(journal_path(path), "r+b") as f:
+            f.truncate(os.path.getsize(journal_path(path)) - 20)
+        replayed, journal, checkpoint = replay(path)
+        ok = replayed.read() == saved and checkpoint is None
+        print(f"torn record       {'ok' if ok else 'MISMATCH'}")
+        journal.close()
+        replayed.close()
+
+        start = time.perf_counter()
+        snapshot = doc.snapshot()
+        tmp_path = write_temp(path, doc.chunks(snapshot=snapshot), snapshot[1],
+                              lambda done, total: None, threading.Event())
+        replace_temp(tmp_path, path)
+        print(f"full rewrite      {time.perf_counter() - start:8.2f} s")
+        doc.close()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,75 @@
+import os
+import statistics
+import subprocess
+import sys
+
+# Benchmark: cold start of the Serpad editors.
+# Run: python bench_startup.py [runs]
+# Imports each editor in a fresh interpreter under -X importtime, which is
+# what starting it does before its window is built, and reports the median
+# time on top of a bare interpreter and the slowest modules. Modules that
+# are only needed once a feature is used (encryption, highlighting, the
+# network) must not be imported at startup at all. Exits with status 1 if
+# one is, or if an editor takes longer than its budget.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = {"serpad_m062925002": 75, "serpad_m062925001": 45}
+LAZY = ("cryptography", "pygments", "requests", "numpy")
+SHOWN = 5
+
+
+def import_times(code):
+    """[(module, self µs, cumulative µs, depth)] for one run of `code`, in
+    the order -X importtime lists them: every module after its imports."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE,
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, total, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), int(own), int(total), depth))
+    return times
+
+
+def startup(code, runs):
+    """(median ms over a bare interpreter, times of the last run)."""
+    base = sum(total for _, _, total, depth in import_times("pass") if depth == 0)
+    totals = []
+    for _ in range(runs):
+        times = import_times(code)
+        totals.append(sum(total for _, _, total, depth in times if depth == 0) - base)
+    return statistics.median(totals) / 1e3, times
+
+
+def direct_imports(times, module):
+    """(cumulative µs, name) of the modules `module` imported itself."""
+    found = []
+    for name, _, total, depth in times:
+        if depth == 0:
+            if name == module:
+                return found
+            found = []
+        elif depth == 1:
+            found.append((total, name))
+    return []
+
+
+def main(runs=7):
+    failed = False
+    for module, budget in BUDGET_MS.items():
+        ms, times = startup(f"import {module}", runs)
+        lazy = sorted({name.split(".")[0] for name, *_ in times} & set(LAZY))
+        over = ms > budget
+        failed = failed or over or bool(lazy)
+        print(f"{module:<20}{ms:7.1f} ms   budget {budget} ms   {'OVER' if over else 'ok'}")
+        for total, name in sorted(direct_imports(times, module), reverse=True)[:SHOWN]:
+            print(f"    {name:<24}{total / 1e3:7.1f} ms")
+        if lazy:
+            print(f"    imported at startup: {', '.join(lazy)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,124 @@
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from piece_table import PieceTable
+from viewport import WINDOW_LINES
+from workspace import Tab, Workspace, doc_memory
+
+# Benchmark: many open files in one Serpad workspace.
+# Run: python bench_tabs.py [files] [size in MB] [switches]
+# Opens every file as a tab, reads each one as when its tab is first
+# shown (map it and read the window of lines a viewport renders), edits a
+# few lines in some, and reports the estimated memory per document and
+# the RSS of the process. Then switches between random tabs under a
+# budget that only fits a few of them, so tabs are evicted and read back,
+# and reports the switch times. With a display the real editor is timed
+# too, widgets and all.
+
+LINE = b"2025-06-29 12:00:00,123 INFO [worker-7] request %08x handled in %dms path=/api/v1/items\n"
+
+
+def rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_files(folder, count, size, rng):
+    block = b"".join(LINE % (rng.getrandbits(32), rng.randrange(100)) for _ in range(10000))
+    paths = []
+    for n in range(count):
+        path = os.path.join(folder, f"file{n:03}.log")
+        with open(path, "wb") as f:
+            for _ in range(max(1, size // len(block))):
+                f.write(block)
+        paths.append(path)
+    return paths
+
+
+def show(tab):
+    # What a tab switch does before Tk draws: read the file back if needed
+    # and the lines its viewport renders
+    if tab.doc is None:
+        tab.doc = PieceTable.open(tab.path)
+    doc = tab.doc
+    line = doc.line_of(min(tab.position, len(doc)))
+    doc.read(doc.line_start(max(0, line - WINDOW_LINES // 2)), doc.line_start(line + WINDOW_LINES // 2))
+
+
+def report(label, times):
+    times = sorted(times)
+    print(f"{label:<18}median {statistics.median(times) * 1e3:6.2f} ms   "
+          f"95% {times[int(len(times) * 0.95)] * 1e3:6.2f} ms   max {times[-1] * 1e3:6.2f} ms")
+
+
+def main(files=40, size_mb=20, switches=400):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_files(tmp, files, size_mb * 1024 * 1024, rng)
+        before = rss_mb()
+        workspace = Workspace(budget=0)
+        tabs = [workspace.add(Tab(path)) for path in paths]
+        for tab in tabs:
+            show(tab)
+            if rng.random() < 0.3:
+                doc = tab.doc
+                for _ in range(20):
+                    doc.insert(doc.line_start(rng.randrange(doc.line_count(estimate=True))), b"edited\n")
+        sizes = [doc_memory(tab.doc) for tab in tabs]
+        print(f"open tabs         {files} x {size_mb} MB")
+        print(f"memory per doc    median {statistics.median(sizes) / 1e3:7.1f} KB   max {max(sizes) / 1e3:7.1f} KB")
+        print(f"process RSS       +{rss_mb() - before:.0f} MB for all {files}, mapped file pages included")
+
+        # A budget for about a quarter of them
+        workspace.budget = sum(sorted(sizes)[:max(1, files // 4)])
+        first, evictions, times = [], 0, []
+        for _ in range(switches):
+            tab = rng.choice(tabs)
+            start = time.perf_counter()
+            loaded = tab.doc is not None
+            workspace.select(tab)
+            show(tab)
+            (times if loaded else first).append(time.perf_counter() - start)
+            for old in workspace.over_budget():
+                if not old.modified:
+                    old.doc.close()
+                    old.doc = None
+                    evictions += 1
+        report("switch (loaded)", times)
+        if first:
+            report("switch (evicted)", first)
+        print(f"evictions         {evictions}, {sum(t.doc is not None for t in tabs)} of {files} loaded at the end, "
+              f"{workspace.total() / 1e6:.1f} MB")
+        for tab in tabs:
+            if tab.doc is not None:
+                tab.doc.close()
+
+        if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+            bench_editor(paths, switches, rng)
+
+
+def bench_editor(paths, switches, rng):
+    import tkinter as tk
+    from serpad_m062925002 import SecureEditor
+
+    root = tk.Tk()
+    app = SecureEditor(root)
+    for path in paths:
+        app._open(path, select=False)
+    tabs = list(app.workspace.tabs)
+    for _ in range(switches):
+        app._select(rng.choice(tabs))
+    stats = app.workspace.stats()
+    print(f"editor switch     median {stats['switch_median'] * 1e3:6.2f} ms   "
+          f"95% {stats['switch_p95'] * 1e3:6.2f} ms   {stats['widgets']} widgets, "
+          f"{stats['memory'] / 1e6:.1f} MB")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,144 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from find_engine import compile_search, replace_spans
+from piece_table import PieceTable
+from undo_history import UndoHistory, fingerprint
+
+# Benchmark: undo history over a long editing session.
+# Run: python bench_undo.py [hours] [KB document]
+# Plays a working day on a simulated clock: bursts of typing with
+# backspacing, pastes, a Replace All now and then, undos followed by new
+# typing (branches), and a save every ten minutes. Reports, every hour,
+# the history's steps, the bytes it holds in memory and the size of its
+# log, and the time taken to record an edit. Then times undo and redo
+# through the whole day, including steps read back from the log, a jump
+# back across branches, and reloading the history as on reopening the file.
+
+WORDS = ["piece", "table", "offset", "cursor", "render", "window", "return", "self", "None", "value",
+         "index", "line", "buffer", "history", "delta", "save", "undo", "redo", "node", "list"]
+KEYS_PER_HOUR = 9000  # steady typing, with pauses
+SAVE_S = 600
+
+
+def history_bytes(history):
+    """What the history holds in memory: deltas and per-step arrays."""
+    arrays = sum(len(a) * a.itemsize for a in (history.parent, history.child, history.time, history.where))
+    typing = sum(len(part) for part in history.typing[2:]) if history.typing else 0
+    return history.memory + arrays + typing
+
+
+def record(history, times, *edit):
+    start = time.perf_counter()
+    history.record(*edit)
+    times.append(time.perf_counter() - start)
+
+
+def type_text(doc, history, rng, now, text, times):
+    at = rng.randrange(len(doc) + 1)
+    for c in text.encode():
+        data = bytes([c])
+        doc.insert(at, data)
+        record(history, times, at, b"", data, now)
+        at += 1
+        now += rng.uniform(0.08, 0.3)
+    # Some of it backspaced again
+    for _ in range(rng.randrange(4) and rng.randint(1, 6)):
+        at -= 1
+        removed = doc.read(at, at + 1)
+        doc.delete(at, 1)
+        record(history, times, at, removed, b"", now)
+        now += rng.uniform(0.1, 0.3)
+    return now
+
+
+def main(hours=8, kb=512):
+    rng = random.Random(0)
+    folder = tempfile.mkdtemp()
+    log = os.path.join(folder, "doc.undo")
+    doc = PieceTable(" ".join(rng.choices(WORDS, k=kb * 1024 // 6)).encode())
+    history = UndoHistory(log)
+    history.saved = 0
+    now = 0.0
+    keys = 0
+    record_times = []  # seconds per edit recorded
+    replace_times = []
+    next_save = SAVE_S
+    print(f"document          {len(doc) / 1e3:,.0f} KB")
+    for hour in range(1, hours + 1):
+        while now < hour * 3600:
+            pick = rng.random()
+            if pick < 0.9:
+                text = " ".join(rng.choices(WORDS, k=rng.randint(1, 12))) + rng.choice([" ", "\n"])
+                now = type_text(doc, history, rng, now, text, record_times)
+                keys += len(text)
+            elif pick < 0.95:
+                at = rng.randrange(len(doc))
+                data = doc.read(at, at + rng.randint(100, 4000))
+                at = rng.randrange(len(doc))
+                doc.insert(at, data)
+                record(history, record_times, at, b"", data, now)
+            elif pick < 0.99:
+                for _ in range(rng.randint(1, 5)):
+                    history.undo(doc)
+            else:
+                old, new = rng.sample(WORDS, 2)
+                spans = replace_spans(doc, compile_search(old, whole_word=True), new)
+                start = time.perf_counter()
+                read = doc.reader()
+                history.record_spans([(at, read(at, end), data) for at, end, data in spans], now)
+                replace_times.append((time.perf_counter() - start, len(spans)))
+                doc.replace_spans(spans)
+            now += rng.expovariate(1 / (3600 * 12 / KEYS_PER_HOUR))  # thinking
+            if now >= next_save:
+                history.saved_at(history.checkpoint(), fingerprint(doc), log)
+                next_save += SAVE_S
+        print(f"hour {hour}            {len(history) - 1:8,} steps  {keys:8,} keys  "
+              f"memory {history_bytes(history) / 1e6:6.2f} MB  log {history.written / 1e6:6.2f} MB  "
+              f"record {statistics.mean(record_times) * 1e6:5.1f} us/edit")
+        record_times = []
+    for seconds, spans in replace_times[-3:]:
+        print(f"Replace All       {spans:8,} spans recorded in {seconds * 1e3:6.1f} ms")
+
+    history.saved_at(history.checkpoint(), fingerprint(doc), log)
+    final = doc.read()
+    times = []
+    undone = 0
+    start_all = time.perf_counter()
+    while True:
+        start = time.perf_counter()
+        if history.undo(doc) is None:
+            break
+        times.append(time.perf_counter() - start)
+        undone += 1
+    print(f"undo all          {undone:8,} steps in {time.perf_counter() - start_all:6.2f} s  "
+          f"median {statistics.median(times) * 1e6:6.1f} us  max {max(times) * 1e3:6.2f} ms")
+    times = []
+    start_all = time.perf_counter()
+    while True:
+        start = time.perf_counter()
+        if history.redo(doc) is None:
+            break
+        times.append(time.perf_counter() - start)
+    print(f"redo all          {len(times):8,} steps in {time.perf_counter() - start_all:6.2f} s  "
+          f"median {statistics.median(times) * 1e6:6.1f} us  max {max(times) * 1e3:6.2f} ms")
+    print(f"back at the end   {doc.read() == final}")
+    start = time.perf_counter()
+    history.goto(doc, len(history) // 2)
+    history.goto(doc, history.saved)
+    print(f"to mid-day, back  {(time.perf_counter() - start) * 1e3:8.1f} ms  {doc.read() == final}")
+    history.close()
+    mark = fingerprint(doc)
+    start = time.perf_counter()
+    reloaded = UndoHistory.load(log, mark)
+    print(f"reload            {(time.perf_counter() - start) * 1e3:8.1f} ms  {len(reloaded) - 1:,} steps  "
+          f"memory {history_bytes(reloaded) / 1e6:6.2f} MB  log {os.path.getsize(log) / 1e6:6.2f} MB")
+    reloaded.close()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,369 @@
+import base64
+import hashlib
+import json
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+from piece_table import ORIGINAL
+from serpad_io import Cancelled
+
+# Serpad encrypted file format, version 2.
+# The document is split into segments of up to 1 MB, each encrypted on its
+# own with AES-256-GCM under a random nonce, so files are written and read
+# a segment at a time and any part can be decrypted without the rest.
+# An encrypted index at the end lists every segment's length and tag in
+# order, which stops segments being dropped, reordered or swapped in from
+# another file. Segments of a file that are still whole in the document
+# when it is saved again are copied over as they are, not re-encrypted.
+# An open file is the original buffer of its document through Plaintext,
+# which decrypts a segment when something in it is first read, so only
+# the part on screen is decrypted to show it.
+#
+#   MAGIC | header length (u32) | header JSON
+#   segments:  nonce (12) | ciphertext | tag (16)
+#   index:     nonce (12) | encrypted [plaintext length (u32) | tag (16)] * n | tag (16)
+#   footer:    index offset (u64) | END
+#
+# Segments are authenticated with the header as associated data, so they
+# can't be moved to a file with different parameters. The header also
+# holds the key derivation: scrypt with a random salt and the cost it was
+# written with ("sha256" marks early files with an unsalted key). Files
+# written by older Serpad versions (plain Fernet tokens) have no MAGIC.
+# The cost is read from the file, so it is checked against SCRYPT_MAX
+# before anything is derived: a crafted header must not be able to make
+# opening a file take minutes or gigabytes.
+
+MAGIC = b"SERPAD\x00\x02"
+END = b"SPEND\x00\x00\x02"
+SEGMENT_SIZE = 1024 * 1024
+NONCE = 12
+TAG = 16
+OVERHEAD = NONCE + TAG
+ENTRY = struct.Struct(">I16s")
+FOOTER = struct.Struct(">Q8s")
+SCRYPT_COST = {"n": 2 ** 17, "r": 8, "p": 1}  # ~0.5 s and 128 MB per derivation
+SCRYPT_MAX = {"n": 2 ** 20, "r": 32, "p": 4}  # refuse headers asking for more
+SCRYPT_MEMORY = 1 << 30  # or for more memory than this (128 * r * n bytes)
+HEADER_MAX = 64 * 1024
+CACHED_SEGMENTS = 4  # decrypted segments a Plaintext keeps
+
+
+class DecryptionError(Exception):
+    pass
+
+
+def _aead(key):
+    # cryptography takes longer to import than Serpad takes to start, so it
+    # is only imported once a file is encrypted or decrypted
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(key), InvalidTag
+
+
+def new_header(cost=None):
+    """Header for a new file, with a fresh salt."""
+    kdf = {"name": "scrypt", "salt": base64.b64encode(os.urandom(16)).decode(), **(cost or SCRYPT_COST)}
+    return json.dumps({"version": 2, "cipher": "AES-256-GCM", "segment": SEGMENT_SIZE,
+                       "kdf": kdf}, sort_keys=True).encode()
+
+
+def kdf_params(header):
+    """The key derivation part of a header, as a hashable string."""
+    return json.dumps(json.loads(header)["kdf"], sort_keys=True)
+
+
+def salted(header):
+    return json.loads(header)["kdf"]["name"] == "scrypt"
+
+
+def _check_kdf(kdf):
+    if kdf["name"] == "sha256":
+        return
+    if kdf["name"] != "scrypt":
+        raise DecryptionError(f"Unknown key derivation {kdf['name']!r}")
+    n, r, p = kdf["n"], kdf["r"], kdf["p"]
+    if not all(type(v) is int for v in (n, r, p)):
+        raise DecryptionError("Bad key derivation parameters")
+    if not (1 < n <= SCRYPT_MAX["n"] and 0 < r <= SCRYPT_MAX["r"] and 0 < p <= SCRYPT_MAX["p"]
+            and 128 * r * n <= SCRYPT_MEMORY):
+        raise DecryptionError(f"The file asks for a costlier key derivation than Serpad allows "
+                              f"(scrypt n={n}, r={r}, p={p})")
+
+
+def derive_key(password, header):
+    """AES key for a file with this header."""
+    kdf = json.loads(header)["kdf"]
+    password = password.encode("utf-8")
+    _check_kdf(kdf)
+    if kdf["name"] == "sha256":
+        return hashlib.sha256(b"serpad-v2\x00" + password).digest()
+    n, r, p = kdf["n"], kdf["r"], kdf["p"]
+    try:
+        return hashlib.scrypt(password, salt=base64.b64decode(kdf["salt"]), n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=32)
+    except ValueError as e:  # n not a power of two, or a bad salt
+        raise DecryptionError(f"Bad key derivation parameters: {e}") from None
+
+
+def _read_header(f):
+    # The header after MAGIC, refused if damaged or too costly to derive a key for
+    size = f.read(4)
+    if len(size) < 4:
+        raise DecryptionError("The file is truncated")
+    (size,) = struct.unpack(">I", size)
+    header = f.read(size) if size <= HEADER_MAX else b""
+    try:
+        kdf = json.loads(header)["kdf"]
+        _check_kdf(kdf)
+    except (ValueError, KeyError, TypeError):
+        raise DecryptionError("The file header is damaged") from None
+    return header
+
+
+def read_header(path):
+    """The header of a version 2 file, or None for an old Fernet file.
+    Raises DecryptionError for a header Serpad won't derive a key for."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        return _read_header(f)
+
+
+class EncryptedFile:
+    """Random access to the plaintext of a version 2 file."""
+
+    def __init__(self, path, key):
+        self.path = path
+        self.aead, self._invalid = _aead(key)
+        self.f = open(path, "rb")
+        try:
+            self._read_index()
+        except Exception:
+            self.f.close()
+            raise
+
+    def _read_index(self):
+        f = self.f
+        if f.read(len(MAGIC)) != MAGIC:
+            raise DecryptionError("Not a Serpad encrypted file")
+        self.header = _read_header(f)
+        data_start = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        if end < data_start + FOOTER.size:
+            raise DecryptionError("The file is truncated")
+        f.seek(end - FOOTER.size)
+        index_offset, marker = FOOTER.unpack(f.read(FOOTER.size))
+        if marker != END or not data_start <= index_offset <= end - FOOTER.size - OVERHEAD:
+            raise DecryptionError("The file is truncated")
+        f.seek(index_offset)
+        record = f.read(end - FOOTER.size - index_offset)
+        try:
+            index = self.aead.decrypt(record[:NONCE], record[NONCE:], b"index" + self.header)
+        except self._invalid:
+            raise DecryptionError("Wrong password, or the file is damaged") from None
+        entries = [ENTRY.unpack_from(index, i) for i in range(0, len(index), ENTRY.size)]
+        self.lengths = [n for n, _ in entries]
+        self.tags = [tag for _, tag in entries]
+        self.starts = list(accumulate(self.lengths, initial=0))  # plaintext offsets
+        self.offsets = list(accumulate((n + OVERHEAD for n in self.lengths), initial=data_start))
+        if self.offsets[-1] != index_offset:
+            raise DecryptionError("The file is damaged")
+        self.length = self.starts[-1]
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.length
+
+    def record(self, i):
+        """Segment i as stored (nonce, ciphertext and tag)."""
+        self.f.seek(self.offsets[i])
+        return self.f.read(self.lengths[i] + OVERHEAD)
+
+    def segment(self, i):
+        record = self.record(i)
+        if record[-TAG:] != self.tags[i]:
+            raise DecryptionError(f"Segment {i} is not the one the index lists")
+        try:
+            return self.aead.decrypt(record[:NONCE], record[NONCE:], self.header)
+        except self._invalid:
+            raise DecryptionError(f"Segment {i} is damaged") from None
+
+    def read(self, start=0, end=None):
+        """Plaintext [start, end), decrypting only the segments it overlaps."""
+        end = self.length if end is None else min(end, self.length)
+        if start >= end:
+            return b""
+        first = bisect_right(self.starts, start) - 1
+        last = bisect_left(self.starts, end)
+        data = b"".join(self.segment(i) for i in range(first, last))
+        base = self.starts[first]
+        return data[start - base:end - base]
+
+    def load(self, progress=None, cancel=None):
+        """(plaintext, segments): the whole document in one bytearray, and
+        the (start, end, offset, tag) of each segment in it and in the file."""
+        data = bytearray(self.length)
+        for i, start in enumerate(self.starts[:-1]):
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            data[start:self.starts[i + 1]] = self.segment(i)
+            if progress is not None:
+                progress(self.starts[i + 1], self.length)
+        return data, self.segments()
+
+    def segments(self):
+        return [(self.starts[i], self.starts[i + 1], self.offsets[i], self.tags[i])
+                for i in range(len(self.lengths))]
+
+
+class Plaintext:
+    """The plaintext of a version 2 file as a read-only buffer, for a
+    PieceTable's original: len(), slices and find(), decrypting the
+    segments a read overlaps. May be read from several threads."""
+
+    def __init__(self, path, key):
+        self.file = EncryptedFile(path, key)
+        self.cache = OrderedDict()  # segment number -> plaintext, most recently read last
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.file.close()
+
+    def __len__(self):
+        return self.file.length
+
+    def __getitem__(self, index):
+        start, end, _ = index.indices(self.file.length)
+        starts = self.file.starts
+        out = []
+        with self._lock:
+            i = bisect_right(starts, start) - 1
+            while start < end:
+                data = self._segment(i)
+                out.append(data[start - starts[i]:min(end, starts[i + 1]) - starts[i]])
+                start = starts[i + 1]
+                i += 1
+        return b"".join(out)
+
+    def find(self, sub, start=0, end=None):
+        end = self.file.length if end is None else end
+        at = self[start:end].find(sub)
+        return at if at < 0 else start + at
+
+    def _segment(self, i):
+        data = self.cache.get(i)
+        if data is None:
+            data = self.file.segment(i)
+            self.cache[i] = data
+            if len(self.cache) > CACHED_SEGMENTS:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(i)
+        return data
+
+
+class EncryptedWriter:
+    """Writes a document snapshot as a version 2 file, a segment at a time.
+
+    `origin` is (path, segments) for the file the document's original buffer
+    was loaded from (or last saved to) with this key and header; segments
+    that are still whole in the document are copied from it. After
+    chunks() is exhausted, `segments` describes the new file the same way.
+    """
+
+    def __init__(self, key, header=None, origin=None, segment_size=SEGMENT_SIZE):
+        self.aead, _ = _aead(key)
+        self.header = header or new_header()
+        self.origin = origin
+        self.segment_size = segment_size
+        self.segments = None
+        self.count = 0  # segments written
+        self.reused = 0  # of which copied
+
+    def _encrypt(self, data):
+        nonce = os.urandom(NONCE)
+        return nonce + self.aead.encrypt(nonce, bytes(data), self.header)
+
+    def chunks(self, doc, snapshot):
+        """Yield the bytes of the file."""
+        pieces, _ = snapshot
+        reuse_starts = []
+        reuse = []
+        source_file = None
+        if self.origin is not None:
+            reuse = self.origin[1]
+            reuse_starts = [start for start, _, _, _ in reuse]
+            source_file = open(self.origin[0], "rb")
+        lengths = []
+        tags = []
+        segments = []
+        offset = len(MAGIC) + 4 + len(self.header)
+        pending = bytearray()
+
+        def emit(record, kept=None):
+            nonlocal offset
+            lengths.append(len(record) - OVERHEAD)
+            tags.append(record[-TAG:])
+            if kept is not None:
+                segments.append((kept[0], kept[1], offset, record[-TAG:]))
+            offset += len(record)
+            return record
+
+        def copy(segment):
+            # The stored segment, if the file still holds the one it had
+            start, end, at, tag = segment
+            source_file.seek(at)
+            record = source_file.read(end - start + OVERHEAD)
+            return record if record[-TAG:] == tag else None
+
+        try:
+            yield MAGIC + struct.pack(">I", len(self.header)) + self.header
+            for source, s, e, _ in pieces:
+                while s < e:
+                    cut = e
+                    whole = None
+                    if source == ORIGINAL and reuse:
+                        # The next origin segment starting at or after s
+                        i = bisect_left(reuse_starts, s)
+                        if i < len(reuse) and reuse[i][1] <= e:
+                            if reuse[i][0] == s:
+                                whole = reuse[i]
+                            cut = reuse[i][0] if whole is None else reuse[i][1]
+                    record = None if whole is None else copy(whole)
+                    if record is not None:
+                        while pending:
+                            yield emit(self._encrypt(pending[:self.segment_size]))
+                            del pending[:self.segment_size]
+                        self.reused += 1
+                        yield emit(record, whole)
+                    else:
+                        step = min(cut, s + self.segment_size)
+                        pending += doc.span(source, s, step)
+                        while len(pending) >= self.segment_size:
+                            yield emit(self._encrypt(pending[:self.segment_size]))
+                            del pending[:self.segment_size]
+                        cut = step
+                    s = cut
+            if pending:
+                yield emit(self._encrypt(pending))
+        finally:
+            if source_file is not None:
+                source_file.close()
+        index = b"".join(ENTRY.pack(n, tag) for n, tag in zip(lengths, tags))
+        nonce = os.urandom(NONCE)
+        yield nonce + self.aead.encrypt(nonce, index, b"index" + self.header)
+        yield FOOTER.pack(offset, END)
+        self.segments = segments
+        self.count = len(lengths)
@@ -0,0 +1,155 @@
+import re
+from array import array
+
+from serpad_io import Cancelled
+
+# Search and replace over a PieceTable.
+# The document is decoded a block of whole lines at a time and searched
+# with one compiled pattern, so nothing talks to Tk per match. Matches are
+# reported as byte offsets into the document; a Replace All is a list of
+# (start, end, data) spans for PieceTable.replace_spans, i.e. one edit.
+# Invalid UTF-8 is decoded with surrogateescape, so it round-trips and
+# byte offsets stay exact. Matches never span two blocks, which only
+# matters for patterns that match across a newline.
+
+BLOCK_SIZE = 1024 * 1024
+HIGHLIGHT_MAX = 2000  # matches tagged in the visible region
+MAX_MATCHES = 2000000  # offsets kept by match_offsets
+
+
+def compile_search(query, regex=False, whole_word=False, case=False):
+    """Pattern for a search; raises re.error for an invalid regex."""
+    pattern = query if regex else re.escape(query)
+    if whole_word:
+        pattern = rf"\b(?:{pattern})\b"
+    return re.compile(pattern, re.MULTILINE | (0 if case else re.IGNORECASE))
+
+
+def iter_text(doc, snapshot=None, size=BLOCK_SIZE):
+    """Yield (byte offset, text) for blocks of whole lines of the document."""
+    offset = 0
+    parts = []
+    for chunk in doc.chunks(size=size, snapshot=snapshot):
+        cut = chunk.rfind(b"\n") + 1
+        if not cut:
+            parts.append(chunk)
+            continue
+        parts.append(chunk[:cut])
+        data = b"".join(parts)
+        yield offset, data.decode("utf-8", "surrogateescape")
+        offset += len(data)
+        parts = [chunk[cut:]]
+    data = b"".join(parts)
+    if data:
+        yield offset, data.decode("utf-8", "surrogateescape")
+
+
+def _utf8_len(text):
+    return len(text) if text.isascii() else len(text.encode("utf-8", "surrogateescape"))
+
+
+def block_matches(pattern, text, offset, group=0):
+    """Yield (start, end, match) in byte offsets for `text`, a decoded block
+    starting at byte `offset`."""
+    if text.isascii():
+        for m in pattern.finditer(text):
+            start, end = m.span(group)
+            yield offset + start, offset + end, m
+        return
+    char = 0
+    byte = offset
+    for m in pattern.finditer(text):
+        start, end = m.span(group)
+        byte += _utf8_len(text[char:start])
+        char = start
+        yield byte, byte + _utf8_len(text[start:end]), m
+
+
+def find_all(doc, pattern, snapshot=None, cancel=None, progress=None):
+    """Yield (start, end, match) for every match, in byte offsets."""
+    total = snapshot[1] if snapshot else len(doc)
+    for offset, text in iter_text(doc, snapshot):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        yield from block_matches(pattern, text, offset)
+        if progress is not None:
+            progress(offset + _utf8_len(text), total)
+
+
+def match_offsets(doc, pattern, snapshot=None, cancel=None, progress=None, limit=MAX_MATCHES):
+    """(starts, ends, complete): byte offset arrays of every place the
+    pattern matches, overlapping ones included, up to `limit` matches."""
+    total = snapshot[1] if snapshot else len(doc)
+    anywhere = re.compile(f"(?=({pattern.pattern}))", pattern.flags)
+    starts = array("q")
+    ends = array("q")
+    for offset, text in iter_text(doc, snapshot):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        if text.isascii():
+            spans = [m.span(1) for m in anywhere.finditer(text)]
+            starts.extend([offset + start for start, _ in spans])
+            ends.extend([offset + end for _, end in spans])
+        else:
+            for start, end, _ in block_matches(anywhere, text, offset, 1):
+                starts.append(start)
+                ends.append(end)
+        if len(starts) >= limit:
+            return starts[:limit], ends[:limit], False
+        if progress is not None:
+            progress(offset + _utf8_len(text), total)
+    return starts, ends, True
+
+
+def narrow(read, starts, pattern, width, cancel=None):
+    """(starts, ends) of the positions in `starts` where `pattern` matches.
+
+    When a literal query grows, its matches are a subset of the previous
+    ones, so only those positions need looking at. `read` comes from
+    PieceTable.reader(); `width` bytes are enough to hold a match.
+    """
+    new_starts = array("q")
+    new_ends = array("q")
+    for n, start in enumerate(starts):
+        if not n % 4096 and cancel is not None and cancel.is_set():
+            raise Cancelled()
+        m = pattern.match(read(start, start + width).decode("utf-8", "surrogateescape"))
+        if m:
+            new_starts.append(start)
+            new_ends.append(start + _utf8_len(m.group()))
+    return new_starts, new_ends
+
+
+def count_matches(doc, pattern, snapshot=None, cancel=None, progress=None):
+    total = snapshot[1] if snapshot else len(doc)
+    count = 0
+    for offset, text in iter_text(doc, snapshot):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        count += sum(1 for _ in pattern.finditer(text))
+        if progress is not None:
+            progress(offset + _utf8_len(text), total)
+    return count
+
+
+def replace_spans(doc, pattern, repl, regex=False, snapshot=None, cancel=None, progress=None):
+    """Spans replacing every match. With `regex`, repl may use \\1 and \\g<name>."""
+    literal = repl.encode("utf-8")
+    spans = []
+    for start, end, m in find_all(doc, pattern, snapshot, cancel, progress):
+        data = m.expand(repl).encode("utf-8", "surrogateescape") if regex else literal
+        spans.append((start, end, data))
+    return spans
+
+
+def highlight_visible(text, pattern, tag="match"):
+    """Tag matches in the part of a Text widget that is on screen."""
+    text.tag_remove(tag, "1.0", "end")
+    if pattern is None:
+        return
+    first = text.index("@0,0 linestart")
+    last = text.index(f"@0,{text.winfo_height()} lineend")
+    for n, m in enumerate(pattern.finditer(text.get(first, last))):
+        if n == HIGHLIGHT_MAX or m.start() == m.end():
+            break
+        text.tag_add(tag, f"{first}+{m.start()}c", f"{first}+{m.end()}c")
@@ -0,0 +1,343 @@
+import os
+import re
+import tkinter as tk
+from collections import deque
+from tkinter import filedialog, messagebox
+
+from find_engine import compile_search, replace_spans
+from journal import journal_path
+from project_search import (MAX_FILE_MATCHES, WORKERS, compile_literal, replace_file, replace_text,
+                            search_tree)
+from serpad_io import BackgroundJob, Cancelled
+
+# Find in Files panel: search every file under a folder, and replace in all
+# of them at once after a preview.
+# The search runs on a BackgroundJob and hands results over through a
+# deque, which is emptied into the list every time the job reports
+# progress, so the first files show while the rest are still searched.
+# Files open in the editor are searched as they are there, unsaved edits
+# included, and a Replace All changes them in the editor (one edit that
+# Ctrl+Z takes back); the others are rewritten on disk, unless they have
+# changed since the search or have a journal of saves not yet folded in.
+# Both run on a BackgroundJob: the spans for an open file are found in a
+# snapshot of it, and applied once the job is done if it wasn't edited.
+
+SHOWN_LINES = 20000  # result lines put in the list; the rest are still replaced
+
+
+class FindInFiles:
+    def __init__(self, root, open_at, documents, replace_in_document):
+        self.root = root
+        self.open_at = open_at  # open_at(path, byte offset) shows a result
+        self.documents = documents  # documents() -> {path: PieceTable} open in the editor
+        # replace_in_document(path, doc, version, spans) -> count, or None if it was edited or closed
+        self.replace_in_document = replace_in_document
+        self.folder = None
+        self.job = None
+        self.results = []
+        self.rows = []  # (path, offset) of each row of the list; None for a file's heading
+        self.shown = 0  # result lines in the list
+        self.searched = None  # settings the results are for
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Find in Files")
+        self.window.withdraw()
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+        form = tk.Frame(self.window)
+        form.pack(fill=tk.X, padx=5, pady=5)
+        form.columnconfigure(1, weight=1)
+        tk.Label(form, text="Find:").grid(row=0, column=0, sticky="e")
+        tk.Label(form, text="Replace:").grid(row=1, column=0, sticky="e")
+        tk.Label(form, text="In:").grid(row=2, column=0, sticky="e")
+        self.find_entry = tk.Entry(form)
+        self.repl_entry = tk.Entry(form)
+        self.find_entry.grid(row=0, column=1, columnspan=2, sticky="we", padx=5, pady=2)
+        self.repl_entry.grid(row=1, column=1, columnspan=2, sticky="we", padx=5, pady=2)
+        self.folder_var = tk.StringVar()
+        tk.Label(form, textvariable=self.folder_var, anchor="w").grid(row=2, column=1, sticky="we", padx=5)
+        tk.Button(form, text="Change...", command=self.choose_folder).grid(row=2, column=2)
+
+        options = tk.Frame(self.window)
+        options.pack(fill=tk.X, padx=5)
+        self.case_var = tk.BooleanVar()
+        self.word_var = tk.BooleanVar()
+        self.regex_var = tk.BooleanVar()
+        for label, var in (("Match case", self.case_var), ("Whole word", self.word_var), ("Regex", self.regex_var)):
+            tk.Checkbutton(options, text=label, variable=var).pack(side=tk.LEFT)
+        tk.Button(options, text="Stop", command=self._cancel).pack(side=tk.RIGHT)
+        tk.Button(options, text="Replace All", command=self.replace_all).pack(side=tk.RIGHT)
+        tk.Button(options, text="Preview", command=self.preview).pack(side=tk.RIGHT)
+        tk.Button(options, text="Search", command=self.search).pack(side=tk.RIGHT)
+
+        box = tk.Frame(self.window)
+        box.pack(fill=tk.BOTH, expand=True, padx=5)
+        scroll = tk.Scrollbar(box)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(box, width=100, height=25, font=("Consolas", 10), activestyle="none",
+                                  yscrollcommand=scroll.set)
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        scroll.config(command=self.listbox.yview)
+        self.info = tk.StringVar()
+        tk.Label(self.window, textvariable=self.info, anchor="w").pack(fill=tk.X, padx=5)
+
+        self.find_entry.bind("<Return>", self.search)
+        self.window.bind("<Escape>", self.hide)
+        self.listbox.bind("<Double-Button-1>", self._open_row)
+        self.listbox.bind("<Return>", self._open_row)
+
+    def show(self, folder):
+        if self.folder is None or (self.job is None and not self.results):
+            self._set_folder(folder)  # else the folder of the results on show
+        self.window.deiconify()
+        self.window.lift()
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, tk.END)
+
+    def hide(self, event=None):
+        self.window.withdraw()
+        return "break"
+
+    def choose_folder(self):
+        folder = filedialog.askdirectory(parent=self.window, initialdir=self.folder)
+        if folder:
+            self._set_folder(folder)
+
+    def _set_folder(self, folder):
+        self._cancel()
+        self.folder = os.path.abspath(folder)
+        self.folder_var.set(self.folder)
+        self.searched = None
+
+    def _cancel(self):
+        # The job reports back that it stopped; a new one started meanwhile replaces it
+        if self.job is not None:
+            self.job.cancel.set()
+
+    def _settings(self):
+        return (self.find_entry.get(), self.regex_var.get(), self.word_var.get(), self.case_var.get(), self.folder)
+
+    def _pattern(self):
+        """Compiled search, or None (with the reason shown) if there isn't one."""
+        if not self.find_entry.get():
+            return None
+        try:
+            return compile_search(*self._settings()[:4])
+        except re.error as e:
+            self.info.set(f"Invalid pattern: {e}")
+            return None
+
+    def _full_path(self, rel):
+        return os.path.join(self.folder, *rel.split("/"))
+
+    # -------------------- Searching --------------------
+
+    def search(self, event=None):
+        pattern = self._pattern()
+        if pattern is None:
+            return "break"
+        self._cancel()
+        settings = self._settings()
+        folder = self.folder
+        literal = compile_literal(*settings[:4])
+        self.listbox.delete(0, tk.END)
+        self.results, self.rows, self.shown = [], [], 0
+        self.searched = None
+        # What is open in the editor is searched from there, as it may not be saved
+        documents = {}
+        for path, doc in self.documents().items():
+            rel = os.path.relpath(path, folder)
+            if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+                snapshot = doc.snapshot()
+                documents[rel.replace(os.sep, "/")] = lambda doc=doc, snapshot=snapshot: b"".join(
+                    doc.chunks(snapshot=snapshot))
+        found = deque()
+
+        def work(progress, cancel):
+            return search_tree(folder, pattern, literal, found.append, WORKERS, documents, cancel, progress)
+
+        def progress(done, total):
+            if self.job is job:
+                self._take(found)
+                self.info.set(f"Searching... {done:,} of {total:,} files, "
+                              f"{len(self.results):,} with matches  (Stop to cancel)")
+
+        def done(searched):
+            if self.job is job:
+                self.job = None
+                self._take(found)
+                self.searched = settings
+                self.info.set(f"{self._matches():,} matches in {len(self.results):,} files "
+                              f"of {searched:,} searched{self._hidden()}")
+
+        def failed(e):
+            if self.job is job:
+                self.job = None
+                self._take(found)
+                self.info.set("Search stopped" if isinstance(e, Cancelled) else f"Search failed: {e}")
+
+        job = BackgroundJob(self.root, work, done, failed, progress, "Finding in files")
+        self.job = job
+        self.info.set("Searching...")
+        return "break"
+
+    def _take(self, found):
+        """Move the results that have come in into the list."""
+        while found:
+            result = found.popleft()
+            self.results.append(result)
+            if self.shown < SHOWN_LINES:
+                self._add_rows(result, [(number, offset, text.strip()) for number, offset, text in result[3]])
+
+    def _add_rows(self, result, lines, note=""):
+        rel, stamp, count, _ = result
+        more = "+" if count >= MAX_FILE_MATCHES else ""
+        open_ = "" if stamp is not None else ", open in the editor"
+        self.listbox.insert(tk.END, f"{rel}  ({count}{more} {note or 'matches'}{open_})")
+        self.rows.append(None)
+        path = self._full_path(rel)
+        for number, offset, text in lines:
+            self.listbox.insert(tk.END, f"  {number:>6}: {text}")
+            self.rows.append((path, offset))
+        self.shown += len(lines)
+
+    def _matches(self):
+        return sum(count for _, _, count, _ in self.results)
+
+    def _hidden(self):
+        lines = sum(len(lines) for *_, lines in self.results)
+        return f"; the first {self.shown:,} of {lines:,} lines shown" if self.shown < lines else ""
+
+    def _open_row(self, event=None):
+        current = self.listbox.curselection()
+        if current and self.rows[current[0]] is not None:
+            self.open_at(*self.rows[current[0]])
+        return "break"
+
+    # -------------------- Replacing --------------------
+
+    def _ready(self):
+        """Whether the results are for what the fields say now."""
+        if self.job is not None:
+            self.info.set("Wait for the search to finish, or stop it")
+            return False
+        if self.searched != self._settings():
+            self.info.set("Search first: the results are not for these settings")
+            return False
+        if not self.results:
+            self.info.set("Nothing to replace")
+            return False
+        return True
+
+    def preview(self):
+        """Show every matching line as it is and as it would be after Replace All."""
+        if not self._ready():
+            return
+        pattern = self._pattern()
+        repl = self.repl_entry.get()
+        regex = self.regex_var.get()
+        self.listbox.delete(0, tk.END)
+        self.rows, self.shown = [], 0
+        try:
+            for result in self.results:
+                if self.shown >= SHOWN_LINES:
+                    break
+                lines = []
+                for number, offset, text in result[3]:
+                    lines.append((number, offset, "- " + text.strip()))
+                    lines.append((number, offset, "+ " + replace_text(text, pattern, repl, regex)[0].strip()))
+                self._add_rows(result, lines, "replacements")
+        except re.error as e:
+            self.info.set(f"Invalid replacement: {e}")
+            return
+        self.info.set(f"Replace All would replace {self._matches():,} matches in {len(self.results):,} files"
+                      f"{self._hidden()}")
+
+    def replace_all(self):
+        if not self._ready():
+            return
+        pattern = self._pattern()
+        repl = self.repl_entry.get()
+        regex = self.regex_var.get()
+        on_disk = [(rel, stamp) for rel, stamp, _, _ in self.results if stamp is not None]
+        open_rels = [rel for rel, stamp, _, _ in self.results if stamp is None]
+        if not messagebox.askokcancel(
+                "Replace All", f"Replace {self._matches():,} matches in {len(self.results):,} files?\n"
+                               f"{len(on_disk):,} files are rewritten on disk; {len(open_rels):,} open in the "
+                               f"editor are changed there and still need saving.", parent=self.window):
+            return
+        documents = {os.path.abspath(path): doc for path, doc in self.documents().items()}
+        in_editor = []  # (rel, path, doc, snapshot, version)
+        skipped = []  # closed since the search, or edited while replacing
+        for rel in open_rels:
+            path = self._full_path(rel)
+            doc = documents.get(os.path.abspath(path))
+            if doc is None:
+                skipped.append(rel)
+            else:
+                in_editor.append((rel, path, doc, doc.snapshot(), doc.version))
+        folder = self.folder
+        steps = len(in_editor) + len(on_disk)
+
+        def work(progress, cancel):
+            # Open files first: a bad replacement fails there, before any file is written
+            edits = []
+            for n, (rel, path, doc, snapshot, version) in enumerate(in_editor):
+                edits.append((rel, path, doc, version, replace_spans(doc, pattern, repl, regex, snapshot, cancel)))
+                progress(n + 1, steps)
+            total, files, missed = 0, 0, []
+            for n, (rel, stamp) in enumerate(on_disk, len(in_editor)):
+                if cancel.is_set():
+                    break
+                if os.path.exists(journal_path(os.path.join(folder, *rel.split("/")))):
+                    missed.append(rel)
+                    continue
+                try:
+                    count = replace_file(folder, rel, stamp, pattern, repl, regex)
+                except OSError:
+                    count = None
+                if count is None:
+                    missed.append(rel)
+                else:
+                    total += count
+                    files += 1
+                progress(n + 1, steps)
+            return edits, total, files, missed
+
+        def progress(done, total):
+            if self.job is job:
+                self.info.set(f"Replacing... {done:,} of {total:,} files")
+
+        def done(result):
+            if self.job is not job:
+                return
+            self.job = None
+            edits, total, files, missed = result
+            for rel, path, doc, version, spans in edits:
+                count = self.replace_in_document(path, doc, version, spans)
+                if count is None:
+                    skipped.append(rel)
+                else:
+                    total += count
+                    files += 1
+            self.searched = None
+            self.info.set(f"Replaced {total:,} matches in {files:,} files"
+                          + (f"; {len(skipped) + len(missed):,} skipped" if skipped or missed else ""))
+            if skipped or missed:
+                names = "\n".join((skipped + missed)[:20])
+                messagebox.showwarning("Replace All", "These files were left alone, as they changed or were "
+                                                      f"closed since the search, or have a journal:\n{names}",
+                                       parent=self.window)
+
+        def failed(e):
+            self.searched = None
+            if self.job is job:
+                self.job = None
+                if isinstance(e, Cancelled):
+                    self.info.set("Replace All stopped; the files done so far keep their changes")
+                elif isinstance(e, re.error):
+                    self.info.set(f"Invalid replacement: {e}")
+                else:
+                    self.info.set(f"Replace All failed: {e}")
+
+        job = BackgroundJob(self.root, work, done, failed, progress, "Replacing in files")
+        self.job = job
@@ -0,0 +1,337 @@
+import time
+import tkinter as tk
+import tkinter.font as tkfont
+from bisect import bisect_right
+
+from pygments.lexer import RegexLexer
+from pygments.styles import get_style_by_name
+from pygments.token import Error, Whitespace
+
+# Incremental syntax highlighting for a Tk Text widget.
+# Lexing is done a line at a time and the lexer's state stack at the start
+# of every line is cached. After an edit only the edited lines are lexed
+# again, continuing until the state at the start of a line equals the one
+# cached before the edit; everything below is then known to be unchanged.
+# Only the lines on screen (plus a margin) are ever tagged. The cache for
+# the rest of the document is filled in while the editor is idle, so
+# scrolling far down doesn't have to lex everything in between.
+# Carrying the state across lines means driving RegexLexer's compiled
+# state table (lexer._tokens, a pygments internal, as of Pygments 2.x).
+# A lexer without one is lexed a line at a time from the root state, which
+# only gets constructs spanning lines (like triple-quoted strings) wrong.
+
+MARGIN = 50  # lines tagged above and below the visible ones
+IDLE_BUDGET = 0.008  # seconds of lexing per idle slice
+IDLE_LINES = 500  # lines fetched from the widget per idle step
+MAX_BREAKS = 64  # edited places waiting to be re-lexed before old states are dropped
+ROOT = ("root",)
+
+
+def lex_line(lexer, line, stack=ROOT):
+    """([(column, tokentype, value)], stack at the end of the line).
+
+    The same loop as RegexLexer.get_tokens_unprocessed, except that it
+    starts from and returns the state stack. Other lexers get no state
+    carried between lines.
+    """
+    tokendefs = getattr(lexer, "_tokens", None)
+    if not isinstance(lexer, RegexLexer) or not isinstance(tokendefs, dict):
+        return list(lexer.get_tokens_unprocessed(line)), ROOT
+    tokens = []
+    pos = 0
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while True:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(line, pos)
+            if m:
+                if action is not None:
+                    if isinstance(action, tuple):  # a token type; otherwise a callback
+                        tokens.append((pos, action, m.group()))
+                    else:
+                        tokens.extend(action(lexer, m))
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == "#pop":
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == "#push":
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == "#push":
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                break
+        else:
+            if pos >= len(line):
+                break
+            if line[pos] == "\n":
+                statestack = ["root"]
+                statetokens = tokendefs["root"]
+                tokens.append((pos, Whitespace, "\n"))
+            else:
+                tokens.append((pos, Error, line[pos]))
+            pos += 1
+    return tokens, tuple(statestack)
+
+
+class LexCache:
+    """Lexer state at the start of every line of a document.
+
+    `get_lines(first, last)` returns the text of lines [first, last), each
+    ending in "\\n" (0-based; fewer at the end of the document).
+    states[:valid] are correct. The rest are what they were before recent
+    edits: when lexing reaches one of them with the same state, the states
+    up to the next edited line (the next entry of `breaks`) are correct too.
+    """
+
+    def __init__(self, lexer, get_lines):
+        self.lexer = lexer
+        self.get_lines = get_lines
+        self._interned = {ROOT: ROOT}
+        self.reset()
+
+    def reset(self):
+        self.states = [ROOT]
+        self.valid = 1
+        self.breaks = []
+
+    def edited(self, line, removed, added):
+        """Lines line..line+removed were replaced by line..line+added."""
+        states = self.states
+        start = line + 1  # first state that depends on the edited text
+        end = start + removed
+        if end >= len(states):
+            del states[start:]
+            marks = [b for b in self.breaks + [self.valid] if b < start]
+        else:
+            states[start:end] = [None] * added
+            shift = added - removed
+            marks = [b if b <= start else max(start, b + shift) if b > end else start
+                     for b in self.breaks + [self.valid, start]]
+        marks = sorted(set(m for m in marks if m < len(states)))
+        if len(marks) > MAX_BREAKS:
+            del states[marks[MAX_BREAKS]:]
+            del marks[MAX_BREAKS:]
+        self.valid = min([self.valid, start, len(states)] + marks[:1])
+        self.breaks = [m for m in marks if m > self.valid]
+
+    def _store(self, line, state):
+        """Record the state at the start of `line`; True if the states after
+        it are unchanged from before the last edit."""
+        if line < self.valid:
+            return False
+        state = self._interned.setdefault(state, state)
+        states = self.states
+        breaks = self.breaks
+        del breaks[:bisect_right(breaks, line)]
+        if line < len(states):
+            if states[line] == state:
+                self.valid = breaks[0] if breaks else len(states)
+                return True
+            states[line] = state
+        else:
+            states.append(state)
+        self.valid = line + 1
+        return False
+
+    def advance(self, upto, budget=None):
+        """Make states valid up to line `upto`, or for `budget` seconds."""
+        deadline = None if budget is None else time.perf_counter() + budget
+        while self.valid <= upto:
+            first = self.valid - 1
+            lines = self.get_lines(first, min(upto, first + IDLE_LINES))
+            if not lines:
+                break
+            for n, text in enumerate(lines, first):
+                _, end = lex_line(self.lexer, text, self.states[n])
+                if self._store(n + 1, end) or n + 1 >= upto:
+                    break
+            else:
+                if len(lines) < min(upto, first + IDLE_LINES) - first:
+                    break  # end of the document
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+
+    def tokens(self, first, last):
+        """Yield (line, tokens, converged) for lines [first, last).
+
+        `converged` says whether the states of the following lines are the
+        same as before the last edit.
+        """
+        self.advance(first)
+        for n, text in enumerate(self.get_lines(first, last), first):
+            if n >= len(self.states):
+                break
+            tokens, end = lex_line(self.lexer, text, self.states[n])
+            was_valid = n + 1 < self.valid
+            converged = self._store(n + 1, end) or was_valid
+            yield n, tokens, converged
+
+
+class Highlighter:
+    """Keeps the visible part of a Text widget highlighted by a pygments lexer."""
+
+    def __init__(self, text, lexer, style="monokai", margin=MARGIN):
+        self.text = text
+        self.margin = margin
+        self.cache = LexCache(lexer, self._get_lines)
+        self.style = get_style_by_name(style)
+        self.tags = set()
+        self._fonts = {}
+        self._refresh_pending = False
+        self._idle_job = None
+        text.configure(background=self.style.background_color,
+                       foreground=self._default_color(),
+                       insertbackground=self._default_color())
+
+        widget = text._w
+        self._orig = widget + "_orig"
+        text.tk.call("rename", widget, self._orig)
+        text.tk.createcommand(widget, self._dispatch)
+        self._yscroll = text.cget("yscrollcommand")
+        text.configure(yscrollcommand=self._on_yscroll)
+        text.bind("<Configure>", lambda e: self.schedule(), add=True)
+        self.clean = bytearray(self._line_count())  # 1 for lines whose tags are up to date
+
+    def _default_color(self):
+        color = self.style.style_for_token(Whitespace.parent)["color"]
+        return f"#{color}" if color else "#f8f8f2"
+
+    def _raw(self, *args):
+        return self.text.tk.call(self._orig, *args)
+
+    def _line(self, index):
+        return int(str(self._raw("index", index)).split(".")[0]) - 1
+
+    def _line_count(self):
+        return self._line("end-1c") + 1
+
+    def _get_lines(self, first, last):
+        if last <= first:
+            return []
+        data = str(self._raw("get", f"{first + 1}.0", f"{last + 1}.0"))
+        return [line + "\n" for line in data.split("\n")[:-1]]
+
+    # -------------------- Edits --------------------
+
+    def _dispatch(self, operation, *args):
+        if operation not in ("insert", "delete", "replace"):
+            return self._raw(operation, *args)
+        try:
+            before = self._line_count()
+            first = min(self._line(args[0]), before - 1)
+            if operation == "insert":
+                last = first
+            elif operation == "replace" or len(args) > 1:
+                last = self._line(args[-1] if operation == "delete" else args[1])
+            else:
+                last = self._line(f"{args[0]}+1c")
+            result = self._raw(operation, *args)
+        except tk.TclError:
+            return ""
+        removed = max(0, min(last, before - 1) - first)
+        added = removed + self._line_count() - before
+        self.edited(first, removed, added)
+        return result
+
+    def edited(self, line, removed, added):
+        self.cache.edited(line, removed, added)
+        self.clean[line:line + removed + 1] = bytes(added + 1)
+        first, last = self._view()
+        if not first <= line < last:
+            # not re-lexed now, so whatever follows may need new tags
+            self.clean[line:] = bytes(len(self.clean) - line)
+        self.refresh()
+
+    # -------------------- Tagging --------------------
+
+    def _on_yscroll(self, first, last):
+        if self._yscroll:
+            self.text.tk.call(self._yscroll, first, last)
+        self.schedule()
+
+    def schedule(self):
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.text.after_idle(self.refresh)
+
+    def _view(self):
+        first = self._line("@0,0")
+        last = self._line(f"@0,{self.text.winfo_height()}") + 1
+        return max(0, first - self.margin), min(len(self.clean), last + self.margin)
+
+    def refresh(self):
+        """Tag the lines in view that need it."""
+        self._refresh_pending = False
+        first, last = self._view()
+        n = self.clean.find(0, first, last)
+        while n != -1:
+            n = self._tag_from(n, last)
+            n = self.clean.find(0, n, last) if n < last else -1
+        if self.cache.valid < len(self.clean) and self._idle_job is None:
+            self._idle_job = self.text.after(50, self._idle)
+
+    def _tag_from(self, first, last):
+        """Tag from `first` until the tags are clean again; the next line to check."""
+        ranges = {}
+        n = first
+        for n, tokens, converged in self.cache.tokens(first, last):
+            prefix = f"{n + 1}."
+            for column, ttype, value in tokens:
+                if value and value != "\n":
+                    ranges.setdefault(ttype, []).extend(
+                        (prefix + str(column), prefix + str(column + len(value))))
+            self.clean[n] = 1
+            if not converged and n + 1 < len(self.clean):
+                self.clean[n + 1] = 0
+                if n + 1 >= last:
+                    # states below the view changed; they get tagged when shown
+                    self.clean[n + 1:] = bytes(len(self.clean) - n - 1)
+            elif n + 1 < len(self.clean) and self.clean[n + 1]:
+                break
+        n += 1
+        for tag in self.tags:
+            self._raw("tag", "remove", tag, f"{first + 1}.0", f"{n + 1}.0")
+        for ttype, indices in ranges.items():
+            tag = self._tag(ttype)
+            self._raw("tag", "add", tag, *indices)
+        return n
+
+    def _tag(self, ttype):
+        tag = str(ttype)
+        if tag not in self.tags:
+            self.tags.add(tag)
+            style = self.style.style_for_token(ttype)
+            self._raw("tag", "configure", tag,
+                      "-foreground", f"#{style['color']}" if style["color"] else "",
+                      "-background", f"#{style['bgcolor']}" if style["bgcolor"] else "")
+            if style["bold"] or style["italic"]:
+                self._raw("tag", "configure", tag, "-font", self._font(style["bold"], style["italic"]))
+            self._raw("tag", "lower", tag, "sel")
+        return tag
+
+    def _font(self, bold, italic):
+        key = (bool(bold), bool(italic))
+        if key not in self._fonts:
+            font = tkfont.Font(self.text, font=self.text.cget("font"))
+            font.configure(weight="bold" if bold else "normal", slant="italic" if italic else "roman")
+            self._fonts[key] = font
+        return self._fonts[key]
+
+    # -------------------- Idle lexing --------------------
+
+    def _idle(self):
+        self._idle_job = None
+        cache = self.cache
+        cache.advance(len(self.clean), budget=IDLE_BUDGET)
+        if cache.valid < len(self.clean):
+            self._idle_job = self.text.after(1, self._idle)
@@ -0,0 +1,196 @@
+import os
+import struct
+import threading
+import zlib
+
+from piece_table import ADDED, ORIGINAL, PieceTable
+
+# Crash-safe save journal for Serpad.
+# A document is a piece table over the file as it was opened plus an
+# append-only edit buffer, so saving it does not need to rewrite the file:
+# a record with the part of the edit buffer not journaled yet and the
+# current piece list is appended to a journal next to the file, then
+# fsync'd. That costs the size of the edits, not of the file. Unsaved
+# edits are journaled the same way every few seconds, as checkpoints.
+# Opening a file with a journal replays it: the file comes back as last
+# saved, and a checkpoint newer than that can be restored. The journal is
+# folded into the file (written to a temp file, then renamed over it) when
+# it gets large, after a while idle and on quit, and is then deleted.
+# A torn record at the end, from a crash mid-write, fails its CRC and is
+# dropped. The journal also records which file it applies to, so a file
+# changed by something else since is never patched with it.
+#
+#   MAGIC | base file size (u64) | mtime in ns (u64) | inode (u64)
+#   records: kind (1) | payload length (u32) | payload | crc32 (u32)
+#   payload: edit buffer offset (u64) | byte count (u64) | bytes
+#            | pieces: source (u8) | start (u64) | end (u64)
+
+MAGIC = b"SPJRNL\x00\x01"
+HEAD = struct.Struct(">QQQ")
+RECORD = struct.Struct(">cI")
+PAYLOAD = struct.Struct(">QQ")
+PIECE = struct.Struct(">BQQ")
+CRC = struct.Struct(">I")
+SAVE, CHECKPOINT = b"S", b"C"
+
+
+class JournalError(Exception):
+    pass
+
+
+def journal_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}.serpad-journal")
+
+
+def _base_id(stat):
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class Journal:
+    """Saves of `doc` to `path`, the file its original buffer maps."""
+
+    def __init__(self, path, doc, f, written=0, saved=None):
+        self.path = path
+        self.doc = doc
+        self._f = f  # open for appending, positioned at the end
+        self._lock = threading.Lock()  # saves and checkpoints come from different workers
+        self.written = written  # edit buffer bytes journaled so far
+        self.saved = saved  # (snapshot, version) of the last save; None if there is none yet
+        self.version = doc.version  # document version of the last record
+        self.size = f.tell()
+
+    @classmethod
+    def start(cls, doc, path):
+        """A new, empty journal for `doc`, or None if its original buffer is
+        not the file now at `path` (another file, or changed since opened)."""
+        if doc.path != path or doc.stat is None:
+            return None
+        try:
+            if _base_id(os.stat(path)) != _base_id(doc.stat):
+                return None
+        except FileNotFoundError:
+            return None
+        f = open(journal_path(path), "wb")
+        try:
+            f.write(MAGIC + HEAD.pack(*_base_id(doc.stat)))
+            _sync(f)
+        except BaseException:
+            f.close()
+            raise
+        return cls(path, doc, f)
+
+    @property
+    def closed(self):
+        return self._f.closed
+
+    def append(self, snapshot, added_end, version, kind=SAVE):
+        """Journal `snapshot` as saved (SAVE) or as unsaved edits (CHECKPOINT).
+        `added_end` is the length of the edit buffer when it was taken.
+        One write and one fsync; a failed write is cut off again."""
+        pieces, _ = snapshot
+        with self._lock:
+            if self._f.closed:
+                return
+            start = self.written
+            new = self.doc.span(ADDED, start, max(start, added_end))
+            payload = b"".join([PAYLOAD.pack(start, len(new)), new,
+                                *(PIECE.pack(source, s, e) for source, s, e, _ in pieces)])
+            record = RECORD.pack(kind, len(payload)) + payload
+            try:
+                self._f.write(record + CRC.pack(zlib.crc32(record)))
+                _sync(self._f)
+            except BaseException:
+                self._f.seek(self.size)
+                self._f.truncate()
+                raise
+            self.written = start + len(new)
+            self.size = self._f.tell()
+            self.version = version
+            if kind == SAVE:
+                self.saved = (snapshot, version)
+
+    def close(self):
+        """Stop writing; the journal stays for the next open to replay."""
+        with self._lock:
+            self._f.close()
+
+    def discard(self):
+        """Close and delete the journal, once the file holds what it saved."""
+        self.close()
+        try:
+            os.remove(journal_path(self.path))
+        except FileNotFoundError:
+            pass
+
+
+def _snapshot(added, pieces):
+    pieces = tuple((source, s, e, None if source == ORIGINAL else added.count(b"\n", s, e))
+                   for source, s, e in pieces)
+    return pieces, sum(e - s for _, s, e, _ in pieces)
+
+
+def replay(path):
+    """(doc, journal, checkpoint) if `path` has a journal, else None.
+
+    `doc` is the file as last saved, and `journal` goes on recording its
+    saves. `checkpoint` is a snapshot() of unsaved edits journaled after the
+    last save, or None. Raises JournalError if the file has changed since
+    the journal was started.
+    """
+    try:
+        f = open(journal_path(path), "r+b")
+    except FileNotFoundError:
+        return None
+    doc = None
+    try:
+        head = f.read(len(MAGIC) + HEAD.size)
+        if len(head) < len(MAGIC) + HEAD.size or head[:len(MAGIC)] != MAGIC:
+            raise JournalError(f"{journal_path(path)} is not a Serpad journal")
+        doc = PieceTable.open(path)
+        if HEAD.unpack(head[len(MAGIC):]) != _base_id(doc.stat):
+            raise JournalError(f"{os.path.basename(path)} has changed since its journal was written")
+        added = bytearray()
+        saved = checkpoint = None
+        end = f.tell()
+        while True:
+            record = f.read(RECORD.size)
+            if len(record) < RECORD.size:
+                break
+            kind, size = RECORD.unpack(record)
+            payload = f.read(size)
+            crc = f.read(CRC.size)
+            if (len(payload) < size or len(crc) < CRC.size or kind not in (SAVE, CHECKPOINT)
+                    or CRC.unpack(crc)[0] != zlib.crc32(record + payload)):
+                break  # torn by a crash mid-write
+            start, count = PAYLOAD.unpack_from(payload)
+            if start != len(added) or (size - PAYLOAD.size - count) % PIECE.size:
+                break
+            pieces = list(PIECE.iter_unpack(payload[PAYLOAD.size + count:]))
+            limits = (len(doc.original), len(added) + count)
+            if not all(source in (ORIGINAL, ADDED) and s <= e <= limits[source] for source, s, e in pieces):
+                break
+            added += payload[PAYLOAD.size:PAYLOAD.size + count]
+            if kind == SAVE:
+                saved, checkpoint = pieces, None
+            else:
+                checkpoint = pieces
+            end = f.tell()
+        f.seek(end)
+        f.truncate()
+    except BaseException:
+        f.close()
+        if doc is not None:
+            doc.close()
+        raise
+    doc.added = added
+    if saved is not None:
+        doc.restore(_snapshot(added, saved))
+    journal = Journal(path, doc, f, len(added),
+                      None if saved is None else (doc.snapshot(), doc.version))
+    return doc, journal, None if checkpoint is None else _snapshot(added, checkpoint)
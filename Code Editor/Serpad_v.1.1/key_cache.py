@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+from encrypted_file import derive_key, kdf_params, salted
+
+# In-memory cache of derived file keys for Serpad.
+# Deriving a key costs a deliberate half second or so, and every file
+# remembers the salt and cost it was written with. Keys are cached by
+# those parameters, so saving again, or reopening a file from Recent
+# Files, needs neither the password nor the derivation. Entries expire
+# after a while unused and the least recently used go first when the
+# cache is full; nothing is ever written to disk. Only salted keys are
+# cached: an unsalted one would be shared by every file of its kind.
+
+KEY_TTL = 15 * 60  # seconds a key stays cached after its last use
+KEY_CACHE_SIZE = 32
+
+
+class KeyCache:
+    def __init__(self, ttl=KEY_TTL, size=KEY_CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.size = size
+        self.clock = clock
+        self._keys = OrderedDict()  # kdf parameters -> (key, expires)
+        self._lock = threading.Lock()  # keys are derived on worker threads
+        self.hits = 0
+        self.misses = 0
+        self.derivations = 0
+        self.kdf_seconds = 0.0
+        self.last_kdf_seconds = None
+
+    def get(self, header):
+        """The cached key for a file with this header, or None."""
+        if header is None or not salted(header):
+            return None
+        params = kdf_params(header)
+        now = self.clock()
+        with self._lock:
+            entry = self._keys.get(params)
+            if entry is None or entry[1] < now:
+                self._keys.pop(params, None)
+                self.misses += 1
+                return None
+            self._keys[params] = (entry[0], now + self.ttl)
+            self._keys.move_to_end(params)
+            self.hits += 1
+            return entry[0]
+
+    def derive(self, header, password):
+        """Derive the key from the password and cache it."""
+        start = time.perf_counter()
+        key = derive_key(password, header)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.derivations += 1
+            self.kdf_seconds += elapsed
+            self.last_kdf_seconds = elapsed
+        if salted(header):
+            self.put(header, key)
+        return key
+
+    def key(self, header, password=None):
+        """Cached key, else one derived from `password` (None without one)."""
+        key = self.get(header)
+        if key is None and password is not None:
+            key = self.derive(header, password)
+        return key
+
+    def put(self, header, key):
+        with self._lock:
+            params = kdf_params(header)
+            self._keys[params] = (key, self.clock() + self.ttl)
+            self._keys.move_to_end(params)
+            while len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+
+    def forget(self, header):
+        """Drop a key, e.g. one that turned out to be wrong."""
+        if header is not None and salted(header):
+            with self._lock:
+                self._keys.pop(kdf_params(header), None)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "keys": len(self._keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "derivations": self.derivations,
+            "kdf_seconds": self.kdf_seconds,
+            "last_kdf_seconds": self.last_kdf_seconds,
+        }
@@ -0,0 +1,342 @@
+import hashlib
+import json
+import os
+import re
+from array import array
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from serpad_io import Cancelled, write_atomic
+
+# Index of the file paths under a project folder, for Quick Open.
+# The tree is listed by a pool of threads, one directory per task. Every
+# directory is kept with its mtime, files and subdirectories, and the
+# index is saved as JSON, so a refresh only lists again the directories
+# whose mtime changed (a file added, removed or renamed in them); the rest
+# cost one stat each.
+# Matching runs the regex engine over all file names joined into one string,
+# sorted shortest first, so a search stops as soon as it has enough
+# results. A query matches a path if its characters appear in it in order
+# (a subsequence), tried in tiers: file names starting with the query,
+# containing it, containing it as a subsequence, then files in folders
+# whose path has it. The subsequence patterns take the first possible
+# place for each character and never backtrack, so a line costs one pass.
+# A scan stops once it has enough results, and what it matched is kept,
+# so typing one more character retries those lines and goes on from there.
+# A search also scans at most SCAN_BUDGET characters for subsequences, so a
+# key costs the same however few names match; names starting with or
+# containing the query are always looked for in all of them.
+
+VERSION = 1
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", ".mypy_cache", ".tox"}
+WORKERS = 16  # directory listings in flight; they wait on the disk, not the CPU
+LIMIT = 50  # results returned by a search
+CANDIDATES = 200  # matches ranked per search
+NARROW = 20000  # matches kept from a scan, to narrow down as the query grows
+SCAN_BUDGET = 2000000  # characters of file names a search scans for subsequence matches
+BOUNDARY = "/_-. "  # a match right after one of these scores higher
+
+
+def index_file(folder, root):
+    """Where the index of the tree under `root` is kept, in `folder`."""
+    tag = hashlib.blake2b(os.path.abspath(root).encode("utf-8", "surrogateescape"), digest_size=6).hexdigest()
+    return os.path.join(folder, f"{os.path.basename(os.path.abspath(root)) or 'root'}-{tag}.json")
+
+
+def _list(root, rel, old):
+    """(rel, (mtime_ns, files, subdirs), listed) for one directory; `old`
+    is returned unlisted if the directory has not changed. None for the
+    entry if the directory is gone or unreadable."""
+    path = os.path.join(root, *rel.split("/")) if rel else root
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if old is not None and old[0] == mtime:
+            return rel, old, False
+        files, subdirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            subdirs.append(entry.name)
+                    elif entry.is_file() or entry.is_symlink():
+                        files.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        return rel, None, False
+    return rel, (mtime, sorted(files), sorted(subdirs)), True
+
+
+def walk(root, known=None, workers=WORKERS, cancel=None, progress=None):
+    """({relative dir: (mtime_ns, files, subdirs)}, directories listed) for
+    the tree under `root`. Directories unchanged since `known` are reused."""
+    known = known or {}
+    dirs = {}
+    listed = 0
+    with ThreadPoolExecutor(workers) as pool:
+        pending = {pool.submit(_list, root, "", known.get(""))}
+        while pending:
+            if cancel is not None and cancel.is_set():
+                for future in pending:
+                    future.cancel()
+                raise Cancelled()
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel, entry, fresh = future.result()
+                if entry is None:
+                    continue
+                dirs[rel] = entry
+                listed += fresh
+                for name in entry[2]:
+                    sub = f"{rel}/{name}" if rel else name
+                    pending.add(pool.submit(_list, root, sub, known.get(sub)))
+            if progress is not None:
+                progress(len(dirs), len(dirs) + len(pending))
+    return dirs, listed
+
+
+def _subsequence(query):
+    """Pattern for the characters of `query` in order within one line,
+    starting at the first one. Possessive, so it never backtracks."""
+    first, rest = re.escape(query[0]), query[1:]
+    return re.compile(first + "".join(f"[^\n{re.escape(c)}]*+{re.escape(c)}" for c in rest))
+
+
+def _positions(text, query):
+    """Where each character of `query` first fits in `text`, in order."""
+    found, i = [], 0
+    for c in query:
+        i = text.find(c, i)
+        if i < 0:
+            return None
+        found.append(i)
+        i += 1
+    return found
+
+
+def _score(path, name, query, tier):
+    """Lower is better: the tier, then gaps between the matched characters
+    of the file name, characters not at a word boundary, and path length."""
+    found = _positions(name.lower(), query) if tier < 3 and query else None
+    if not found:
+        return (tier, 0, 0, len(path))
+    gaps = sum(b - a > 1 for a, b in zip(found, found[1:]))
+    inner = sum(i > 0 and name[i - 1] not in BOUNDARY and not (name[i].isupper() and name[i - 1].islower())
+                for i in found)
+    return (tier, gaps, inner, len(path))
+
+
+class _Lines:
+    """Lines joined into one lowercase string for the regex engine, and
+    the matches of the last scan, to narrow down as a query grows."""
+
+    def __init__(self, lines):
+        # "\n" before every line; starts[i] is where line i's is
+        self.text = "\n" + "\n".join(lines).lower()
+        self.starts = array("Q", [0])
+        offset = 0
+        for line in lines:
+            offset += len(line) + 1
+            self.starts.append(offset)
+        self.last = None  # (query, lines matching it up to offset, offset)
+
+    def line(self, i):
+        return self.text[self.starts[i] + 1:self.starts[i + 1]]
+
+    def find(self, query, want):
+        """{line: True if it starts with `query`} for lines containing it,
+        stopping at `want`."""
+        found = {}
+        text, starts = self.text, self.starts
+        i = text.find(query)
+        while i >= 0 and len(found) < want:
+            line = bisect_right(starts, i) - 1
+            if line not in found:
+                found[line] = text[i - 1] == "\n"
+            i = text.find(query, starts[line + 1])
+        return found
+
+    def matches(self, query, want, keep=None, budget=None):
+        """(lines, complete): up to `want` lines, in order, that have
+        `query` as a subsequence and for which keep(line) holds, and
+        whether that is all of them. The scan stops once it has enough,
+        or after about `budget` characters of text; the lines it matched
+        and where it stopped are kept, so a longer query retries those
+        lines and goes on from there."""
+        pattern = _subsequence(query)
+        text, starts = self.text, self.starts
+        last = self.last
+        if last is not None and _positions(query, last[0]) is not None:
+            # A line matching `query` matches the shorter query too
+            every = [i for i in last[1] if pattern.search(self.line(i))]
+            end = last[2]
+        else:
+            every, end = [], 0
+        found = every if keep is None else [i for i in every if keep(i)]
+        if len(found) <= want and end < len(text):
+            found = list(found)
+            prev = -1
+            stop = len(text)
+            if budget is not None:
+                # At the end of a line (at least the next one), so every line before is scanned whole
+                stop = starts[max(bisect_right(starts, end + budget) - 1, bisect_right(starts, end))]
+            for m in pattern.finditer(text, end, stop):
+                line = bisect_right(starts, m.start()) - 1
+                if line == prev:
+                    continue
+                prev = line
+                every.append(line)
+                if keep is None or keep(line):
+                    found.append(line)
+                    if len(found) > want:
+                        end = starts[line + 1]
+                        break
+            else:
+                end = stop
+        self.last = (query, every, end) if len(every) <= NARROW else None
+        return found[:want], len(found) <= want and end >= len(text)
+
+
+class Matcher:
+    """Fuzzy search over a fixed list of paths.
+
+    A query matches a file whose name holds its characters in order; files
+    whose names start with or contain it come first. Failing enough of
+    those, files in folders whose path holds the query come next. A query
+    with a "/" is split at the last one, into a folder part and a name
+    part that must both match.
+    """
+
+    def __init__(self, paths):
+        self.paths = sorted(paths, key=lambda p: (len(p), p))
+        self.names = [p.rpartition("/")[2] for p in self.paths]
+        folders = sorted({p.rpartition("/")[0] for p in self.paths}, key=lambda d: (len(d), d))
+        ids = {folder: i for i, folder in enumerate(folders)}
+        self.folder_of = array("L", (ids[p.rpartition("/")[0]] for p in self.paths))
+        self.files = [[] for _ in folders]  # lines of the files in each folder
+        for line, folder in enumerate(self.folder_of):
+            self.files[folder].append(line)
+        self._names = _Lines(self.names)
+        self._folders = _Lines(folders)
+        self._root = ids.get("")
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _in_folders(self, folders, want, tiers):
+        for folder in folders:
+            for line in self.files[folder]:
+                if len(tiers) >= want:
+                    return
+                tiers.setdefault(line, 3)
+
+    def search(self, query, limit=LIMIT):
+        """Up to `limit` paths matching `query`, best first."""
+        query = query.strip().lower().replace("\\", "/")
+        if not query:
+            return self.paths[:limit]
+        want = max(limit, CANDIDATES)
+        tiers = {}  # line -> 0 name starts with the query, 1 contains it, 2 has it in order, 3 folder
+        if "/" in query:
+            folder_query, _, query = query.rpartition("/")
+            if folder_query:
+                folders, _ = self._folders.matches(folder_query, len(self.files))
+            else:
+                folders = [] if self._root is None else [self._root]
+            if not query:
+                self._in_folders(folders, want, tiers)
+            elif sum(len(self.files[folder]) for folder in folders) <= NARROW:
+                # Few enough files in those folders to try each of them
+                pattern = _subsequence(query)
+                lines = sorted(line for folder in folders for line in self.files[folder])
+                tiers = {line: self._tier(line, query) for line in lines if pattern.search(self._names.line(line))}
+            else:
+                chosen = set(folders)
+                folder_of = self.folder_of
+                lines, _ = self._names.matches(query, want, lambda line: folder_of[line] in chosen)
+                tiers = {line: self._tier(line, query) for line in lines}
+        else:
+            lines, complete = self._names.matches(query, want, budget=SCAN_BUDGET)
+            if complete:
+                tiers = {line: self._tier(line, query) for line in lines}
+            else:
+                # Names starting with or containing the query may be further down
+                tiers = {line: 0 if start else 1 for line, start in self._names.find(query, want).items()}
+                for line in lines:
+                    tiers.setdefault(line, self._tier(line, query))
+            if len(tiers) < want:
+                folders, _ = self._folders.matches(query, want)
+                self._in_folders(folders, want, tiers)
+        paths, names = self.paths, self.names
+        ranked = sorted(tiers, key=lambda line: _score(paths[line], names[line], query, tiers[line]))
+        return [paths[line] for line in ranked[:limit]]
+
+    def _tier(self, line, query):
+        name = self._names.line(line)
+        return 0 if name.startswith(query) else 1 if query in name else 2
+
+
+class PathIndex:
+    """Paths under `root`, kept in the file `path` between sessions."""
+
+    def __init__(self, root, path=None, dirs=None):
+        self.root = os.path.abspath(root)
+        self.path = path
+        self.dirs = dirs or {}
+        self.matcher = Matcher(self._paths(self.dirs))
+        self.listed = 0  # directories listed by the last refresh
+
+    @classmethod
+    def load(cls, root, path):
+        """The saved index of `root`, or an empty one if there is none."""
+        dirs = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == VERSION and data.get("root") == os.path.abspath(root):
+                dirs = {rel: (mtime, files, subdirs) for rel, (mtime, files, subdirs) in data["dirs"].items()}
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+        return cls(root, path, dirs)
+
+    @staticmethod
+    def _paths(dirs):
+        return [f"{rel}/{name}" if rel else name for rel, (_, files, _) in dirs.items() for name in files]
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def refresh(self, workers=WORKERS, cancel=None, progress=None):
+        """List what changed since the last refresh, then save. Searches
+        keep using the old paths until the new ones are ready."""
+        dirs, self.listed = walk(self.root, self.dirs, workers, cancel, progress)
+        matcher = Matcher(self._paths(dirs))
+        self.dirs, self.matcher = dirs, matcher
+        if self.path is not None and self.listed:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_atomic(self.path, json.dumps({"version": VERSION, "root": self.root, "dirs": self.dirs},
+                                           separators=(",", ":")), "utf-8")
+
+    def search(self, query, limit=LIMIT):
+        return self.matcher.search(query, limit)
+
+    def full_path(self, rel):
+        return os.path.join(self.root, *rel.split("/"))
+
+
+def project_root(path):
+    """The folder holding `path` that looks like a project: the nearest
+    one with version control, else the folder of the file itself."""
+    folder = os.path.dirname(os.path.abspath(path))
+    here = folder
+    while True:
+        if any(os.path.exists(os.path.join(here, marker)) for marker in (".git", ".hg", ".svn")):
+            return here
+        parent = os.path.dirname(here)
+        if parent == here:
+            return folder
+        here = parent
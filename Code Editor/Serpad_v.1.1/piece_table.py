@@ -0,0 +1,419 @@
+import mmap
+import os
+import threading
+from bisect import bisect_right
+from itertools import accumulate
+from collections import OrderedDict
+
+# Piece-table document model for Serpad.
+# The file being edited is memory-mapped and never copied: the document is
+# a list of pieces, each a (buffer, start, end) slice of either the
+# original mapping or an append-only buffer holding everything typed or
+# pasted since. Edits only split and splice pieces, so their cost does
+# not depend on the document size. Everything is in bytes (UTF-8).
+# Each piece also carries its newline count (None until first needed for
+# the original file), so line lookups are a walk over the pieces.
+# Typing after a backspace or a cursor move starts a new piece, so once the
+# pieces have doubled since the last compaction, small ones are merged.
+
+ORIGINAL, ADDED = 0, 1
+BLOCK_SIZE = 1024 * 1024  # read size for chunks()
+INDEX_BLOCK = 64 * 1024  # newline index granularity
+CACHED_BLOCKS = 256
+COMPACT_PIECES = 4096  # merge small pieces once there are more than this many
+COMPACT_SIZE = 64 * 1024
+
+
+class LineIndex:
+    """Newline positions in an immutable buffer, indexed lazily.
+
+    Newlines are counted per block (one C-level count per block), so the
+    line count of a large file is cheap; exact positions inside a block are
+    only worked out when a line in that block is asked for.
+    """
+
+    def __init__(self, data, block_size=INDEX_BLOCK):
+        self.data = data
+        self.size = len(data)
+        self.block_size = block_size
+        self.counts = [0]  # counts[i]: newlines before block i
+        self.blocks = OrderedDict()  # block number -> newline positions
+        self._lock = threading.Lock()  # scan() may run on a worker thread too
+
+    @property
+    def complete(self):
+        return (len(self.counts) - 1) * self.block_size >= self.size
+
+    @property
+    def scanned(self):
+        return min((len(self.counts) - 1) * self.block_size, self.size)
+
+    def scan(self, upto=None, cancel=None, progress=None):
+        """Count newlines up to byte `upto` (default: everything)."""
+        upto = self.size if upto is None else min(upto, self.size)
+        size = self.block_size
+        while (len(self.counts) - 1) * size < upto:
+            if cancel is not None and cancel.is_set():
+                return False
+            with self._lock:
+                start = (len(self.counts) - 1) * size
+                if start < upto:
+                    self.counts.append(self.counts[-1] + self.data[start:start + size].count(b"\n"))
+            if progress is not None:
+                progress(self.scanned, self.size)
+        return True
+
+    def count_before(self, offset):
+        """Newlines in data[0:offset]."""
+        block, rest = divmod(offset, self.block_size)
+        self.scan(offset + 1)
+        start = block * self.block_size
+        return self.counts[block] + (self.data[start:offset].count(b"\n") if rest else 0)
+
+    def total(self):
+        self.scan()
+        return self.counts[-1]
+
+    def newline(self, n):
+        """Offset of the n-th newline (0-based), or None if there are fewer."""
+        while self.counts[-1] <= n and not self.complete:
+            self.scan(self.scanned + self.block_size)
+        if self.counts[-1] <= n:
+            return None
+        block = bisect_right(self.counts, n) - 1
+        return self._positions(block)[n - self.counts[block]]
+
+    def _positions(self, block):
+        positions = self.blocks.get(block)
+        if positions is None:
+            positions = []
+            base = block * self.block_size
+            data = self.data[base:base + self.block_size]  # one read, however the buffer is backed
+            pos = 0
+            while True:
+                pos = data.find(b"\n", pos)
+                if pos < 0:
+                    break
+                positions.append(base + pos)
+                pos += 1
+            self.blocks[block] = positions
+            if len(self.blocks) > CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(block)
+        return positions
+
+
+class PieceTable:
+    """Editable document over an immutable original buffer.
+
+    Pieces are (source, start, end, newlines) tuples.
+    """
+
+    def __init__(self, original=b""):
+        self.original = original
+        self.added = bytearray()
+        self.pieces = [(ORIGINAL, 0, len(original), None)] if len(original) else []
+        self.length = len(original)
+        self.lines = LineIndex(original)
+        self.version = 0
+        self.compact_at = COMPACT_PIECES  # piece count that triggers compact()
+        self.path = None  # file the original buffer is mapped from
+        self.stat = None  # and its os.stat_result when it was opened
+        self._file = None
+
+    @classmethod
+    def open(cls, path):
+        """Document backed by a read-only memory map of `path`."""
+        f = open(path, "rb")
+        try:
+            stat = os.fstat(f.fileno())
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        except Exception:
+            f.close()
+            raise
+        doc = cls(data)
+        doc._file = f
+        doc.path = path
+        doc.stat = stat
+        return doc
+
+    def close(self):
+        if hasattr(self.original, "close"):
+            self.original.close()  # a mapping, or a file decrypted as it is read
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self.length
+
+    def _buffer(self, source):
+        return self.original if source == ORIGINAL else self.added
+
+    def _count(self, source, s, e):
+        if source == ORIGINAL:
+            return self.lines.count_before(e) - self.lines.count_before(s)
+        return self.added.count(b"\n", s, e)
+
+    def _newlines(self, i):
+        # Newline count of piece i, filling it in if not known yet
+        source, s, e, count = self.pieces[i]
+        if count is None:
+            count = self._count(source, s, e)
+            self.pieces[i] = (source, s, e, count)
+        return count
+
+    # -------------------- Reading --------------------
+
+    def read(self, start=0, end=None):
+        """Bytes in [start, end)."""
+        end = self.length if end is None else min(end, self.length)
+        return b"".join(self.chunks(start, end))
+
+    def chunks(self, start=0, end=None, size=BLOCK_SIZE, snapshot=None):
+        """Yield the bytes in [start, end) piece by piece, at most `size` at a time.
+
+        Given a snapshot(), yields that content instead; since both buffers
+        only ever grow, this is safe from another thread while editing goes on.
+        """
+        pieces, length = snapshot or (list(self.pieces), self.length)
+        end = length if end is None else min(end, length)
+        pos = 0
+        for source, s, e, _ in pieces:
+            length = e - s
+            if pos + length > start and pos < end:
+                a = s + max(start - pos, 0)
+                b = s + min(end - pos, length)
+                buf = self._buffer(source)
+                while a < b:
+                    yield bytes(buf[a:min(a + size, b)])
+                    a += size
+            pos += length
+            if pos >= end:
+                break
+
+    def span(self, source, start, end):
+        """Bytes [start, end) of one of the two buffers, for code that walks a
+        snapshot's pieces itself."""
+        return bytes(self._buffer(source)[start:end])
+
+    def reader(self, snapshot=None):
+        """read(start, end) over a fixed snapshot, for many small random reads:
+        the piece holding `start` is found by bisection instead of a walk."""
+        pieces, length = snapshot or self.snapshot()
+        starts = list(accumulate((e - s for _, s, e, _ in pieces), initial=0))
+
+        def read(start, end):
+            end = min(end, length)
+            i = bisect_right(starts, start) - 1
+            out = []
+            while start < end:
+                source, s, e, _ = pieces[i]
+                a = s + start - starts[i]
+                b = min(e, s + end - starts[i])
+                out.append(self._buffer(source)[a:b])
+                start += b - a
+                i += 1
+            return b"".join(out)
+
+        return read
+
+    def snapshot(self):
+        """Immutable view of the current content, for undo or background readers."""
+        return tuple(self.pieces), self.length
+
+    def restore(self, snapshot):
+        pieces, length = snapshot
+        self.pieces = list(pieces)
+        self.length = length
+        self.version += 1
+
+    # -------------------- Editing --------------------
+
+    def _split(self, offset):
+        # Index of the piece starting at `offset`, splitting a piece if needed
+        pos = 0
+        for i, (source, s, e, count) in enumerate(self.pieces):
+            if pos == offset:
+                return i
+            length = e - s
+            if offset < pos + length:
+                cut = s + offset - pos
+                if count is None:
+                    left = right = None
+                else:
+                    left = self._count(source, s, cut)
+                    right = count - left
+                self.pieces[i:i + 1] = [(source, s, cut, left), (source, cut, e, right)]
+                return i + 1
+            pos += length
+        return len(self.pieces)
+
+    def insert(self, offset, data):
+        if not data:
+            return
+        if not 0 <= offset <= self.length:
+            raise IndexError("insert offset out of range")
+        start = len(self.added)
+        self.added += data
+        count = data.count(b"\n")
+        i = self._split(offset)
+        # Typing at the end of the last insert just grows that piece
+        if i and self.pieces[i - 1][0] == ADDED and self.pieces[i - 1][2] == start:
+            source, s, _, before = self.pieces[i - 1]
+            self.pieces[i - 1] = (source, s, start + len(data), before + count)
+        else:
+            self.pieces.insert(i, (ADDED, start, start + len(data), count))
+        self.length += len(data)
+        self.version += 1
+        if len(self.pieces) > self.compact_at:
+            self.compact()
+
+    def delete(self, offset, length):
+        if length <= 0:
+            return
+        if offset < 0 or offset + length > self.length:
+            raise IndexError("delete range out of range")
+        first = self._split(offset)
+        last = self._split(offset + length)
+        del self.pieces[first:last]
+        self.length -= length
+        self.version += 1
+        if len(self.pieces) > self.compact_at:
+            self.compact()
+
+    def replace(self, offset, length, data):
+        self.delete(offset, length)
+        self.insert(offset, data)
+
+    def replace_spans(self, spans):
+        """Apply many replacements at once: `spans` are sorted, non-overlapping
+        (start, end, data). One pass over the pieces, whatever the count."""
+        old = self.pieces
+        new = []
+        added = {}  # replacement data already appended in this call
+        i = 0
+        pos = 0  # document offset where old[i] starts
+
+        def copy(a, b):
+            # Pieces covering [a, b) of the current content
+            nonlocal i, pos
+            while a < b:
+                source, s, e, count = old[i]
+                if pos + e - s <= a:
+                    pos += e - s
+                    i += 1
+                    continue
+                lo = s + a - pos
+                hi = s + min(b - pos, e - s)
+                if (lo, hi) == (s, e):
+                    new.append(old[i])
+                else:
+                    # Counting newlines in the original can wait until needed
+                    new.append((source, lo, hi, None if source == ORIGINAL else
+                                self.added.count(b"\n", lo, hi)))
+                a = pos + hi - s
+
+        cursor = 0
+        length = self.length
+        for start, end, data in spans:
+            copy(cursor, start)
+            if data:
+                piece = added.get(data)
+                if piece is None:
+                    at = len(self.added)
+                    self.added += data
+                    piece = added[data] = (ADDED, at, at + len(data), data.count(b"\n"))
+                new.append(piece)
+            length += len(data) - (end - start)
+            cursor = end
+        copy(cursor, self.length)
+        self.pieces = new
+        self.length = length
+        self.version += 1
+        if len(new) > self.compact_at:
+            self.compact()
+
+    def compact(self):
+        """Merge runs of small pieces into single pieces of the edit buffer,
+        so later edits and line lookups walk fewer pieces."""
+        new = []
+        run = []
+        run_size = 0
+
+        def flush():
+            if len(run) > 1:
+                data = b"".join(self._buffer(source)[s:e] for source, s, e, _ in run)
+                at = len(self.added)
+                self.added += data
+                new.append((ADDED, at, len(self.added), data.count(b"\n")))
+            else:
+                new.extend(run)
+
+        for source, s, e, count in self.pieces:
+            if e - s >= COMPACT_SIZE:
+                flush()
+                run, run_size = [], 0
+                new.append((source, s, e, count))
+                continue
+            run.append((source, s, e, count))
+            run_size += e - s
+            if run_size >= COMPACT_SIZE:
+                flush()
+                run, run_size = [], 0
+        flush()
+        self.pieces = new
+        # Large pieces stay as they are; don't compact again until the count doubles
+        self.compact_at = max(COMPACT_PIECES, 2 * len(new))
+
+    # -------------------- Lines --------------------
+
+    def line_start(self, line):
+        """Byte offset where `line` (0-based) starts; the length if past the end."""
+        if line <= 0:
+            return 0
+        pos = 0
+        seen = 0
+        for i, (source, s, e, count) in enumerate(self.pieces):
+            want = line - seen - 1  # which newline inside this piece
+            if count is None:
+                # Look the newline up directly, so only the file up to it gets indexed
+                at = self.lines.newline(self.lines.count_before(s) + want)
+                if at is not None and at < e:
+                    return pos + at - s + 1
+                count = self._newlines(i)
+            elif count > want:
+                if source == ORIGINAL:
+                    at = self.lines.newline(self.lines.count_before(s) + want)
+                else:
+                    at = s - 1
+                    for _ in range(want + 1):
+                        at = self.added.find(b"\n", at + 1, e)
+                return pos + at - s + 1
+            seen += count
+            pos += e - s
+        return self.length
+
+    def line_of(self, offset):
+        """0-based line containing byte `offset`."""
+        pos = 0
+        seen = 0
+        for i, (source, s, e, _) in enumerate(self.pieces):
+            length = e - s
+            if offset < pos + length:
+                return seen + self._count(source, s, s + offset - pos)
+            seen += self._newlines(i)
+            pos += length
+        return seen
+
+    def line_count(self, estimate=False):
+        """Number of lines. With `estimate`, don't scan unindexed parts of
+        the original file; extrapolate from what is indexed so far."""
+        lines = self.lines
+        if estimate and not lines.complete:
+            lines.scan(BLOCK_SIZE)
+            if not lines.complete:
+                density = lines.counts[-1] / lines.scanned
+                return int(density * self.length) + 1
+        return sum(self._newlines(i) for i in range(len(self.pieces))) + 1
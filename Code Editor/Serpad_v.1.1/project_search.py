@@ -0,0 +1,337 @@
+import mmap
+import os
+import re
+from collections import deque
+
+from find_engine import BLOCK_SIZE, block_matches
+from path_index import SKIP_DIRS
+from serpad_io import Cancelled, write_atomic
+
+# Find in files: search a folder tree in parallel and replace across it.
+# The tree is walked in the calling thread, skipping what .gitignore files
+# exclude, and its files go in batches to a pool of processes (the regex
+# engine holds the GIL, so threads would only take turns). Each file is
+# memory-mapped; one with a NUL byte near its start is taken for binary
+# and skipped. It is read a block of whole lines at a time: a literal
+# ASCII query is looked for in the bytes and only the lines it hits are
+# decoded; any other query runs over the decoded block, as in find_engine.
+# Results are handed over per batch, as soon as one is done, so they can
+# be shown while the rest of the tree is still being searched.
+# A result is (relative path, (size, mtime_ns) or None, matches, lines)
+# with lines [(line number, byte offset of its first match, text)].
+
+WORKERS = os.cpu_count() or 1
+BATCH_FILES = 32  # files per task sent to a worker
+IN_FLIGHT = 4  # batches queued per worker
+BINARY_SNIFF = 8192  # bytes looked at for a NUL
+MAX_FILE_MATCHES = 1000  # matches reported per file
+LINE_MAX = 400  # characters kept of a matching line
+POLL_S = 0.1  # how often a search in progress looks at `cancel`
+
+
+# -------------------- .gitignore --------------------
+
+def _glob(pattern):
+    """Regex source for one .gitignore glob."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        elif c == "[" and pattern.find("]", i + 2) > 0:
+            end = pattern.find("]", i + 2)  # a "]" first in the set is part of it
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            out.append("[" + ("^" + body[1:] if body[0] in "!^" else body) + "]")
+            i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_ignore(lines, base=""):
+    """Rules from the lines of the .gitignore in folder `base` (relative to
+    the root, "" for the root itself): (base, regex, negated, folders only,
+    anchored to base)."""
+    rules = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        folders_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line:
+            rules.append((base, re.compile(_glob(line) + r"\Z", re.DOTALL), negated, folders_only, anchored))
+    return rules
+
+
+def ignored(rules, rel, is_dir):
+    """Whether `rules` exclude the path `rel`; the last rule that matches decides."""
+    result = False
+    name = rel.rpartition("/")[2]
+    for base, regex, negated, folders_only, anchored in rules:
+        if result != negated or (folders_only and not is_dir):
+            continue  # can't change the result
+        if not anchored:
+            target = name
+        elif not base:
+            target = rel
+        elif rel.startswith(base + "/"):
+            target = rel[len(base) + 1:]
+        else:
+            continue
+        if regex.match(target):
+            result = not negated
+    return result
+
+
+def _read_rules(path, base):
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return parse_ignore(f, base)
+    except OSError:
+        return []
+
+
+def project_files(root, cancel=None):
+    """Yield the relative paths of the files under `root`, top folders
+    first, leaving out what its .gitignore files exclude."""
+    pending = deque([("", _read_rules(os.path.join(root, ".git", "info", "exclude"), ""))])
+    while pending:
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        rel, rules = pending.popleft()
+        try:
+            with os.scandir(os.path.join(root, *rel.split("/")) if rel else root) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        if any(entry.name == ".gitignore" for entry in entries):
+            rules = rules + _read_rules(os.path.join(root, rel, ".gitignore"), rel)
+        for entry in entries:
+            sub = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS and not ignored(rules, sub, True):
+                        pending.append((sub, rules))
+                elif entry.is_file() and not ignored(rules, sub, False):
+                    yield sub
+            except OSError:
+                continue
+
+
+# -------------------- Searching --------------------
+
+def compile_literal(query, regex=False, whole_word=False, case=False):
+    """(bytes pattern, lowercase the text first) finding the lines that may
+    match a literal ASCII query, or None when it needs the decoded text."""
+    if regex or not query.isascii():
+        return None
+    # Lowering the bytes keeps every offset, and a case-sensitive search for
+    # a pattern starting with a literal is several times faster than an
+    # IGNORECASE one or one starting with \b. Whole words are checked when
+    # the line is decoded; the \b at the end only skips longer words early.
+    pattern = re.escape((query if case else query.lower()).encode("ascii"))
+    if whole_word and (query[-1].isalnum() or query[-1] == "_"):
+        pattern += rb"\b"
+    return re.compile(pattern), not case
+
+
+def _scan(text, offset, line, pattern, lines, found):
+    """Add the matches in `text`, a block of whole lines starting at byte
+    `offset` and line number `line`, to `lines`. The matches in total."""
+    counted = 0
+    for start, _, m in block_matches(pattern, text, offset):
+        if found >= MAX_FILE_MATCHES:
+            break
+        found += 1
+        line += text.count("\n", counted, m.start())
+        counted = m.start()
+        if lines and lines[-1][0] == line:
+            continue
+        begin = text.rfind("\n", 0, counted) + 1
+        end = text.find("\n", counted)
+        lines.append((line, start, text[begin:end if end >= 0 else len(text)][:LINE_MAX].rstrip("\r")))
+    return found
+
+
+def search_buffer(data, pattern, literal=None):
+    """(matches, lines) for `pattern` in `data`, bytes or a memory map, up
+    to MAX_FILE_MATCHES matches. `literal` is from compile_literal()."""
+    lines = []
+    found = 0
+    size = len(data)
+    offset, line = 0, 1
+    while offset < size and found < MAX_FILE_MATCHES:
+        end = min(offset + BLOCK_SIZE, size)
+        if end < size:
+            # Whole lines only, unless one line is longer than the block
+            end = data.rfind(b"\n", offset, end) + 1 or (data.find(b"\n", end) + 1 or size)
+        block = data[offset:end]
+        if literal is None:
+            found = _scan(block.decode("utf-8", "surrogateescape"), offset, line, pattern, lines, found)
+        else:
+            # Only the lines holding the literal are decoded and matched
+            regex, lower = literal
+            hay = block.lower() if lower else block
+            at, counted, pos = line, 0, 0
+            while found < MAX_FILE_MATCHES:
+                m = regex.search(hay, pos)
+                if m is None:
+                    break
+                begin = hay.rfind(b"\n", 0, m.start()) + 1
+                pos = hay.find(b"\n", m.end()) + 1 or len(hay)
+                at += hay.count(b"\n", counted, begin)
+                counted = begin
+                found = _scan(block[begin:pos].decode("utf-8", "surrogateescape"), offset + begin, at,
+                              pattern, lines, found)
+        line += block.count(b"\n")
+        offset = end
+    return found, lines
+
+
+def search_file(root, rel, pattern, literal=None):
+    """The result for one file, or None if it has no match, is binary or
+    can't be read."""
+    try:
+        with open(os.path.join(root, *rel.split("/")), "rb") as f:
+            stat = os.fstat(f.fileno())
+            if not stat.st_size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data.find(b"\0", 0, BINARY_SNIFF) >= 0:
+                    return None
+                found, lines = search_buffer(data, pattern, literal)
+    except (OSError, ValueError):
+        return None
+    return (rel, (stat.st_size, stat.st_mtime_ns), found, lines) if found else None
+
+
+def search_batch(root, rels, pattern, literal=None):
+    """Results of the files `rels` that have matches; run in a worker."""
+    results = []
+    for rel in rels:
+        result = search_file(root, rel, pattern, literal)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def _batches(files):
+    batch = []
+    for rel in files:
+        batch.append(rel)
+        if len(batch) == BATCH_FILES:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def search_tree(root, pattern, literal=None, on_found=None, workers=WORKERS, documents=None,
+                cancel=None, progress=None):
+    """Search the files under `root`, calling on_found(result) from this
+    thread for every one with matches as its batch finishes. `documents`
+    maps relative paths to read() functions for files whose content is
+    not the one on disk, such as those open in the editor; their results
+    have None for a stamp. progress(files searched, files listed so far).
+    The number of files searched."""
+    documents = documents or {}
+    searched = 0
+
+    def files():
+        nonlocal searched
+        for rel in project_files(root, cancel):
+            read = documents.get(rel)
+            if read is None:
+                yield rel
+                continue
+            found, lines = search_buffer(read(), pattern, literal)
+            searched += 1
+            if found:
+                on_found((rel, None, found, lines))
+
+    if workers <= 1:
+        for batch in _batches(files()):
+            for result in search_batch(root, batch, pattern, literal):
+                on_found(result)
+            searched += len(batch)
+            if progress is not None:
+                progress(searched, searched)
+        return searched
+
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    # Spawned, not forked: the editor has threads running, and a fork copies their locks
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        batches = _batches(files())
+        pending = {}  # future -> files in its batch
+        listed = 0
+        more = True
+        try:
+            while True:
+                while more and len(pending) < workers * IN_FLIGHT:
+                    batch = next(batches, None)
+                    if batch is None:
+                        more = False
+                        break
+                    pending[pool.submit(search_batch, root, batch, pattern, literal)] = len(batch)
+                    listed += len(batch)
+                if not pending:
+                    break
+                done, _ = wait(pending, POLL_S, FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+                for future in done:
+                    searched += pending.pop(future)
+                    for result in future.result():
+                        on_found(result)
+                if progress is not None:
+                    progress(searched, listed)
+        finally:
+            for future in pending:
+                future.cancel()
+    return searched
+
+
+# -------------------- Replacing --------------------
+
+def replace_text(text, pattern, repl, regex=False):
+    """(new text, replacements). With `regex`, repl may use \\1 and \\g<name>."""
+    return pattern.subn(repl if regex else lambda m: repl, text)
+
+
+def replace_file(root, rel, stamp, pattern, repl, regex=False):
+    """Replace every match in one file on disk, keeping its permissions.
+    The number of replacements, or None if the file has changed since it
+    was searched, i.e. since `stamp`."""
+    path = os.path.join(root, *rel.split("/"))
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if (stat.st_size, stat.st_mtime_ns) != stamp:
+            return None
+        data = f.read()
+    text, count = replace_text(data.decode("utf-8", "surrogateescape"), pattern, repl, regex)
+    if count:
+        write_atomic(path, text.encode("utf-8", "surrogateescape"))
+    return count
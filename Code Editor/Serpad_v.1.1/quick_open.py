@@ -0,0 +1,160 @@
+import os
+import tkinter as tk
+
+from path_index import PathIndex, index_file
+from serpad_io import BackgroundJob
+
+# Quick Open: type part of a file name, pick one of the matches.
+# The index of the project folder is read from disk and brought up to date
+# on a worker thread; searching starts on the saved paths as soon as they
+# are read and switches to the fresh ones when the refresh is done, so the
+# dialog never waits on the disk. Searches themselves run inline, after a
+# short pause in typing.
+
+DEBOUNCE_MS = 30  # typing faster than this searches once
+SHOWN = 15  # rows in the list
+
+
+class QuickOpen:
+    def __init__(self, root, index_dir, open_path):
+        self.root = root
+        self.index_dir = index_dir
+        self.open_path = open_path  # open_path(full path) opens a file
+        self.index = None
+        self.folder = None
+        self.job = None
+        self.pending = None  # after() id of the next search
+        self.results = []
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Quick Open")
+        self.window.transient(root)
+        self.window.withdraw()
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+        self.entry = tk.Entry(self.window, width=70)
+        self.entry.pack(fill=tk.X, padx=5, pady=5)
+        self.listbox = tk.Listbox(self.window, height=SHOWN, activestyle="none")
+        self.listbox.pack(fill=tk.BOTH, expand=True, padx=5)
+        self.info = tk.StringVar()
+        tk.Label(self.window, textvariable=self.info, anchor="w").pack(fill=tk.X, padx=5)
+
+        self.entry.bind("<KeyRelease>", self._key)
+        self.entry.bind("<Return>", self.choose)
+        self.entry.bind("<Escape>", self.hide)
+        self.entry.bind("<Down>", lambda e: self._move(1))
+        self.entry.bind("<Up>", lambda e: self._move(-1))
+        self.listbox.bind("<Double-Button-1>", self.choose)
+
+    def show(self, folder):
+        """Show the dialog for the files under `folder`."""
+        folder = os.path.abspath(folder)
+        if folder != self.folder:
+            self._cancel()
+            self.folder = folder
+            self.index = None
+            self.results = []
+            self.listbox.delete(0, tk.END)
+        self.window.title(f"Quick Open - {folder}")
+        self.window.deiconify()
+        self.window.lift()
+        self.entry.focus_set()
+        self.entry.select_range(0, tk.END)
+        if self.job is None:
+            self._refresh()
+        if self.index is not None:
+            self.search()
+
+    def hide(self, event=None):
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        self.window.withdraw()
+        return "break"
+
+    def _cancel(self):
+        if self.job is not None:
+            self.job.cancel.set()
+            self.job = None
+
+    # -------------------- Indexing --------------------
+
+    def _refresh(self):
+        """Read the saved index if it is not read yet, then list what
+        changed since it was saved."""
+        folder = self.folder
+        index = self.index
+        loaded = index is not None
+
+        def work(progress, cancel):
+            if index is None:
+                return PathIndex.load(folder, index_file(self.index_dir, folder))
+            index.refresh(cancel=cancel, progress=progress)
+            return index
+
+        def done(result):
+            if self.job is not job:
+                return
+            self.job = None
+            self.index = result
+            self.search()
+            if not loaded:
+                self._refresh()
+
+        def failed(e):
+            if self.job is job:
+                self.job = None
+                self.info.set(f"Indexing failed: {e}")
+
+        def progress(done, total):
+            if self.job is job:
+                self.info.set(f"Indexing... {done:,} of {total:,} folders")
+
+        job = BackgroundJob(self.root, work, done, failed, progress, "Indexing")
+        self.job = job
+        if not loaded:
+            self.info.set("Reading index...")
+
+    # -------------------- Searching --------------------
+
+    def _key(self, event):
+        if event.keysym in ("Return", "Escape", "Up", "Down"):
+            return
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+        self.pending = self.root.after(DEBOUNCE_MS, self.search)
+
+    def search(self):
+        self.pending = None
+        if self.index is None:
+            return
+        self.results = self.index.search(self.entry.get())
+        self.listbox.delete(0, tk.END)
+        for rel in self.results:
+            self.listbox.insert(tk.END, rel)
+        if self.results:
+            self.listbox.selection_set(0)
+            self.listbox.see(0)
+        files = f"{len(self.index):,} files"
+        self.info.set(f"{files}, indexing..." if self.job is not None else files)
+
+    def _move(self, step):
+        if not self.results:
+            return "break"
+        current = self.listbox.curselection()
+        i = min(max((current[0] if current else -1) + step, 0), len(self.results) - 1)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(i)
+        self.listbox.see(i)
+        return "break"
+
+    def choose(self, event=None):
+        if self.pending is not None:
+            # Enter right after typing: the list is not up to date yet
+            self.root.after_cancel(self.pending)
+            self.search()
+        current = self.listbox.curselection()
+        if current and self.index is not None:
+            path = self.index.full_path(self.results[current[0]])
+            self.hide()
+            self.open_path(path)
+        return "break"
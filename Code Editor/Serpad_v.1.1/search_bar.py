@@ -0,0 +1,192 @@
+import threading
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+
+from find_engine import compile_search, highlight_visible, match_offsets, narrow
+from serpad_io import BackgroundJob
+
+# Find-as-you-type bar for a TextViewport.
+# Every place the query occurs is kept as sorted byte offsets, so next and
+# previous are a bisection from the cursor. When the query grows by a
+# character the new matches are found among the old ones instead of by a
+# rescan. Work that could take longer than a frame (big documents, long
+# match lists) runs on a worker thread; the UI only ever bisects and tags
+# what is on screen.
+
+SYNC_BYTES = 256 * 1024  # documents up to this size are searched inline
+SYNC_MATCHES = 20000  # narrowing this many matches is done inline
+
+
+class SearchBar:
+    def __init__(self, parent, view):
+        self.view = view
+        self.root = view.text.winfo_toplevel()
+        self.frame = tk.Frame(parent)
+        tk.Label(self.frame, text="Find:").pack(side=tk.LEFT, padx=(5, 0))
+        self.entry = tk.Entry(self.frame, width=30)
+        self.entry.pack(side=tk.LEFT, padx=5, pady=2)
+        self.case_var = tk.BooleanVar()
+        tk.Checkbutton(self.frame, text="Match case", variable=self.case_var,
+                       command=self.search).pack(side=tk.LEFT)
+        tk.Button(self.frame, text="Previous", command=lambda: self.step(False)).pack(side=tk.LEFT)
+        tk.Button(self.frame, text="Next", command=lambda: self.step(True)).pack(side=tk.LEFT)
+        tk.Button(self.frame, text="x", relief=tk.FLAT, command=self.hide).pack(side=tk.RIGHT)
+        self.info = tk.StringVar()
+        tk.Label(self.frame, textvariable=self.info).pack(side=tk.LEFT, padx=5)
+
+        self.entry.bind("<KeyRelease>", self._key)
+        self.entry.bind("<Return>", lambda e: self.step(True))
+        self.entry.bind("<Shift-Return>", lambda e: self.step(False))
+        self.entry.bind("<Escape>", self.hide)
+        view.text.tag_configure("match", background="yellow")
+
+        self.query = None  # (text, case) the matches below are for
+        self.doc = None
+        self.version = None
+        self.starts = []
+        self.ends = []
+        self.complete = True
+        self.pattern = None
+        self.origin = 0  # where the search started; results jump to the first match after it
+        self.job = None
+
+    def show(self, before=None):
+        self.frame.pack(fill=tk.X, before=before)
+        self.origin = self.view.offset("insert")
+        self.entry.focus_set()
+        self.entry.select_range(0, tk.END)
+        self.view.scroll_listeners.append(self._highlight)
+        if self.entry.get():
+            self.search()
+
+    def attach(self, view):
+        """Search another viewport from now on, as after switching tabs."""
+        shown = self._highlight in self.view.scroll_listeners
+        self._cancel()
+        if shown:
+            self.view.scroll_listeners.remove(self._highlight)
+            self.view.text.tag_remove("match", "1.0", tk.END)
+        self.view = view
+        view.text.tag_configure("match", background="yellow")
+        if shown:
+            view.scroll_listeners.append(self._highlight)
+            self.origin = view.offset("insert")
+            self.search()
+
+    def hide(self, event=None):
+        self._cancel()
+        if self._highlight in self.view.scroll_listeners:
+            self.view.scroll_listeners.remove(self._highlight)
+        self.view.text.tag_remove("match", "1.0", tk.END)
+        self.frame.pack_forget()
+        self.view.text.focus_set()
+        return "break"
+
+    def _key(self, event):
+        if event.keysym not in ("Return", "Escape", "Shift_L", "Shift_R"):
+            self.search()
+
+    def _cancel(self):
+        if self.job is not None:
+            self.job.cancel.set()
+            self.job = None
+
+    # -------------------- Searching --------------------
+
+    def search(self):
+        self._cancel()
+        text = self.entry.get()
+        case = self.case_var.get()
+        if not text:
+            self.query = self.pattern = None
+            self.starts, self.ends = [], []
+            self.info.set("")
+            self._highlight()
+            return
+        doc = self.view.doc
+        key = (text, case)
+        if key == self.query and not self._stale():
+            return
+        snapshot = doc.snapshot()
+        version = doc.version
+        pattern = compile_search(text, case=case)
+        # A longer query only matches where the shorter one did
+        grown = (self.query is not None and self.complete and self.doc is doc
+                 and self.version == doc.version and case == self.query[1]
+                 and text.startswith(self.query[0]))
+        if grown:
+            starts = self.starts
+            read = doc.reader(snapshot)
+            width = len(text) * 4
+
+            def work(progress, cancel):
+                return (*narrow(read, starts, pattern, width, cancel), True)
+
+            inline = len(starts) <= SYNC_MATCHES
+        else:
+            def work(progress, cancel):
+                return match_offsets(doc, pattern, snapshot, cancel, progress)
+
+            inline = len(doc) <= SYNC_BYTES
+
+        def done(result):
+            if self.job is not job:
+                return  # a newer search replaced this one
+            self.job = None
+            self._found(key, pattern, doc, version, result)
+
+        job = None
+        if inline:
+            done(work(lambda done, total: None, threading.Event()))
+            return
+        self.info.set("Searching...")
+        job = BackgroundJob(self.root, work, done, lambda e: None, self._progress, "Search")
+        self.job = job
+
+    def _progress(self, done, total):
+        self.info.set(f"Searching... {done * 100 // total if total else 100}%")
+
+    def _found(self, key, pattern, doc, version, result):
+        self.starts, self.ends, self.complete = result
+        self.query = key
+        self.pattern = pattern
+        self.doc = doc
+        self.version = version  # if the document changed meanwhile, the next step rescans
+        if not self.starts:
+            self.info.set("No matches")
+            self._highlight()
+            return
+        i = bisect_left(self.starts, self.origin)
+        self._select(i if i < len(self.starts) else 0)
+
+    def _stale(self):
+        return self.doc is not self.view.doc or self.version != self.view.doc.version
+
+    def step(self, forward=True):
+        """Go to the next (or previous) match from the cursor, wrapping around."""
+        if not self.starts or self._stale():
+            self.origin = self.view.offset("insert")
+            self.search()
+            return "break"
+        cursor = self.view.offset("insert")
+        if forward:
+            i = bisect_right(self.starts, cursor)
+            i = i if i < len(self.starts) else 0
+        else:
+            i = bisect_left(self.starts, cursor) - 1
+        self._select(i % len(self.starts))
+        return "break"
+
+    def _select(self, i):
+        start, end = self.starts[i], self.ends[i]
+        self.origin = start
+        view = self.view
+        view.show(start)
+        view.text.tag_remove("sel", "1.0", tk.END)
+        view.text.tag_add("sel", view.index(start), view.index(end))
+        more = "" if self.complete else "+"
+        self.info.set(f"{i + 1} of {len(self.starts)}{more}")
+        self._highlight()
+
+    def _highlight(self):
+        highlight_visible(self.view.text, self.pattern)
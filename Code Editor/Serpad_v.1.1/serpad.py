@@ -1,22 +1,29 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 import os, sys, time
-from cryptography.fernet import Fernet
+from encrypted_file import EncryptedFile, EncryptedWriter, derive_key, read_header
+from piece_table import PieceTable
+from serpad_io import write_atomic
 
 APP_NAME = "MiniCodePad Secure"
 BACKUP_DIR = os.path.join(os.path.expanduser("~"), ".minicodepad_backups")
 RECENT_MAX = 5
+UNDO_MAX = 1000  # undo steps Tk keeps; unlimited by default, it grows all session
 
 os.makedirs(BACKUP_DIR, exist_ok=True)
 
-def create_key(password: str) -> bytes:
-    return Fernet(Fernet.generate_key()).encrypt(password.encode())
+def create_key(password: str, header: bytes) -> tuple:
+    # Salted key from the parameters stored in the file's header
+    return header, derive_key(password, header)
 
-def encrypt_text(text: str, key: bytes) -> bytes:
-    return Fernet(key).encrypt(text.encode())
+def encrypt_text(text: str, key: tuple) -> bytes:
+    header, aes_key = key
+    doc = PieceTable(text.encode())
+    return b"".join(EncryptedWriter(aes_key, header).chunks(doc, doc.snapshot()))
 
-def decrypt_text(data: bytes, key: bytes) -> str:
-    return Fernet(key).decrypt(data).decode()
+def decrypt_text(path: str, key: tuple) -> str:
+    with EncryptedFile(path, key[1]) as f:
+        return f.read().decode()
 
 class SecureEditor:
     def __init__(self, root):
@@ -27,7 +34,7 @@ class SecureEditor:
         self.key = None
         self.recent_files = []
 
-        self.text = tk.Text(root, font=("Courier New", 12), undo=True)
+        self.text = tk.Text(root, font=("Courier New", 12), undo=True, maxundo=UNDO_MAX)
         self.text.pack(fill=tk.BOTH, expand=True)
         self.status = tk.StringVar()
         tk.Label(root, textvariable=self.status, anchor="w").pack(fill=tk.X)
@@ -62,8 +69,7 @@ class SecureEditor:
         content = self.text.get("1.0", tk.END)
         name = "untitled" if not self.file_path else os.path.basename(self.file_path)
         bak_path = os.path.join(BACKUP_DIR, f"{name}-{int(time.time())}.bak")
-        with open(bak_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        write_atomic(bak_path, content, "utf-8")
         self.root.after(300000, self.auto_backup)
 
     def open_file(self):
@@ -89,11 +95,9 @@ class SecureEditor:
         if self.encrypted:
             data = encrypt_text(content, self.key)
             path = path if path.endswith(".enc") else path + ".enc"
-            with open(path, "wb") as f:
-                f.write(data)
+            write_atomic(path, data)
         else:
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(content)
+            write_atomic(path, content, "utf-8")
         self.file_path = path
         self.add_recent(path)
         self.root.title(f"{APP_NAME} - {os.path.basename(path)}")
@@ -106,16 +110,20 @@ class SecureEditor:
         password = simpledialog.askstring("Password", "Enter decryption password:", show="*")
         if not password:
             return messagebox.showerror("Error", "No password entered")
+        try:
+            header = read_header(path)
+            if header is None:
+                return messagebox.showerror("Error", "Not a Serpad encrypted file")
+            self.key = create_key(password, header)
+        except Exception as e:
+            return messagebox.showerror("Error", f"Failed opening:\n{e}")
         self.encrypted = True
-        self.key = create_key(password)
         self._load_file(path, encrypted=True)
 
     def _load_file(self, path, encrypted=False):
         try:
             if encrypted:
-                with open(path, "rb") as f:
-                    data = f.read()
-                content = decrypt_text(data, self.key)
+                content = decrypt_text(path, self.key)
             else:
                 with open(path, "r", encoding="utf-8") as f:
                     content = f.read()
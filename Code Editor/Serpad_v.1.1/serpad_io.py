@@ -0,0 +1,155 @@
+import os
+import threading
+
+# Background file I/O for Serpad.
+# Work runs on a worker thread and never touches Tk; the main thread polls
+# it with root.after, shows progress and hands the result over when done.
+# Saves stream into a temp file next to the target, which the caller then
+# swaps in with replace_temp, so an interrupted save never leaves a
+# half-written file behind. The temp file takes the target's permission
+# bits, and a symlinked target is written through: the file it points to
+# is replaced, not the link.
+
+CHUNK_SIZE = 1024 * 1024
+POLL_MS = 50
+
+
+class Cancelled(Exception):
+    pass
+
+
+class BackgroundJob:
+    """Run work(progress, cancel) on a worker thread, reporting back to Tk.
+
+    `progress(done, total)` may be called from the worker as often as it
+    likes; only the latest value is shown. on_done(result), on_error(exc)
+    and on_progress(done, total) are called on the Tk thread. Once `cancel`
+    is set, on_done is never called: on_error gets Cancelled instead, even
+    if the work had already finished.
+    """
+
+    active = set()  # jobs whose work is still running, of every owner
+
+    def __init__(self, root, work, on_done, on_error, on_progress=None, label="Job"):
+        self.root = root
+        self.label = label
+        self.cancel = threading.Event()
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self._progress = None
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(work,), daemon=True)
+        BackgroundJob.active.add(self)
+        self._thread.start()
+        root.after(POLL_MS, self._poll)
+
+    def _run(self, work):
+        try:
+            self._result = work(self._report, self.cancel)
+            if self.cancel.is_set():
+                raise Cancelled()
+        except BaseException as e:
+            self._error = e
+        finally:
+            BackgroundJob.active.discard(self)
+
+    def _report(self, done, total):
+        self._progress = (done, total)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def _poll(self):
+        if self.running:
+            if self._progress is not None and self.on_progress is not None:
+                self.on_progress(*self._progress)
+            self.root.after(POLL_MS, self._poll)
+        elif self._error is not None:
+            self.on_error(self._error)
+        elif self.cancel.is_set():
+            self.on_error(Cancelled())
+        else:
+            self.on_done(self._result)
+
+
+def read_file(path, progress, cancel, chunk_size=CHUNK_SIZE):
+    """Whole file as bytes, read in chunks."""
+    total = os.path.getsize(path)
+    parts = []
+    done = 0
+    with open(path, "rb") as f:
+        while True:
+            if cancel.is_set():
+                raise Cancelled()
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parts.append(chunk)
+            done += len(chunk)
+            progress(done, total)
+    return b"".join(parts)
+
+
+def _target(path):
+    # The file `path` resolves to, and its permission bits if it exists
+    real = os.path.realpath(path)
+    try:
+        return real, os.stat(real).st_mode & 0o7777
+    except FileNotFoundError:
+        return real, None
+
+
+def write_temp(path, chunks, total, progress, cancel):
+    """Stream chunks into a temp file next to `path` and return its path,
+    for replace_temp(); removed on failure."""
+    real, mode = _target(path)
+    tmp_path = real + ".tmp"
+    done = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                if cancel.is_set():
+                    raise Cancelled()
+                f.write(chunk)
+                done += len(chunk)
+                progress(done, total)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return tmp_path
+
+
+def replace_temp(tmp_path, path):
+    """Swap a file from write_temp() in for `path`."""
+    os.replace(tmp_path, os.path.realpath(path))
+
+
+def write_atomic(path, data, encoding=None):
+    """Write str (with `encoding`) or bytes to `path` through a temp file, so
+    a crash leaves either the old file or the new one."""
+    real, mode = _target(path)
+    tmp_path = real + ".tmp"
+    try:
+        with open(tmp_path, "wb" if encoding is None else "w", encoding=encoding) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, real)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
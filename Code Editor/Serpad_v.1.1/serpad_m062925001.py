@@ -1,9 +1,43 @@
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import filedialog, messagebox
-import pygments.lexers
-from chlorophyll import CodeView
+from serpad_io import write_atomic
 
 APP_NAME = "MiniCodePad Pro"
+UNDO_MAX = 1000  # undo steps Tk keeps; unlimited by default, it grows all session
+
+
+class LineNumbers(tk.Canvas):
+    """Gutter showing the numbers of the lines on screen, as CodeView's did.
+    Only the visible lines are drawn, so its cost doesn't grow with the file."""
+
+    def __init__(self, parent, text, font):
+        super().__init__(parent, highlightthickness=0, width=font.measure("000") + 12)
+        self.text = text
+        self.font = font
+        self.color = "#808080"
+        self._pending = False
+
+    def schedule(self, event=None):
+        if not self._pending:
+            self._pending = True
+            self.after_idle(self.redraw)
+
+    def redraw(self):
+        self._pending = False
+        self.delete("all")
+        last = int(self.text.index("end-1c").split(".")[0])
+        width = self.font.measure("0" * max(len(str(last)), 3)) + 12
+        if int(self.cget("width")) != width:
+            self.configure(width=width)
+        line = int(self.text.index("@0,0").split(".")[0])
+        while line <= last:
+            info = self.text.dlineinfo(f"{line}.0")
+            if info is None:
+                break  # below the bottom of the window
+            self.create_text(width - 6, info[1], anchor="ne", text=str(line), font=self.font, fill=self.color)
+            line += 1
+
 
 class ProEditor:
     def __init__(self, root):
@@ -11,10 +45,24 @@ class ProEditor:
         root.title(APP_NAME)
         root.geometry("900x650")
 
-        self.editor = CodeView(root, lexer=pygments.lexers.PythonLexer,
-                               color_scheme="monokai", tab_width=4,
-                               autohide_scrollbar=False)
-        self.editor.pack(fill="both", expand=True)
+        frame = tk.Frame(root)
+        frame.pack(fill="both", expand=True)
+        scroll = tk.Scrollbar(frame)
+        scroll.pack(side="right", fill="y")
+        font = tkfont.Font(root, family="Consolas", size=11)
+        self.editor = tk.Text(frame, undo=True, maxundo=UNDO_MAX, wrap="none", font=font,
+                              tabs=font.measure(" " * 4), yscrollcommand=self._on_yscroll)
+        self.gutter = LineNumbers(frame, self.editor, font)
+        self.gutter.pack(side="left", fill="y")
+        self.editor.pack(side="left", fill="both", expand=True)
+        self.scroll = scroll
+        scroll.configure(command=self.editor.yview)
+        self.editor.bind("<Configure>", self.gutter.schedule, add=True)
+        self.editor.bind("<KeyRelease>", self.gutter.schedule, add=True)
+        # pygments takes longer to import than the window takes to show, so
+        # highlighting is attached once the editor is on screen
+        self.highlighter = None
+        self.editor.bind("<Map>", lambda e: root.after_idle(self.attach_highlighter))
 
         # Menu
         menu = tk.Menu(root)
@@ -32,6 +80,24 @@ class ProEditor:
 
         self.file_path = None
 
+    def attach_highlighter(self):
+        if self.highlighter is not None:
+            return
+        self.editor.unbind("<Map>")
+        import pygments.lexers
+        from highlighter import Highlighter
+        self.highlighter = Highlighter(self.editor, pygments.lexers.PythonLexer(), style="monokai")
+        self.highlighter.schedule()
+        style = self.highlighter.style
+        self.gutter.configure(background=style.background_color)
+        if style.line_number_color not in ("inherit", "transparent"):
+            self.gutter.color = style.line_number_color
+        self.gutter.schedule()
+
+    def _on_yscroll(self, first, last):
+        self.scroll.set(first, last)
+        self.gutter.schedule()
+
     def open_file(self):
         path = filedialog.askopenfilename(filetypes=[("All Files", "*.*")])
         if path:
@@ -64,8 +130,7 @@ class ProEditor:
     def _write(self, path):
         try:
             content = self.editor.get("1.0", tk.END)
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            write_atomic(path, content, 'utf-8')
             messagebox.showinfo("Saved", f"Saved to {path}")
         except Exception as e:
             messagebox.showerror("Error", f"Could not save file:\n{e}")
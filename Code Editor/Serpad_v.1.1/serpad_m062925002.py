@@ -1,13 +1,33 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog
-import os, sys, time
-from cryptography.fernet import Fernet
+from tkinter import filedialog, messagebox, simpledialog, ttk
+import os, re, sys, time
+from piece_table import PieceTable
+from viewport import TextViewport
+from serpad_io import BackgroundJob, Cancelled, read_file, replace_temp, write_temp
+from find_engine import compile_search, count_matches, highlight_visible, replace_spans
+from search_bar import SearchBar
+from backup_store import BackupStore
+from encrypted_file import (DecryptionError, EncryptedFile, EncryptedWriter, Plaintext, new_header,
+                            read_header, salted)
+from key_cache import KeyCache
+from journal import CHECKPOINT, Journal, JournalError, journal_path, replay
+from undo_history import HistoryError, UndoHistory, fingerprint, history_file
+from workspace import RecentFiles, Tab, Workspace
 
 APP_NAME = "Serpad"
 BACKUP_DIR = os.path.join(os.path.expanduser("~"), ".minicodepad_backups")
-RECENT_MAX = 5
-
-os.makedirs(BACKUP_DIR, exist_ok=True)
+BACKUP_MS = 300000  # auto backup every 5 minutes
+RECENT_FILE = os.path.join(os.path.expanduser("~"), ".serpad_recent.json")
+RECENT_MAX = 20
+MEMORY_BUDGET = 256 * 1024 * 1024  # background tabs are evicted beyond this
+KDF_COST = None  # scrypt cost for newly written encrypted files; None for the default
+JOURNAL_MIN = 4 * 1024 * 1024  # smaller files are rewritten whole on every save
+JOURNAL_MAX = 64 * 1024 * 1024  # a journal this big is folded into the file on the next save
+CHECKPOINT_MS = 5000  # unsaved edits are journaled this often
+COMPACT_MS = 600000  # a journal idle this long is folded into the file
+RELEASE_MS = 200  # how often to retry closing a document while background jobs run
+INDEX_DIR = os.path.join(os.path.expanduser("~"), ".serpad_index")  # Quick Open's saved file lists
+HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".serpad_undo")  # undo histories of plain files
 
 # Create a Fernet key from a password string (derive key safely)
 import base64
@@ -18,35 +38,62 @@ def create_key(password: str) -> bytes:
     digest = hashlib.sha256(password.encode()).digest()
     return base64.urlsafe_b64encode(digest)
 
-def encrypt_text(text: str, key: bytes) -> bytes:
-    return Fernet(key).encrypt(text.encode())
-
 def decrypt_text(data: bytes, key: bytes) -> str:
-    return Fernet(key).decrypt(data).decode()
+    from cryptography.fernet import Fernet, InvalidToken  # only files from older versions need it
+    try:
+        return Fernet(key).decrypt(data).decode()
+    except InvalidToken:
+        raise DecryptionError("Wrong password, or the file is damaged") from None
 
 class SecureEditor:
     def __init__(self, root):
         self.root = root
         self.root.title(APP_NAME)
-        self.file_path = None
-        self.encrypted = False
-        self.key = None
-        self.recent_files = []
+        self.keys = KeyCache()
+        self.workspace = Workspace(MEMORY_BUDGET)
+        self.recent = RecentFiles(RECENT_FILE, RECENT_MAX)  # read when first used
+        self.tab = None  # the Tab on screen
+        self.job = None  # running BackgroundJob, if any
+        self.job_quiet = False
+        self.job_tab = None  # the tab it works on
+        self.backups = BackupStore(os.path.join(BACKUP_DIR, "store"))
+        self.backup_job = None
+        self.checkpoint_job = None
+        self.compacting = []  # journals being folded into their files
+        self.close_dialog = None  # closes the Find & Replace dialog, while open
+        self.quick_open = None  # built when first used
+        self.find_files = None  # Find in Files panel, built when first used
+        self.project = None  # folder chosen for Quick Open, if any
 
-        self.text = tk.Text(root, font=("Consolas", 12), undo=True, wrap="none")
-        self.text.pack(fill=tk.BOTH, expand=True)
+        # One notebook page per tab; a page gets its Text widget when first shown
+        self.notebook = ttk.Notebook(root)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.enable_traversal()  # Ctrl+Tab, Ctrl+Shift+Tab
+        self.notebook.bind("<<NotebookTabChanged>>", self._tab_changed)
         self.status = tk.StringVar()
-        tk.Label(root, textvariable=self.status, anchor="w").pack(fill=tk.X)
-        self.text.bind("<KeyRelease>", self.update_status)
+        self.status_label = tk.Label(root, textvariable=self.status, anchor="w")
+        self.status_label.pack(fill=tk.X)
+        self.search_bar = None
+        root.bind("<Control-f>", self.find)
+        root.bind("<Control-p>", self.open_quick)
+        root.bind("<Control-F>", self.find_in_files)  # Ctrl+Shift+F
+        root.bind("<Control-n>", self.new_tab)
+        root.bind("<Control-w>", self.close_tab)
+        root.bind("<Escape>", self.cancel_job)
+        root.protocol("WM_DELETE_WINDOW", self.quit)
 
         menu = tk.Menu(root)
         root.config(menu=menu)
 
         fileMenu = tk.Menu(menu, tearoff=0)
+        fileMenu.add_command(label="New Tab", command=self.new_tab)
         fileMenu.add_command(label="Open", command=self.open_file)
         fileMenu.add_command(label="Open Encrypted", command=self.open_encrypted)
+        fileMenu.add_command(label="Quick Open", command=self.open_quick)
+        fileMenu.add_command(label="Project Folder...", command=self.open_project)
         fileMenu.add_command(label="Save", command=self.save_file)
         fileMenu.add_command(label="Save As", command=self.save_as)
+        fileMenu.add_command(label="Close Tab", command=self.close_tab)
         fileMenu.add_separator()
         self.recentMenu = tk.Menu(fileMenu, tearoff=0)
         fileMenu.add_cascade(label="Recent Files", menu=self.recentMenu)
@@ -55,39 +102,395 @@ class SecureEditor:
         menu.add_cascade(label="File", menu=fileMenu)
 
         editMenu = tk.Menu(menu, tearoff=0)
+        editMenu.add_command(label="Undo", command=self.undo)
+        editMenu.add_command(label="Redo", command=self.redo)
+        editMenu.add_command(label="Earlier State", command=self.earlier)
+        editMenu.add_command(label="Later State", command=self.later)
+        editMenu.add_separator()
+        editMenu.add_command(label="Find", command=self.find)
         editMenu.add_command(label="Find & Replace", command=self.find_replace)
+        editMenu.add_command(label="Find in Files", command=self.find_in_files)
         menu.add_cascade(label="Edit", menu=editMenu)
 
-        # Auto backup every 5 minutes (300000 ms)
-        root.after(300000, self.auto_backup)
+        viewMenu = tk.Menu(menu, tearoff=0)
+        viewMenu.add_command(label="Workspace Stats", command=self.show_stats)
+        menu.add_cascade(label="View", menu=viewMenu)
+
+        self.new_tab()
+        root.after_idle(self._refresh_recent)  # once the window is up
+        root.after(BACKUP_MS, self.auto_backup)
+        root.after(CHECKPOINT_MS, self.checkpoint)
+        root.after(COMPACT_MS, self.auto_compact)
+
+    @property
+    def view(self):
+        """Viewport of the tab on screen (None while its file is being read)."""
+        return self.tab.view
+
+    @property
+    def text(self):
+        return self.tab.view.text
 
     def update_status(self, event=None):
-        line, col = self.text.index("insert").split(".")
-        self.status.set(f"Line {line}, Column {col}")
+        if self.view is None:
+            return
+        line, col = map(int, self.text.index("insert").split("."))
+        if line == 1:
+            col += self.view.lead
+        status = f"Line {self.view.top + line}, Column {col}"
+        if self.tab.encrypted:
+            stats = self.keys.stats()
+            status += (f"    Keys: {stats['hits']}/{stats['hits'] + stats['misses']} from cache, "
+                       f"{stats['derivations']} derived in {stats['kdf_seconds']:.2f} s")
+        workspace = self.workspace
+        status += (f"    Tab {workspace.memory(self.tab) / 1e6:.1f} MB, "
+                   f"{len(workspace.tabs)} tabs {workspace.total() / 1e6:.1f} MB")
+        if workspace.switches:
+            status += f", switch {workspace.switches[-1] * 1000:.1f} ms"
+        self.status.set(status)
+
+    def show_stats(self):
+        stats = self.workspace.stats()
+        lines = [f"{stats['tabs']} tabs, {stats['loaded']} loaded, {stats['widgets']} with a widget",
+                 f"Memory: {stats['memory'] / 1e6:.1f} MB of {self.workspace.budget / 1e6:.0f} MB", ""]
+        lines += [f"{title}: {size / 1e6:.2f} MB" for title, size in stats["per_tab"]]
+        if stats["switch_last"] is not None:
+            lines += ["", f"Tab switch: last {stats['switch_last'] * 1000:.1f} ms, "
+                          f"median {stats['switch_median'] * 1000:.1f} ms, "
+                          f"95% {stats['switch_p95'] * 1000:.1f} ms"]
+        histories = [tab.history for tab in self.workspace.tabs if tab.history is not None]
+        lines += ["", f"Undo: {sum(len(h) - 1 for h in histories):,} steps, "
+                      f"{sum(h.memory for h in histories) / 1e6:.2f} MB of them in memory"]
+        messagebox.showinfo("Workspace", "\n".join(lines))
 
     def auto_backup(self):
-        content = self.text.get("1.0", tk.END)
-        name = "untitled" if not self.file_path else os.path.basename(self.file_path)
-        bak_path = os.path.join(BACKUP_DIR, f"{name}-{int(time.time())}.bak")
-        try:
-            with open(bak_path, "w", encoding="utf-8") as f:
-                f.write(content)
-        except Exception as e:
-            print(f"Backup failed: {e}")
-        self.root.after(300000, self.auto_backup)
+        """Back up edited documents on a worker thread, unless they are
+        unchanged or the last backup is still being written."""
+        self.root.after(BACKUP_MS, self.auto_backup)
+        if self.backup_job is not None and self.backup_job.running:
+            return
+        # An untouched file is its own backup; encrypted text is never stored in the clear
+        todo = [(tab, tab.doc, tab.doc.version, tab.doc.snapshot(), tab.path, tab.id)
+                for tab in self.workspace.tabs
+                if tab.doc is not None and tab.doc.version and not tab.encrypted
+                and tab.backed_up != (tab.doc, tab.doc.version)]
+        if not todo:
+            return
+
+        def work(progress, cancel):
+            for _, doc, _, snapshot, path, untitled in todo:
+                self.backups.backup(doc, snapshot, path, cancel, untitled=untitled)
+            self.backups.prune()
+
+        def done(result):
+            for tab, doc, version, _, _, _ in todo:
+                if tab.doc is doc:
+                    tab.backed_up = (doc, version)
+
+        self.backup_job = BackgroundJob(self.root, work, done,
+                                        lambda e: print(f"Backup failed: {e}"), label="Backup")
+
+    # -------------------- Tabs --------------------
+
+    def _add_tab(self, tab, select=True):
+        tab.page = tk.Frame(self.notebook)
+        self.notebook.add(tab.page, text=tab.title)
+        self.workspace.add(tab)
+        if select:
+            self._select(tab)
+        return tab
+
+    def new_tab(self, event=None):
+        tab = Tab(doc=PieceTable())
+        tab.history = UndoHistory()
+        self._add_tab(tab)
+        return "break"
+
+    def _tab_changed(self, event=None):
+        page = self.notebook.select()
+        for tab in self.workspace.tabs:
+            if str(tab.page) == page:
+                if tab is not self.tab:
+                    self._select(tab)
+                return
+
+    def _select(self, tab):
+        """Show a tab, reading its file first if it has not been yet."""
+        start = time.perf_counter()
+        if self.close_dialog is not None:
+            self.close_dialog()
+        self.tab = tab
+        self.workspace.select(tab)
+        self.notebook.select(tab.page)
+        self.root.title(f"{APP_NAME} - {tab.title}")
+        if tab.doc is None:
+            if tab.encrypted:
+                self._load_encrypted(tab)  # shown when decrypted
+                return
+            if not self._load_plain(tab):
+                return
+        self._show(tab)
+        self.root.update_idletasks()
+        self.workspace.record_switch(time.perf_counter() - start)
+        self._evict()
+        self.update_status()
+
+    def _show(self, tab):
+        """Give the tab on screen its widget, if it has none yet."""
+        if tab.view is None:
+            # Undo is the editor's own, kept in tab.history, not Tk's
+            view = TextViewport(tab.page, tab.doc, font=("Consolas", 12), undo=False, wrap="none")
+            view.pack(fill=tk.BOTH, expand=True)
+            view.show(min(tab.position, len(tab.doc)))
+            view.text.bind("<KeyRelease>", self.update_status)
+            view.text.bind("<<Undo>>", self.undo)
+            view.text.bind("<<Redo>>", self.redo)
+            view.text.bind("<Control-y>", self.redo)
+            view.listeners.append(lambda *edit: self._edited(tab, *edit))
+            tab.view = view
+        if self.search_bar is None:
+            self.search_bar = SearchBar(self.root, tab.view)
+        else:
+            self.search_bar.attach(tab.view)
+        tab.view.text.focus_set()
+        self._retitle(tab)
+
+    def _edited(self, tab, offset, removed, inserted):
+        tab.history.record(offset, removed, inserted)
+        self._retitle(tab)
+
+    def _retitle(self, tab):
+        title = tab.title
+        if self.notebook.tab(tab.page, "text") != title:
+            self.notebook.tab(tab.page, text=title)
+        if tab is self.tab:
+            self.root.title(f"{APP_NAME} - {title}")
+
+    def close_tab(self, event=None):
+        tab = self.tab
+        if self.job is not None and self.job.running and self.job_tab is tab:
+            messagebox.showwarning("Busy", f"{self.job.label} is still in progress.")
+            return "break"
+        if tab.modified and not messagebox.askokcancel(
+                "Close Tab", f"{tab.title} has unsaved changes. Close it anyway?"):
+            return "break"
+        self._drop_tab(tab)
+        return "break"
+
+    def _drop_tab(self, tab):
+        if tab not in self.workspace.tabs:
+            return
+        if self.tab is tab:
+            others = sorted((t for t in self.workspace.tabs if t is not tab), key=lambda t: t.used)
+            if others:
+                self._select(others[-1])
+            else:
+                self.new_tab()
+        if tab.view is not None:
+            tab.view.destroy()
+        self.notebook.forget(tab.page)
+        tab.page.destroy()
+        self.workspace.remove(tab)
+        self._close_journal(tab)
+        self._close_history(tab)
+        if tab.doc is not None:
+            self._release(tab.doc)
+            tab.doc = None
+
+    def _evict(self):
+        """Free background tabs, least recently used first, while the
+        workspace is over its memory budget. Widgets go first; documents
+        without unsaved edits go too, to be read from disk when next shown;
+        an untitled one has no file to be read from, and stays."""
+        if self.backup_job is not None and self.backup_job.running:
+            return  # it may be reading any of the documents
+        for tab in self.workspace.over_budget():
+            if self.job is not None and self.job.running and self.job_tab is tab:
+                continue
+            if tab.view is not None and self.search_bar.view is not tab.view:
+                tab.position = tab.view.offset("insert")
+                tab.view.destroy()
+                tab.view = None
+            doc = tab.doc
+            if (doc is not None and tab.path is not None and not tab.modified
+                    and not any(j.doc is doc for j in self.compacting)):
+                self._close_journal(tab)
+                self._close_history(tab)  # kept, with its steps on disk if it can be
+                tab.doc = None
+                tab.enc_origin = tab.backed_up = None
+                self._release(doc)
+
+    # -------------------- Opening --------------------
 
     def open_file(self):
-        path = filedialog.askopenfilename()
+        paths = filedialog.askopenfilenames()
+        # The first one is shown; the others wait in tabs until looked at
+        for i, path in enumerate(paths):
+            self._open(path, path.endswith(".enc"), select=i == 0)
+
+    def open_encrypted(self, path=None):
         if not path:
+            path = filedialog.askopenfilename(filetypes=[("Encrypted Files", "*.enc")])
+            if not path:
+                return
+        self._open(path, encrypted=True)
+
+    def open_quick(self, event=None):
+        """Pick a file of the project by name."""
+        if self.quick_open is None:
+            from quick_open import QuickOpen  # the index is only needed once Quick Open is used
+            self.quick_open = QuickOpen(self.root, INDEX_DIR, lambda p: self._open(p, p.endswith(".enc")))
+        self.quick_open.show(self._project_folder())
+        return "break"
+
+    def _project_folder(self):
+        """The chosen project folder, else the one holding the file on
+        screen, else the working folder."""
+        if self.project is not None:
+            return self.project
+        from path_index import project_root
+        return project_root(self.tab.path) if self.tab.path else os.getcwd()
+
+    def open_project(self):
+        folder = filedialog.askdirectory()
+        if folder:
+            self.project = folder
+            self.open_quick()
+
+    def _open(self, path, encrypted=False, select=True):
+        tab = self.workspace.find(path)
+        if tab is None:
+            blank = self.tab
+            tab = self._add_tab(Tab(path, encrypted=encrypted), select=select)
+            if (select and tab in self.workspace.tabs and blank is not None and blank.path is None
+                    and blank.doc is not None and not blank.modified and not len(blank.doc)):
+                self._drop_tab(blank)  # an empty Untitled tab is replaced
+        elif select:
+            self._select(tab)
+
+    def _load_plain(self, tab):
+        """Read a plain file into its tab, replaying its journal if it has one."""
+        path = tab.path
+        journal = None
+        unsaved = None
+        try:
+            try:
+                replayed = replay(path)
+            except JournalError as e:
+                stale = journal_path(path) + ".stale"
+                os.replace(journal_path(path), stale)
+                messagebox.showwarning("Journal", f"{e}.\nIts saved changes were not applied; "
+                                                  f"the journal was kept as {stale}")
+                replayed = None
+            if replayed is None:
+                # Memory-mapped: the first screen shows at once for any file size
+                doc = PieceTable.open(path)
+            else:
+                doc, journal, unsaved = replayed
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed opening file:\n{e}")
+            if not os.path.exists(path):
+                self.recent.remove(path)
+                self._refresh_recent()
+            self._drop_tab(tab)
+            return False
+        tab.doc = doc
+        tab.journal = journal
+        tab.saved_version = doc.version
+        if tab.history is None:
+            # Resumed from its log if that was last saved with this content
+            tab.history = UndoHistory.load(history_file(HISTORY_DIR, path), fingerprint(doc))
+        if unsaved is not None and messagebox.askyesno(
+                "Recover", f"{os.path.basename(path)} has unsaved changes from a session "
+                           "that did not close. Restore them?"):
+            doc.restore(unsaved)
+            tab.history.reset()  # it has no step for them
+        self.add_recent(path)
+        if not doc.lines.complete:
+            # Count the rest of the lines so the scrollbar and line numbers are exact
+            self.run_job("Indexing lines",
+                         lambda progress, cancel: doc.lines.scan(cancel=cancel, progress=progress),
+                         lambda result: None, quiet=True, tab=tab)
+        return True
+
+    def _load_encrypted(self, tab):
+        path = tab.path
+        try:
+            header = read_header(path)
+        except (OSError, DecryptionError) as e:
+            messagebox.showerror("Error", f"Failed opening file:\n{e}")
+            self._drop_tab(tab)
             return
-        if path.endswith(".enc"):
-            self.open_encrypted(path)
-        else:
-            self._load_file(path, encrypted=False)
+        # The tab's own key, or one still cached for this file's salt, opens it without asking
+        key = tab.key if header is not None and header == tab.header else self.keys.get(header)
+        password = None
+        if key is None:
+            password = simpledialog.askstring("Password", "Enter decryption password:", show="*")
+            if not password:
+                messagebox.showerror("Error", "No password entered")
+                self._drop_tab(tab)
+                return
+        keys = self.keys
+
+        def work(progress, cancel):
+            # Keys are derived here, off the Tk thread
+            header = read_header(path)
+            if header is None:
+                # A Fernet token from an older version
+                data = read_file(path, progress, cancel)
+                data = decrypt_text(data, create_key(password)).encode("utf-8")
+                segments = None
+            else:
+                file_key = key or keys.derive(header, password)
+                try:
+                    if salted(header):
+                        # Decrypted a segment at a time, as it is read
+                        original = Plaintext(path, file_key)
+                        try:
+                            original[:1]  # a damaged first segment fails here, not on screen
+                        except DecryptionError:
+                            original.close()
+                            raise
+                        return PieceTable(original), (header, file_key, original.file.segments())
+                    with EncryptedFile(path, file_key) as f:
+                        data, segments = f.load(progress, cancel)
+                except DecryptionError:
+                    keys.forget(header)
+                    raise
+            # Saved back with a salted key
+            header = new_header(KDF_COST)
+            return PieceTable(data), (header, keys.derive(header, password), None)
+
+        def done(result):
+            doc, (tab.header, tab.key, segments) = result
+            tab.doc = doc
+            tab.saved_version = doc.version
+            tab.enc_origin = None if segments is None else (doc, path, segments)
+            if tab.history is None:
+                tab.history = UndoHistory()  # in memory only, like the text
+                tab.history.saved = 0
+            self.add_recent(path)
+            if self.tab is tab:
+                self._show(tab)
+            self._evict()
+            if not doc.lines.complete:
+                # Counting the lines decrypts the rest of the file, which checks it too
+                self.run_job("Indexing lines",
+                             lambda progress, cancel: doc.lines.scan(cancel=cancel, progress=progress),
+                             lambda result: None, quiet=True, tab=tab, on_error=damaged)
+
+        def damaged(e):
+            if isinstance(e, DecryptionError):
+                messagebox.showerror("Error", f"{os.path.basename(path)} is damaged:\n{e}")
+
+        self.run_job(f"Opening {os.path.basename(path)}", work, done, tab=tab,
+                     on_error=lambda e: tab.doc is None and self._drop_tab(tab))
+
+    # -------------------- Saving --------------------
 
     def save_file(self):
-        if self.file_path:
-            self._save(self.file_path)
+        if self.tab.path:
+            self._save(self.tab, self.tab.path)
         else:
             self.save_as()
 
@@ -95,58 +498,343 @@ class SecureEditor:
         path = filedialog.asksaveasfilename(defaultextension=".txt")
         if not path:
             return
-        self._save(path)
+        self._save(self.tab, path)
+
+    def _save(self, tab, path):
+        if self._busy() or tab.doc is None:
+            return
+        if any(journal.path == path for journal in self.compacting):
+            messagebox.showwarning("Busy", f"Saved changes are still being written to {os.path.basename(path)}.")
+            return
+        doc = tab.doc
+        snapshot = doc.snapshot()
+        version = doc.version
+        mark = (tab.history.checkpoint(), fingerprint(doc, snapshot))  # the undo step being saved
+        journal = self._journal(tab, path) if path == tab.path else None
+        if journal is not None and journal.size < JOURNAL_MAX:
+            # Only the edits since the last save are written
+            added_end = len(doc.added)
+            self.run_job(f"Saving {os.path.basename(path)}",
+                         lambda progress, cancel: journal.append(snapshot, added_end, version),
+                         lambda result: self._saved(tab, path, version, mark), tab=tab)
+            return
+        writer = None
+        if tab.encrypted:
+            path = path if path.endswith(".enc") else path + ".enc"
+            # Segments still whole since the last load or save are copied, not re-encrypted
+            origin = tab.enc_origin[1:] if tab.enc_origin and tab.enc_origin[0] is doc else None
+            writer = EncryptedWriter(tab.key, tab.header, origin)
+            chunks = writer.chunks(doc, snapshot)
+        else:
+            chunks = doc.chunks(snapshot=snapshot)
 
-    def _save(self, path):
-        content = self.text.get("1.0", tk.END)
+        written = []
+
+        def work(progress, cancel):
+            written.append(write_temp(path, chunks, snapshot[1], progress, cancel))
+            return written[0]
+
+        def dropped(e):
+            # Cancelled once the temp file was complete: nothing will replace the file with it
+            for tmp_path in written:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        self.run_job(f"Saving {os.path.basename(path)}", work,
+                     lambda tmp_path: self._finish_save(tab, tmp_path, path, version, writer, mark), tab=tab,
+                     on_error=dropped)
+
+    def _finish_save(self, tab, tmp_path, path, version, writer=None, mark=None):
+        doc = tab.doc
+        # Unchanged since the snapshot: the saved file can replace the mapping
+        reopen = doc.version == version
         try:
-            if self.encrypted:
-                data = encrypt_text(content, self.key)
-                path = path if path.endswith(".enc") else path + ".enc"
-                with open(path, "wb") as f:
-                    f.write(data)
-            else:
-                with open(path, "w", encoding="utf-8") as f:
-                    f.write(content)
-            self.file_path = path
-            self.add_recent(path)
-            self.root.title(f"{APP_NAME} - {os.path.basename(path)}")
-            messagebox.showinfo("Saved", f"Saved to {self.file_path}")
-        except Exception as e:
+            try:
+                replace_temp(tmp_path, path)
+            except PermissionError:
+                if not reopen:
+                    raise
+                # Windows refuses to replace a file that is still mapped
+                doc.close()
+                try:
+                    replace_temp(tmp_path, path)
+                except OSError:
+                    tab.doc = self._map(tab, tmp_path)
+                    if tab.view is not None:
+                        tab.view.set_document(tab.doc, keep=True)
+                    raise
+        except OSError as e:
             messagebox.showerror("Error", f"Failed to save:\n{e}")
-
-    def open_encrypted(self, path=None):
-        if not path:
-            path = filedialog.askopenfilename(filetypes=[("Encrypted Files", "*.enc")])
-            if not path:
-                return
-        password = simpledialog.askstring("Password", "Enter decryption password:", show="*")
-        if not password:
-            messagebox.showerror("Error", "No password entered")
             return
-        self.encrypted = True
-        self.key = create_key(password)
-        self._load_file(path, encrypted=True)
+        if tab.journal is not None:
+            if tab.journal.path == path:
+                tab.journal.discard()  # the file now holds everything it saved
+                tab.journal = None
+            else:
+                self._close_journal(tab)
+        if reopen:
+            # Same content, one piece, no edit buffer
+            self._reopen(tab, path)
+        if writer is not None:
+            tab.enc_origin = (tab.doc, path, writer.segments)
+        self._saved(tab, path, None if reopen else version, mark)
+
+    def _saved(self, tab, path, version=None, mark=None):
+        if version is not None:
+            tab.saved_version = version
+        if mark is not None:
+            try:
+                tab.history.saved_at(*mark, None if tab.encrypted else history_file(HISTORY_DIR, path))
+            except OSError as e:
+                print(f"Writing the undo history of {path} failed: {e}")
+        tab.path = path
+        self.add_recent(path)
+        self._retitle(tab)
+        messagebox.showinfo("Saved", f"Saved to {path}")
+
+    def _map(self, tab, path):
+        """A document over the file at `path`: mapped, or decrypted as it is
+        read for an encrypted tab."""
+        return PieceTable(Plaintext(path, tab.key)) if tab.encrypted else PieceTable.open(path)
+
+    def _reopen(self, tab, path):
+        """Map the file just written in place of the document it was written
+        from, which has the same content."""
+        doc = tab.doc
+        tab.doc = self._map(tab, path)
+        tab.saved_version = tab.doc.version
+        if tab.view is not None:
+            tab.view.set_document(tab.doc, keep=True)
+        self._release(doc)
+
+    # -------------------- Journal --------------------
 
-    def _load_file(self, path, encrypted=False):
+    def _journal(self, tab, path):
+        """The journal of the tab's saves to `path`, starting one if the file
+        is big enough to be worth it and is still the one the document maps."""
+        doc = tab.doc
+        journal = tab.journal
+        if journal is not None and journal.doc is doc and journal.path == path:
+            return journal
+        if tab.encrypted or path is None or len(doc) < JOURNAL_MIN:
+            return None
         try:
-            if encrypted:
-                with open(path, "rb") as f:
-                    data = f.read()
-                content = decrypt_text(data, self.key)
+            journal = Journal.start(doc, path)
+        except OSError:
+            return None
+        if journal is not None:
+            self._close_journal(tab)
+            tab.journal = journal
+        return journal
+
+    def _close_journal(self, tab):
+        """Let go of a tab's journal, first folding its saves into the file."""
+        journal, tab.journal = tab.journal, None
+        if journal is None:
+            return
+        if journal.saved is None:
+            journal.discard()
+        else:
+            self._compact(tab, journal)
+
+    def _close_history(self, tab):
+        """Write a tab's undo steps to its log and let go of the file."""
+        if tab.history is not None:
+            try:
+                tab.history.close()
+            except OSError as e:
+                print(f"Writing the undo history of {tab.path} failed: {e}")
+
+    def _release(self, doc):
+        """Close a document no longer shown. While its saves are still being
+        written out, the compaction closes it when done; while any other job
+        runs (a backup, checkpoint or search may be reading a snapshot of
+        it, even one cancelled a moment ago), it is closed once they end."""
+        if any(journal.doc is doc for journal in self.compacting):
+            return
+        if BackgroundJob.active:
+            self.root.after(RELEASE_MS, lambda: self._release(doc))
+            return
+        doc.close()
+
+    def checkpoint(self):
+        """Journal unsaved edits every few seconds, so a crash loses at most those."""
+        self.root.after(CHECKPOINT_MS, self.checkpoint)
+        if self.checkpoint_job is not None and self.checkpoint_job.running:
+            return
+        todo = []
+        for tab in self.workspace.tabs:
+            doc = tab.doc
+            if doc is None or (tab.journal is None and not tab.modified):
+                continue
+            journal = self._journal(tab, tab.path)
+            if journal is None or journal.version == doc.version or journal in self.compacting:
+                continue
+            todo.append((journal, doc.snapshot(), len(doc.added), doc.version))
+        if not todo:
+            return
+
+        def work(progress, cancel):
+            for journal, snapshot, added_end, version in todo:
+                journal.append(snapshot, added_end, version, CHECKPOINT)
+
+        self.checkpoint_job = BackgroundJob(self.root, work, lambda result: None,
+                                            lambda e: print(f"Checkpoint failed: {e}"), label="Checkpoint")
+
+    def auto_compact(self):
+        """Fold journals into their files once their documents have sat saved for a while."""
+        self.root.after(COMPACT_MS, self.auto_compact)
+        for tab in self.workspace.tabs:
+            journal = tab.journal
+            if (journal is not None and journal.saved is not None and journal not in self.compacting
+                    and journal.saved[1] == tab.doc.version):
+                self._compact(tab, journal)
+
+    def _compact(self, tab, journal, then=None):
+        """Write the last save in `journal` to its file through a temp file,
+        then delete the journal. `then` is called when done, either way."""
+        doc = journal.doc
+        snapshot, version = journal.saved
+        path = journal.path
+        self.compacting.append(journal)
+
+        def work(progress, cancel):
+            return write_temp(path, doc.chunks(snapshot=snapshot), snapshot[1], progress, cancel)
+
+        def done(tmp_path):
+            self.compacting.remove(journal)
+            current = tab.doc is doc
+            if not current:
+                self._release(doc)
+            try:
+                replace_temp(tmp_path, path)
+            except OSError as e:
+                # The journal stays, and is replayed when the file is next opened
+                os.remove(tmp_path)
+                print(f"Writing {path} failed: {e}")
+                if not current:
+                    journal.close()
             else:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            self.text.delete("1.0", tk.END)
-            self.text.insert(tk.END, content)
-            self.file_path = path
-            self.encrypted = encrypted
-            self.add_recent(path)
-            self.root.title(f"{APP_NAME} - {os.path.basename(path)}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed opening file:\n{e}")
+                journal.discard()
+                if tab.journal is journal:
+                    tab.journal = None
+                if current and doc.version == version:
+                    self._reopen(tab, path)
+            if then is not None:
+                then()
+
+        def failed(e):
+            self.compacting.remove(journal)
+            print(f"Writing {path} failed: {e}")
+            if tab.doc is not doc:
+                journal.close()
+                self._release(doc)
+            if then is not None:
+                then()
+
+        BackgroundJob(self.root, work, done, failed, label="Compacting")
+
+    # -------------------- Background I/O --------------------
+
+    def _busy(self):
+        """Whether a load or save is still running. Quiet jobs just get cancelled."""
+        if self.job is None or not self.job.running:
+            return False
+        if self.job_quiet:
+            self.job.cancel.set()
+            return False
+        messagebox.showwarning("Busy", f"{self.job.label} is still in progress.")
+        return True
+
+    def run_job(self, label, work, on_done, quiet=False, tab=None, on_error=None):
+        """Run work(progress, cancel) on a worker thread with progress in the status bar.
+        `tab` is the tab it works on; on_error(exc) is called after the error is shown."""
+        if quiet and self.job is not None and self.job.running:
+            return
+        if self._busy():
+            return
+
+        def progress(done, total):
+            percent = done * 100 // total if total else 100
+            self.status.set(f"{label}... {percent}%  (Esc to cancel)")
+
+        def done(result):
+            if self.job is job:
+                self.job = self.job_tab = None
+                on_done(result)
+                self.update_status()
+
+        def failed(e):
+            if self.job is not job:
+                return
+            self.job = self.job_tab = None
+            if isinstance(e, Cancelled):
+                self.status.set(f"{label} cancelled")
+            elif quiet:
+                self.update_status()
+            else:
+                messagebox.showerror("Error", f"{label} failed:\n{e}")
+                self.update_status()
+            if on_error is not None:
+                on_error(e)
+
+        job = BackgroundJob(self.root, work, done, failed, progress, label)
+        self.job = job
+        self.job_quiet = quiet
+        self.job_tab = tab
+
+    def cancel_job(self, event=None):
+        if self.job is not None:
+            self.job.cancel.set()
+
+    def find(self, event=None):
+        if self.view is not None:
+            self.search_bar.show(before=self.status_label)
+        return "break"
+
+    def find_in_files(self, event=None):
+        if self.find_files is None:
+            from find_in_files import FindInFiles  # only needed once it is used
+            self.find_files = FindInFiles(self.root, self._open_at, self._open_documents, self._replace_in_document)
+        self.find_files.show(self._project_folder())
+        return "break"
+
+    def _open_at(self, path, offset):
+        """Open a file with the cursor at a byte offset, as for a search result."""
+        self._open(path, path.endswith(".enc"))
+        tab = self.workspace.find(path)
+        if tab is None:
+            return
+        if tab.view is not None:
+            tab.view.show(min(offset, len(tab.doc)))
+            tab.view.text.focus_set()
+        else:
+            tab.position = offset  # shown there once read
+
+    def _open_documents(self):
+        return {tab.path: tab.doc for tab in self.workspace.tabs
+                if tab.path and tab.doc is not None and not tab.encrypted}
+
+    def _replace_in_document(self, path, doc, version, spans):
+        """Apply Replace All spans found in `doc` at `version` to the open
+        file, as one edit; None if it was closed or edited since."""
+        tab = self.workspace.find(path)
+        if tab is None or tab.doc is not doc or doc.version != version:
+            return None
+        if spans:
+            self.apply_spans(tab, spans)
+        return len(spans)
 
     def find_replace(self):
+        tab = self.tab
+        view = self.view
+        if view is None:
+            return
+        if self.close_dialog is not None:
+            self.close_dialog()
+        text = view.text
         fr = tk.Toplevel(self.root)
         fr.title("Find & Replace")
         fr.transient(self.root)
@@ -158,40 +846,188 @@ class SecureEditor:
         repl_entry = tk.Entry(fr, width=30)
         find_entry.grid(row=0, column=1, padx=5, pady=5)
         repl_entry.grid(row=1, column=1, padx=5, pady=5)
+        find_entry.focus_set()
+
+        case_var = tk.BooleanVar()
+        word_var = tk.BooleanVar()
+        regex_var = tk.BooleanVar()
+        options = tk.Frame(fr)
+        options.grid(row=2, column=0, columnspan=2)
+        for label, var in (("Match case", case_var), ("Whole word", word_var), ("Regex", regex_var)):
+            tk.Checkbutton(options, text=label, variable=var, command=lambda: schedule()).pack(side=tk.LEFT)
+        count_var = tk.StringVar()
+        tk.Label(fr, textvariable=count_var, anchor="w").grid(row=3, column=0, columnspan=2, sticky="we", padx=5)
+        text.tag_configure("match", background="yellow")
+        pending = [None]
+
+        def pattern():
+            """Compiled search, or None (with the reason shown) if there isn't one."""
+            if not find_entry.get():
+                return None
+            try:
+                return compile_search(find_entry.get(), regex_var.get(), word_var.get(), case_var.get())
+            except re.error as e:
+                count_var.set(f"Invalid pattern: {e}")
+                return None
+
+        def highlight():
+            # Only what is on screen is tagged, so this is cheap for any size
+            pending[0] = None
+            if fr.winfo_exists():
+                count_var.set("")
+                highlight_visible(text, pattern())
+
+        def schedule(event=None):
+            if pending[0] is None:
+                pending[0] = self.root.after(100, highlight)
+
+        def do_count():
+            p = pattern()
+            if p is None:
+                return
+            doc = tab.doc
+            snapshot = doc.snapshot()
+            self.run_job("Counting matches",
+                         lambda progress, cancel: count_matches(doc, p, snapshot, cancel, progress),
+                         lambda n: fr.winfo_exists() and count_var.set(f"{n} matches"), tab=tab)
 
         def do_replace():
-            self.text.tag_remove("match", "1.0", tk.END)
-            search = find_entry.get()
-            replace = repl_entry.get()
-            if not search:
-                messagebox.showwarning("Warning", "Find field cannot be empty.")
+            p = pattern()
+            if p is None:
+                if not find_entry.get():
+                    messagebox.showwarning("Warning", "Find field cannot be empty.")
                 return
-            idx = "1.0"
-            while True:
-                idx = self.text.search(search, idx, nocase=1, stopindex=tk.END)
-                if not idx:
-                    break
-                lastidx = f"{idx}+{len(search)}c"
-                self.text.delete(idx, lastidx)
-                self.text.insert(idx, replace)
-                idx = lastidx
+            repl = repl_entry.get()
+            regex = regex_var.get()
+            doc = tab.doc
+            snapshot = doc.snapshot()
+            version = doc.version
+
+            def apply(spans):
+                if tab.doc is not doc or doc.version != version:
+                    messagebox.showwarning("Warning", "The document changed while searching; try again.")
+                    return
+                if spans:
+                    self.apply_spans(tab, spans)
+                if fr.winfo_exists():
+                    highlight()
+                    count_var.set(f"Replaced {len(spans)} matches")
+
+            self.run_job("Replacing", lambda progress, cancel: replace_spans(
+                doc, p, repl, regex, snapshot, cancel, progress), apply, tab=tab)
+
+        def close():
+            # Also called when switching tabs, as the dialog works on this one
+            self.close_dialog = None
+            if pending[0] is not None:
+                self.root.after_cancel(pending[0])
+            if schedule in view.scroll_listeners:
+                view.scroll_listeners.remove(schedule)
+            if tab.view is view:
+                text.tag_remove("match", "1.0", tk.END)
             fr.destroy()
 
-        tk.Button(fr, text="Replace All", command=do_replace).grid(row=2, column=0, columnspan=2, pady=10)
+        find_entry.bind("<KeyRelease>", schedule)
+        view.scroll_listeners.append(schedule)
+        fr.protocol("WM_DELETE_WINDOW", close)
+        self.close_dialog = close
+        buttons = tk.Frame(fr)
+        buttons.grid(row=4, column=0, columnspan=2, pady=10)
+        tk.Button(buttons, text="Count", command=do_count).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Replace All", command=do_replace).pack(side=tk.LEFT, padx=5)
+
+    def apply_spans(self, tab, spans):
+        """Replace many spans as one edit, one step of the undo history."""
+        doc = tab.doc
+        view = tab.view
+        insert = view.offset("insert") if view is not None else tab.position
+        read = doc.reader()
+        tab.history.record_spans([(start, read(start, end), data) for start, end, data in spans])
+        doc.replace_spans(spans)
+        if view is not None:
+            view.show(min(insert, len(doc)), render=True)
+        self._retitle(tab)
+
+    # -------------------- Undo --------------------
+
+    def undo(self, event=None):
+        return self._travel(UndoHistory.undo, "Nothing to undo")
+
+    def redo(self, event=None):
+        return self._travel(UndoHistory.redo, "Nothing to redo")
+
+    def earlier(self, event=None):
+        """Go to the state before the current one in time, on any branch of the history."""
+        return self._travel(UndoHistory.earlier, "This is the earliest state")
+
+    def later(self, event=None):
+        return self._travel(UndoHistory.later, "This is the latest state")
+
+    def _travel(self, move, nothing):
+        tab = self.tab
+        if self.view is None:
+            return "break"
+        applies = tab.history.applies
+        try:
+            cursor = move(tab.history, tab.doc)
+        except (HistoryError, OSError) as e:
+            tab.history.reset()
+            messagebox.showwarning("Undo", f"{e}; the undo history was cleared.")
+            return "break"
+        if cursor is None:
+            self.status.set(nothing)
+            return "break"
+        if tab.history.current == tab.history.saved:
+            tab.saved_version = tab.doc.version  # back to what is on disk
+        # One span, as a typed run or a paste is, goes into the widget as it is;
+        # anything else renders the window again
+        history = tab.history
+        in_place = history.applies == applies + 1 and len(history.last) == 1 and self.view.replace(*history.last[0])
+        self.view.show(min(cursor, len(tab.doc)), render=not in_place)
+        self._retitle(tab)
+        self.update_status()
+        return "break"
 
     def add_recent(self, path):
-        if path in self.recent_files:
-            self.recent_files.remove(path)
-        self.recent_files.insert(0, path)
-        self.recent_files = self.recent_files[:RECENT_MAX]
+        self.recent.add(path)
+        self._refresh_recent()
 
+    def _refresh_recent(self):
         self.recentMenu.delete(0, tk.END)
-        for p in self.recent_files:
-            self.recentMenu.add_command(label=p, command=lambda pp=p: self._load_file(pp, pp.endswith(".enc")))
+        for p in self.recent:
+            self.recentMenu.add_command(label=p, command=lambda pp=p: self._open(pp, pp.endswith(".enc")))
 
     def quit(self):
-        if messagebox.askokcancel("Quit", "Are you sure you want to quit?"):
+        modified = [tab for tab in self.workspace.tabs if tab.modified]
+        question = (f"{len(modified)} tabs have unsaved changes. Quit anyway?" if modified
+                    else "Are you sure you want to quit?")
+        if not messagebox.askokcancel("Quit", question):
+            return
+        for tab in self.workspace.tabs:
+            self._close_history(tab)
+        # Saves still in journals are written into their files first
+        pending = []
+        for tab in self.workspace.tabs:
+            journal = tab.journal
+            if journal is None or journal in self.compacting:
+                continue
+            if journal.saved is None:
+                journal.discard()  # unsaved edits the user chose to leave
+            else:
+                pending.append((tab, journal))
+        if not pending:
             self.root.destroy()
+            return
+        self.status.set(f"Writing saved changes to {len(pending)} files...")
+        left = [len(pending)]
+
+        def finished():
+            left[0] -= 1
+            if not left[0]:
+                self.root.destroy()
+
+        for tab, journal in pending:
+            self._compact(tab, journal, then=finished)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,476 @@
+import hashlib
+import os
+import struct
+import time
+import zlib
+from array import array
+
+from serpad_io import write_atomic
+
+# Undo history for Serpad, kept by the editor instead of by Tk.
+# Every edit is a node of a tree: its parent is the state it was made in
+# and its delta the spans it replaced, with the bytes removed and the bytes
+# inserted, so it applies both ways. Undo goes to the parent and redo to
+# the child last come from; an edit made after undoing starts a new branch
+# instead of dropping the old one, and earlier/later step through every
+# state in the order it was made, across branches. Keys typed one after
+# another (or deleted) within a second of each other are one node, up to
+# the end of a line.
+# Deltas are packed, and compressed when big; they stay in memory up to
+# MEMORY bytes, then the oldest are appended to a log in HISTORY_DIR and
+# read back from there if undone. Saving appends every node and a mark
+# with a fingerprint of the saved content, so reopening the file unchanged
+# resumes its history, including redo of edits that were never saved. A
+# document without a log (untitled, or encrypted, whose text must not
+# reach the disk) forgets its oldest deltas instead, and undo stops there.
+# Before a delta is applied, the bytes it replaces are checked against the
+# document, so a history that does not belong to it is never applied.
+#
+#   MAGIC, then records: kind (1) | payload length (u32) | payload | crc32 (u32)
+#   node:  parent (i64) | time (f64) | delta
+#   save:  node (u64) | fingerprint (16)
+#   delta: format (1) | spans, zlib'd for format 1; format 2 has none (forgotten)
+#   span:  offset (u64) | removed length (u64) | inserted length (u64) | removed | inserted
+
+MAGIC = b"SPUNDO\x00\x01"
+RECORD = struct.Struct(">cI")
+NODE = struct.Struct(">qd")
+SAVE = struct.Struct(">Q16s")
+SPAN = struct.Struct(">QQQ")
+CRC = struct.Struct(">I")
+NODE_KIND, SAVE_KIND = b"N", b"S"
+PLAIN, PACKED, FORGOTTEN = 0, 1, 2
+
+MEMORY = 512 * 1024  # bytes of deltas kept in memory per document
+COMPRESS_MIN = 1024  # deltas smaller than this aren't worth compressing
+COALESCE_S = 1.0  # keys further apart than this are separate undo steps
+COALESCE_MAX = 4096  # bytes typed or deleted in one step
+KEY_MAX = 4  # an edit up to this size may be a key press
+MAX_LOG = 32 * 1024 * 1024  # a bigger log keeps only the saved state's recent past
+CHECKS = 64  # spans of a delta compared with the document before it is applied
+SAMPLES = 16  # pieces of the content in a fingerprint
+SAMPLE = 4096
+UNWRITTEN, LOST = -1, -2  # where a delta is when it isn't in the log
+
+
+class HistoryError(Exception):
+    pass
+
+
+def history_file(folder, path):
+    """Where the undo history of the file `path` is kept, in `folder`."""
+    path = os.path.abspath(path)
+    tag = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=6).hexdigest()
+    return os.path.join(folder, f"{os.path.basename(path)}-{tag}.undo")
+
+
+def fingerprint(doc, snapshot=None):
+    """Hash of a document's length and of SAMPLES pieces spread over it:
+    enough to tell whether a history belongs to a file, cheap at any size."""
+    read = doc.reader(snapshot)
+    length = snapshot[1] if snapshot else len(doc)
+    h = hashlib.blake2b(length.to_bytes(8, "big"), digest_size=16)
+    for i in range(SAMPLES):
+        start = max(0, length - SAMPLE) * i // (SAMPLES - 1)
+        h.update(read(start, start + SAMPLE))
+    return h.digest()
+
+
+def encode(spans):
+    """Delta for [(offset, removed bytes, inserted bytes)], sorted by offset."""
+    data = b"".join(SPAN.pack(offset, len(removed), len(inserted)) + removed + inserted
+                    for offset, removed, inserted in spans)
+    if len(data) >= COMPRESS_MIN:
+        packed = zlib.compress(data, 1)
+        if len(packed) < len(data):
+            return bytes([PACKED]) + packed
+    return bytes([PLAIN]) + data
+
+
+def decode(delta):
+    """The spans of a delta, or None if it was forgotten."""
+    if delta[0] == FORGOTTEN:
+        return None
+    data = zlib.decompress(delta[1:]) if delta[0] == PACKED else delta[1:]
+    spans = []
+    pos = 0
+    while pos < len(data):
+        offset, removed, inserted = SPAN.unpack_from(data, pos)
+        pos += SPAN.size
+        spans.append((offset, data[pos:pos + removed], data[pos + removed:pos + removed + inserted]))
+        pos += removed + inserted
+    return spans
+
+
+class UndoHistory:
+    """The tree of a document's states; node 0 is where it starts."""
+
+    def __init__(self, log=None):
+        self.log = log  # path of the log, None to keep nothing on disk
+        self.parent = array("q", [-1])
+        self.child = array("q", [-1])  # the child redo goes to
+        self.time = array("d", [time.time()])
+        self.where = array("q", [LOST])  # log offset of each node's record
+        self.deltas = {}  # node -> delta, for nodes not in the log yet, oldest first
+        self.memory = 0  # bytes in self.deltas
+        self.typing = None  # [node, offset, removed, inserted] of the step being typed
+        self.current = 0
+        self.saved = None  # node whose state is the file on disk
+        self.written = len(MAGIC)  # end of the log
+        self.flushed = 0  # the nodes up to this one are all in the log
+        self.fresh = True  # the log holds none of this history yet; it is rewritten
+        self.applies = 0  # deltas applied to the document by moving
+        self.last = None  # [(start, bytes replaced, bytes put there)] of the last one
+        self._file = None
+
+    @classmethod
+    def load(cls, log, mark):
+        """The history in `log` if its last save was of the content with
+        fingerprint `mark`, resumed at that state; else a new history
+        of that content."""
+        history = cls(log)
+        history.saved = 0
+        try:
+            with open(log, "rb") as f:
+                data = f.read()
+        except OSError:
+            return history
+        if not data.startswith(MAGIC):
+            return history
+        parent, times, where = array("q", [-1]), array("d", [0.0]), array("q", [LOST])
+        saved = None
+        view = memoryview(data)
+        pos = len(MAGIC)
+        while pos + RECORD.size <= len(data):
+            kind, length = RECORD.unpack_from(data, pos)
+            start = pos + RECORD.size
+            end = start + length + CRC.size
+            payload = view[start:start + length]
+            if end > len(data) or CRC.unpack_from(data, start + length)[0] != zlib.crc32(payload):
+                break  # torn by a crash mid-write
+            if kind == NODE_KIND:
+                node_parent, node_time = NODE.unpack_from(data, start)
+                if not 0 <= node_parent < len(parent):
+                    break
+                parent.append(node_parent)
+                times.append(node_time)
+                where.append(LOST if data[start + NODE.size] == FORGOTTEN else pos)
+            elif kind == SAVE_KIND:
+                node, fp = SAVE.unpack_from(data, start)
+                saved = (node, fp) if node < len(parent) else None
+            pos = end
+        if saved is None or saved[1] != mark:
+            return history  # the file has changed since: start over
+        history.parent, history.time, history.where = parent, times, where
+        history.child = array("q", [-1]) * len(parent)
+        for node in range(1, len(parent)):
+            history.child[parent[node]] = node
+        history.current = history.saved = saved[0]
+        history.written = pos
+        history.flushed = len(parent) - 1
+        history.fresh = False
+        if pos > MAX_LOG:
+            history._shrink(data, mark)
+        return history
+
+    def __len__(self):
+        return len(self.parent)
+
+    def reset(self):
+        """Start over from the document as it is now, which is not saved."""
+        self.close()
+        self.__init__(self.log)
+
+    # -------------------- Recording --------------------
+
+    def record(self, offset, removed, inserted, now=None):
+        """Note an edit: `removed` replaced by `inserted` at `offset`."""
+        now = time.time() if now is None else now
+        t = self.typing
+        if (t is not None and t[0] == self.current and now - self.time[t[0]] < COALESCE_S
+                and len(removed) + len(inserted) <= KEY_MAX
+                and len(t[2]) + len(t[3]) + len(removed) + len(inserted) <= COALESCE_MAX):
+            if not removed and not t[2] and offset == t[1] + len(t[3]) and not t[3].endswith(b"\n"):
+                t[3] += inserted  # typing on
+                self.time[t[0]] = now
+                return
+            if not inserted and not t[3]:
+                if offset + len(removed) == t[1]:
+                    t[1], t[2] = offset, removed + t[2]  # backspace
+                    self.time[t[0]] = now
+                    return
+                if offset == t[1]:
+                    t[2] += removed  # delete
+                    self.time[t[0]] = now
+                    return
+        node = self._add(now)
+        if len(removed) + len(inserted) <= KEY_MAX:
+            self.typing = [node, offset, removed, inserted]
+        else:
+            self._keep(node, encode([(offset, removed, inserted)]))
+
+    def record_spans(self, spans, now=None):
+        """Note many replacements made as one edit, such as a Replace All:
+        [(offset, removed, inserted)] sorted, offsets from before it."""
+        if spans:
+            self._keep(self._add(time.time() if now is None else now), encode(spans))
+
+    def checkpoint(self):
+        """End the step being typed; the current node."""
+        t = self.typing
+        if t is not None:
+            self.typing = None
+            self._keep(t[0], encode([tuple(t[1:])]))
+        return self.current
+
+    def _add(self, now):
+        self.checkpoint()
+        node = len(self.parent)
+        self.parent.append(self.current)
+        self.child.append(-1)
+        self.time.append(now)
+        self.where.append(UNWRITTEN)
+        self.child[self.current] = node
+        self.current = node
+        return node
+
+    def _keep(self, node, delta):
+        self.deltas[node] = delta
+        self.memory += len(delta)
+        self._trim()
+
+    def _trim(self):
+        # Over the budget, the oldest deltas go to the log, or are forgotten without one
+        while self.memory > MEMORY and self.deltas:
+            node = next(iter(self.deltas))
+            if self.log is None:
+                self.memory -= len(self.deltas.pop(node))
+                self.where[node] = LOST
+                continue
+            try:
+                self._write_nodes(node)
+            except OSError:
+                self._drop_log()  # a full disk, say: carry on without it
+
+    def _drop_log(self):
+        for node in range(1, len(self.parent)):
+            if self.where[node] >= 0:
+                self.where[node] = LOST
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        self.log = None
+
+    # -------------------- Moving --------------------
+
+    def undo(self, doc):
+        """Take `doc` back to the parent state. The cursor offset after it,
+        or None if there is nothing to undo."""
+        self.checkpoint()
+        node = self.current
+        cursor = self._apply(doc, node, False) if node else None
+        if cursor is not None:
+            self.child[self.parent[node]] = node
+            self.current = self.parent[node]
+        return cursor
+
+    def redo(self, doc):
+        self.checkpoint()
+        node = self.child[self.current]
+        cursor = self._apply(doc, node, True) if node >= 0 else None
+        if cursor is not None:
+            self.current = node
+        return cursor
+
+    def earlier(self, doc):
+        """Go to the state made before the current one, on any branch."""
+        return self.goto(doc, self.current - 1) if self.current else None
+
+    def later(self, doc):
+        return self.goto(doc, self.current + 1) if self.current + 1 < len(self.parent) else None
+
+    def goto(self, doc, target):
+        """Go to state `target` through the nearest state both descend
+        from; stops short if a delta on the way was forgotten."""
+        self.checkpoint()
+        ancestors = set()
+        node = target
+        while node >= 0:
+            ancestors.add(node)
+            node = self.parent[node]
+        cursor = None
+        while self.current not in ancestors:
+            cursor = self.undo(doc)
+            if cursor is None:
+                return None
+        path = []
+        node = target
+        while node != self.current:
+            path.append(node)
+            node = self.parent[node]
+        for node in reversed(path):
+            self.child[self.current] = node
+            step = self.redo(doc)
+            if step is None:
+                break
+            cursor = step
+        return cursor
+
+    def _apply(self, doc, node, forward):
+        """Apply the delta of `node` to `doc`, forward for redo. The cursor
+        offset after it, or None if the delta was forgotten."""
+        spans = self._spans(node)
+        if spans is None:
+            return None
+        edits = []  # (start, bytes there now, bytes to put there)
+        shift = 0
+        for offset, removed, inserted in spans:
+            if forward:
+                edits.append((offset, removed, inserted))
+            else:
+                edits.append((offset + shift, inserted, removed))
+                shift += len(inserted) - len(removed)
+        read = doc.reader()
+        for start, old, _ in edits[::max(1, len(edits) // CHECKS)]:
+            if read(start, start + len(old)) != old:
+                raise HistoryError("The undo history does not match the document")
+        doc.replace_spans([(start, start + len(old), new) for start, old, new in edits])
+        self.applies += 1
+        self.last = edits
+        start, _, new = edits[0]
+        return start + len(new)
+
+    def _spans(self, node):
+        delta = self.deltas.get(node)
+        if delta is None:
+            where = self.where[node]
+            if where < 0:
+                return None
+            delta = self._read(where)[NODE.size:]
+        return decode(delta)
+
+    # -------------------- Log --------------------
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.log), exist_ok=True)
+            self._file = open(self.log, "w+b" if self.fresh else "r+b")
+            if self.fresh:
+                self._file.write(MAGIC)
+                self.written = len(MAGIC)
+                self.fresh = False
+            else:
+                self._file.truncate(self.written)  # a torn record at the end
+        return self._file
+
+    def _read(self, pos):
+        f = self._open()
+        f.seek(pos)
+        kind, length = RECORD.unpack(f.read(RECORD.size))
+        payload = f.read(length)
+        if CRC.unpack(f.read(CRC.size))[0] != zlib.crc32(payload):
+            raise HistoryError(f"{self.log} is damaged")
+        return payload
+
+    def _append(self, kind, payload):
+        f = self._open()
+        f.seek(self.written)
+        f.write(RECORD.pack(kind, len(payload)) + payload + CRC.pack(zlib.crc32(payload)))
+        pos = self.written
+        self.written = f.tell()
+        return pos
+
+    def _write_nodes(self, upto):
+        """Append the nodes not in the log yet, up to `upto`, in order: on
+        loading, a node's number is its place in the log."""
+        if upto <= self.flushed:
+            return
+        for node in range(self.flushed + 1, upto + 1):
+            if self.where[node] != UNWRITTEN:
+                continue
+            delta = self.deltas.pop(node, None)
+            if delta is None:
+                delta = bytes([FORGOTTEN])
+            else:
+                self.memory -= len(delta)
+            self.where[node] = self._append(NODE_KIND, NODE.pack(self.parent[node], self.time[node]) + delta)
+        self.flushed = max(self.flushed, upto)
+        self._file.flush()
+
+    def flush(self):
+        """Write every finished step to the log, freeing their memory."""
+        if self.log is not None and len(self.parent) > 1:
+            self._write_nodes(self.typing[0] - 1 if self.typing else len(self.parent) - 1)
+
+    def saved_at(self, node, mark, log=None):
+        """The file now holds state `node`, with fingerprint `mark`; it is
+        kept in `log` from now on (None for a file that must not be logged)."""
+        self.saved = node
+        if log != self.log:
+            # Saved under another name: the whole history goes to its log
+            for old in range(1, len(self.parent)):
+                if self.where[old] >= 0:
+                    self.deltas[old] = self._read(self.where[old])[NODE.size:]
+                    self.memory += len(self.deltas[old])
+                    self.where[old] = UNWRITTEN
+                elif log is not None:
+                    self.where[old] = UNWRITTEN  # written as forgotten if it was
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.log = log
+            self.fresh = True
+            self.flushed = 0
+            self.deltas = dict(sorted(self.deltas.items()))
+            self._trim()
+        if log is None:
+            return
+        self.flush()
+        self._append(SAVE_KIND, SAVE.pack(node, mark))
+        self._file.flush()
+
+    def close(self):
+        self.checkpoint()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _shrink(self, data, mark):
+        """Rewrite a log over MAX_LOG with only the saved state and as many
+        of the steps leading to it as fit in half of that; the state
+        before them is the new start."""
+        chain = []
+        size = 0
+        node = self.saved
+        while node > 0 and self.where[node] >= 0:
+            size += RECORD.unpack_from(data, self.where[node])[1]
+            if size > MAX_LOG // 2:
+                break
+            chain.append(node)
+            node = self.parent[node]
+        chain.reverse()
+        where = array("q", [LOST])
+        out = [MAGIC]
+        pos = len(MAGIC)
+        for n, node in enumerate(chain):
+            start = self.where[node] + RECORD.size
+            length = RECORD.unpack_from(data, self.where[node])[1]
+            payload = NODE.pack(n, self.time[node]) + data[start + NODE.size:start + length]
+            out.append(RECORD.pack(NODE_KIND, len(payload)) + payload + CRC.pack(zlib.crc32(payload)))
+            where.append(pos)
+            pos += len(out[-1])
+        payload = SAVE.pack(len(chain), mark)
+        out.append(RECORD.pack(SAVE_KIND, len(payload)) + payload + CRC.pack(zlib.crc32(payload)))
+        write_atomic(self.log, b"".join(out))
+        self.parent = array("q", range(-1, len(chain)))
+        self.child = array("q", range(1, len(chain) + 2))
+        self.child[-1] = -1
+        self.time = array("d", [self.time[0]] + [self.time[node] for node in chain])
+        self.where = where
+        self.current = self.saved = len(chain)
+        self.written = pos + len(out[-1])
+        self.flushed = len(chain)
@@ -0,0 +1,292 @@
+import tkinter as tk
+
+from piece_table import PieceTable
+
+# Tk Text widget as a viewport over a PieceTable.
+# Small documents are shown whole. Large ones are shown a window of lines
+# at a time: scrolling near either edge of the window re-renders it around
+# the visible line, and the scrollbar is scaled to the whole document.
+# The window also stops at WINDOW_BYTES, so a file of very long lines (a
+# minified bundle) doesn't put megabytes in the widget; a line longer than
+# that is shown a part at a time, the window starting in it where needed.
+# Every insert/delete reaching the widget (typing, paste, Tk's own undo)
+# is intercepted by renaming the widget command, as idlelib does, and
+# mirrored into the document; listeners get the bytes it removed, so an
+# undo history of their own can take it back.
+# Text is decoded with surrogateescape, as in find_engine, so invalid UTF-8
+# shows as one character per bad byte and byte offsets stay exact around it.
+
+FULL_LOAD_BYTES = 4 * 1024 * 1024  # documents up to this size are shown whole
+WINDOW_LINES = 2000
+WINDOW_BYTES = 1024 * 1024  # and no more bytes than this
+EDGE = 0.1  # re-render when the view is this close to a window edge
+
+
+class TextViewport:
+    def __init__(self, parent, doc=None, window=WINDOW_LINES, **options):
+        self.frame = tk.Frame(parent)
+        self.text = tk.Text(self.frame, **options)
+        self.scroll = tk.Scrollbar(self.frame, command=self._scrollbar)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.text.configure(yscrollcommand=self._on_yscroll)
+        self.window = window
+        self.listeners = []  # called as listener(offset, removed bytes, inserted bytes) after each edit
+        self.scroll_listeners = []  # called with no arguments when the view moves
+        self.top = 0  # document line shown on the widget's first line
+        self.start = 0  # document offset of the widget's first character, in line `top`
+        self._lead = 0  # characters of line `top` before `start`, None until counted
+        self.full = True
+        self.cut = False  # whether the document continues below the window
+        self._rendering = False
+        self._shift_pending = False
+
+        widget = self.text._w
+        self._orig = widget + "_orig"
+        self.text.tk.call("rename", widget, self._orig)
+        self.text.tk.createcommand(widget, self._dispatch)
+        self.text.bind("<Control-Home>", lambda e: self._jump(0))
+        self.text.bind("<Control-End>", lambda e: self._jump(len(self.doc)))
+        self.set_document(doc if doc is not None else PieceTable())
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def destroy(self):
+        """Remove the widget; the document is left as it is."""
+        widget = self.text._w
+        self.frame.destroy()
+        try:
+            self.text.tk.deletecommand(widget)  # not removed with the widget, as it was renamed
+        except tk.TclError:
+            pass
+
+    def _raw(self, *args):
+        return self.text.tk.call(self._orig, *args)
+
+    def _compare(self, a, op, b):
+        return self.text.tk.getboolean(self._raw("compare", a, op, b))
+
+    # -------------------- Document <-> widget --------------------
+
+    def set_document(self, doc, keep=False):
+        """Show `doc`. With `keep` the content is the same as before (e.g.
+        reopened after a save), so the widget, view and undo stack stay."""
+        self.doc = doc
+        if keep and self.full and len(doc) <= FULL_LOAD_BYTES:
+            return
+        insert = self.offset("insert") if keep else 0
+        self.full = len(doc) <= FULL_LOAD_BYTES
+        self.show(insert, render=True)
+        self.text.edit_reset()
+
+    def render(self, top, around=None):
+        """Show the window from line `top`, or from further on if it must
+        hold offset `around` and the lines between are too long."""
+        doc = self.doc
+        top = 0 if self.full else max(0, top)
+        start = doc.line_start(top)
+        if not self.full and around is not None and around - start > WINDOW_BYTES // 2:
+            # Start half a window before `around`: at a line start if one is
+            # near enough, else in the middle of the long line
+            start = around - WINDOW_BYTES // 2
+            following = doc.line_start(doc.line_of(start) + 1)
+            start = following if following <= around else _char_start(doc, start, 1)
+            top = doc.line_of(start)
+        if self.full:
+            end = len(doc)
+        else:
+            end = min(doc.line_start(top + self.window), start + WINDOW_BYTES)
+            if end < len(doc):
+                end = _char_start(doc, end, -1)
+        data = doc.read(start, end)
+        self.cut = end < len(doc)
+        if self.cut and data.endswith(b"\n"):
+            data = data[:-1]  # the newline between the window and the rest
+        self.top = top
+        self.start = start
+        self._lead = 0 if start == doc.line_start(top) else None
+        self._rendering = True
+        try:
+            self._raw("delete", "1.0", "end")
+            self._raw("insert", "1.0", data.decode("utf-8", "surrogateescape").replace("\r\n", "\n"))
+        finally:
+            self._rendering = False
+        if not self.full:
+            self.text.edit_reset()  # undo entries refer to the old window
+
+    @property
+    def chars(self):
+        """Characters held by the widget."""
+        return int(self._raw("count", "-chars", "1.0", "end"))
+
+    @property
+    def lead(self):
+        """Characters of the first line that are before the window."""
+        if self._lead is None:
+            doc = self.doc
+            self._lead = len(doc.read(doc.line_start(self.top), self.start).decode("utf-8", "surrogateescape"))
+        return self._lead
+
+    @property
+    def lines(self):
+        """Document lines currently in the widget."""
+        return int(str(self._raw("index", "end-1c")).split(".")[0])
+
+    def offset(self, index):
+        """Document byte offset of a widget index."""
+        line, col = map(int, str(self._raw("index", index)).split("."))
+        offset = self.start if line == 1 else self.doc.line_start(self.top + line - 1)
+        if col:
+            offset += len(str(self._raw("get", f"{line}.0", f"{line}.{col}")).encode("utf-8", "surrogateescape"))
+        return offset
+
+    def index(self, offset):
+        """Widget index of a document byte offset (which must be in the window)."""
+        line = self.doc.line_of(offset)
+        prefix = self.doc.read(self.start if line == self.top else self.doc.line_start(line), offset)
+        col = len(prefix.decode("utf-8", "surrogateescape").rstrip("\r"))
+        return f"{line - self.top + 1}.{col}"
+
+    def show(self, offset, render=False):
+        """Move the cursor to a document offset, re-rendering if it is outside the window."""
+        if render or not self.full and not self.start <= offset <= self.offset("end-1c"):
+            self.render(self.doc.line_of(offset) - self.window // 2, offset)
+        index = self.index(offset)
+        self._raw("mark", "set", "insert", index)
+        self.text.see(index)
+
+    def replace(self, start, old, new):
+        """Show an edit already made to the document, `old` replaced by `new`
+        at `start`, without rendering the window again. False if it can't
+        be shown in place: outside the window, or bytes that would decode
+        differently next to their neighbours."""
+        doc = self.doc
+        line = doc.line_of(start)
+        last = line + old.count(b"\n")
+        if start < self.start or last >= self.top + self.lines - (1 if self.cut else 0):
+            return False  # not all of `old` is in the widget, or it may reach the window's cut
+        before = doc.read(max(0, start - 3), start)
+        after = doc.read(start + len(new), start + len(new) + 3)
+        if b"\r" in before[-1:] + old + new:
+            return False
+        texts = []
+        for data in (old, new):
+            text = data.decode("utf-8", "surrogateescape")
+            whole = (before + data + after).decode("utf-8", "surrogateescape")
+            if whole != before.decode("utf-8", "surrogateescape") + text + after.decode("utf-8", "surrogateescape"):
+                return False
+            texts.append(text)
+        index = self._raw("index", self.index(start))
+        self._rendering = True
+        try:
+            self._raw("delete", index, f"{index}+{len(texts[0])}c")
+            self._raw("insert", index, texts[1])
+        finally:
+            self._rendering = False
+        return True
+
+    def _jump(self, offset):
+        self.show(offset)
+        return "break"
+
+    # -------------------- Edits --------------------
+
+    def _dispatch(self, operation, *args):
+        try:
+            if not self._rendering:
+                if operation == "insert":
+                    return self._insert(*args)
+                if operation == "delete":
+                    return self._delete(*args)
+                if operation == "replace":
+                    self._delete(args[0], args[1])
+                    return self._insert(args[0], *args[2:])
+            return self._raw(operation, *args)
+        except tk.TclError:
+            return ""
+
+    def _notify(self, offset, removed, inserted):
+        for listener in self.listeners:
+            listener(offset, removed, inserted)
+
+    def _insert(self, index, *args):
+        chars = "".join(args[0::2])
+        if self._compare(index, ">", "end-1c"):
+            index = "end-1c"  # Tk inserts before the final newline
+        index = self._raw("index", index)
+        offset = self.offset(index)
+        result = self._raw("insert", index, *args)
+        data = chars.encode("utf-8", "surrogateescape")
+        self.doc.insert(offset, data)
+        self._notify(offset, b"", data)
+        return result
+
+    def _delete(self, *indices):
+        ranges = []
+        pairs = list(indices) + [None] * (len(indices) % 2)
+        for first, last in zip(pairs[0::2], pairs[1::2]):
+            first = self._raw("index", first)
+            if self._compare(first, ">=", "end-1c"):
+                continue  # the final newline can't be deleted
+            last = self._raw("index", f"{first}+1c" if last is None else last)
+            if self._compare(last, ">", "end-1c"):
+                last = self._raw("index", "end-1c")
+            if self._compare(last, ">", first):
+                ranges.append((self.offset(first), self.offset(last)))
+        result = self._raw("delete", *indices)
+        for start, end in sorted(ranges, reverse=True):
+            removed = self.doc.read(start, end)
+            self.doc.delete(start, end - start)
+            self._notify(start, removed, b"")
+        return result
+
+    # -------------------- Scrolling --------------------
+
+    def _on_yscroll(self, first, last):
+        for listener in self.scroll_listeners:
+            listener()
+        first, last = float(first), float(last)
+        if self.full:
+            self.scroll.set(first, last)
+            return
+        total = max(self.doc.line_count(estimate=True), 1)
+        lines = self.lines
+        self.scroll.set((self.top + first * lines) / total, (self.top + last * lines) / total)
+        near_top = first < EDGE and self.start > 0
+        near_bottom = last > 1 - EDGE and self.cut
+        if (near_top or near_bottom) and not self._shift_pending:
+            self._shift_pending = True
+            self.text.after_idle(self._shift)
+
+    def _shift(self):
+        self._shift_pending = False
+        visible = self.top + int(str(self._raw("index", "@0,0")).split(".")[0]) - 1
+        top = max(0, visible - self.window // 2)
+        around = self.doc.line_start(visible)
+        if top == self.top and (around - self.start <= WINDOW_BYTES // 2 or self.start > around):
+            return
+        insert = self.offset("insert")
+        self.render(top, around)
+        if self.start <= insert <= self.offset("end-1c"):
+            self._raw("mark", "set", "insert", self.index(insert))
+        self._raw("yview", visible - self.top)
+
+    def _scrollbar(self, *args):
+        if self.full or args[0] != "moveto":
+            self.text.yview(*args)
+            return
+        line = int(float(args[1]) * self.doc.line_count(estimate=True))
+        self.render(line - self.window // 2, self.doc.line_start(line))
+        self._raw("yview", line - self.top)
+
+
+def _char_start(doc, offset, step):
+    """`offset` moved by `step` (1 or -1) until it is not inside a UTF-8
+    character or between CR and LF."""
+    for _ in range(4):
+        byte = doc.read(offset, offset + 1)
+        if not (byte and 0x80 <= byte[0] < 0xC0 or byte == b"\n" and doc.read(offset - 1, offset) == b"\r"):
+            break
+        offset += step
+    return offset
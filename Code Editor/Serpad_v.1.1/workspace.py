@@ -0,0 +1,171 @@
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from serpad_io import write_atomic
+
+# Tabs of the Serpad workspace, kept apart from Tk.
+# Every open file is a Tab. Only the tab on screen needs a Text widget;
+# the others keep their document, which for a plain file is a memory map
+# plus whatever was typed, and get a widget again when next shown. When
+# the workspace goes over its memory budget, the tabs looked at least
+# recently give up their widget, and their document too if it has no
+# unsaved edits, as it can then be read back from disk.
+
+PIECE_BYTES = 160  # a piece tuple of four ints
+INDEX_BYTES = 36  # an int in a newline position list
+SWITCHES = 200  # tab switch times kept for the stats
+
+
+def doc_memory(doc):
+    """Bytes a document holds in memory, estimated: its edit buffer, its
+    original buffer if it is held in memory (not memory-mapped, whose
+    pages belong to the OS page cache, nor decrypted from the file as it is
+    read), its piece list and its cached newline positions."""
+    size = len(doc.added) + sys.getsizeof(doc.pieces) + len(doc.pieces) * PIECE_BYTES
+    if isinstance(doc.original, (bytes, bytearray)):
+        size += len(doc.original)
+    size += sum(len(positions) for positions in list(doc.lines.blocks.values())) * INDEX_BYTES
+    return size
+
+
+class Tab:
+    """An open document and what the editor keeps about it."""
+
+    def __init__(self, path=None, doc=None, encrypted=False):
+        self.path = path
+        self.doc = doc  # None while evicted
+        self.encrypted = encrypted
+        self.saved_version = doc.version if doc is not None else 0
+        self.view = None  # TextViewport, while the tab has one
+        self.page = None  # its notebook page
+        self.position = 0  # cursor offset, kept while the tab has no widget
+        self.key = None  # AES key and header for the encrypted file format
+        self.header = None
+        self.enc_origin = None  # (document, path, segments) for reusing encrypted segments on save
+        self.journal = None  # Journal of the document's saves, if it has one
+        self.backed_up = None  # (document, version) of the last auto backup
+        self.history = None  # UndoHistory of the document's edits, once it is read
+        self.id = os.urandom(6).hex()  # names its backups while it has no path
+        self.used = time.monotonic()
+
+    @property
+    def title(self):
+        name = os.path.basename(self.path) if self.path else "Untitled"
+        return f"{name} *" if self.modified else name
+
+    @property
+    def modified(self):
+        return self.doc is not None and self.doc.version != self.saved_version
+
+
+class Workspace:
+    """The open tabs, their memory use and how long switching between them takes."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.tabs = []
+        self.current = None
+        self.switches = deque(maxlen=SWITCHES)  # seconds per tab switch
+
+    def add(self, tab):
+        self.tabs.append(tab)
+        return tab
+
+    def remove(self, tab):
+        self.tabs.remove(tab)
+        if self.current is tab:
+            self.current = None
+
+    def find(self, path):
+        for tab in self.tabs:
+            if tab.path is not None and os.path.abspath(tab.path) == os.path.abspath(path):
+                return tab
+        return None
+
+    def select(self, tab):
+        self.current = tab
+        tab.used = time.monotonic()
+
+    def memory(self, tab):
+        """Estimated bytes held by a tab: its document and the text in its widget."""
+        size = 0 if tab.doc is None else doc_memory(tab.doc)
+        if tab.view is not None:
+            size += tab.view.chars
+        return size
+
+    def total(self):
+        return sum(self.memory(tab) for tab in self.tabs)
+
+    def over_budget(self):
+        """Background tabs to evict, least recently used first, for as long
+        as the workspace is over its budget."""
+        total = self.total()
+        for tab in sorted(self.tabs, key=lambda t: t.used):
+            if total <= self.budget:
+                break
+            if tab is self.current or (tab.view is None and tab.doc is None):
+                continue
+            before = self.memory(tab)
+            yield tab
+            total -= before - self.memory(tab)
+
+    def record_switch(self, seconds):
+        self.switches.append(seconds)
+
+    def stats(self):
+        import statistics  # pulls in decimal and fractions; only the stats view needs it
+        times = sorted(self.switches)
+        return {
+            "tabs": len(self.tabs),
+            "loaded": sum(tab.doc is not None for tab in self.tabs),
+            "widgets": sum(tab.view is not None for tab in self.tabs),
+            "memory": self.total(),
+            "per_tab": [(tab.title, self.memory(tab)) for tab in self.tabs],
+            "switch_last": self.switches[-1] if self.switches else None,
+            "switch_median": statistics.median(times) if times else None,
+            "switch_p95": times[int(len(times) * 0.95)] if times else None,
+        }
+
+
+class RecentFiles:
+    """Most recently opened paths, newest first, saved in a JSON file that
+    is read when the list is first used, not at startup."""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._paths = None
+
+    @property
+    def paths(self):
+        if self._paths is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._paths = [p for p in json.load(f) if isinstance(p, str)][:self.size]
+            except (OSError, ValueError):
+                self._paths = []
+        return self._paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def add(self, path):
+        if path in self.paths:
+            self.paths.remove(path)
+        self.paths.insert(0, path)
+        del self.paths[self.size:]
+        self._save()
+
+    def remove(self, path):
+        if path in self.paths:
+            self.paths.remove(path)
+            self._save()
+
+    def _save(self):
+        try:
+            write_atomic(self.path, json.dumps(self.paths, indent=1), "utf-8")
+        except OSError as e:
+            print(f"Saving the recent files list failed: {e}")
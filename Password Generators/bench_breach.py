@@ -0,0 +1,51 @@
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from passgen_breach import BreachIndex, build_index
+
+# Benchmark: build time, index size, lookup latency, false positive rate and
+# resident memory of the breach index.
+# Run: python bench_breach.py [entries]
+
+LOOKUPS = 100000
+
+
+def rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(count=1000000):
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        wordlist = os.path.join(tmp, "words.txt")
+        index_path = os.path.join(tmp, "words.bloom")
+        with open(wordlist, "w") as f:
+            for i in range(count):
+                f.write(f"pw{i:09d}\n")
+
+        start = time.perf_counter()
+        build_index(wordlist, index_path, count=count)
+        print(f"build            {time.perf_counter() - start:10.2f} s for {count:,} entries")
+        print(f"index size       {os.path.getsize(index_path) / 1e6:10.2f} MB")
+
+        hits = [f"pw{rng.randrange(count):09d}" for _ in range(LOOKUPS)]
+        misses = [f"nx{rng.randrange(10 ** 9):09d}" for _ in range(LOOKUPS)]
+        before = rss_mb()
+        index = BreachIndex(index_path)
+        for label, words in (("lookup (hit)", hits), ("lookup (miss)", misses)):
+            start = time.perf_counter()
+            found = sum(word in index for word in words)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<17}{elapsed / LOOKUPS * 1e6:10.2f} us   found {found:,}/{LOOKUPS:,}")
+        print(f"false positives  {sum(w in index for w in misses) / LOOKUPS:10.4%}")
+        print(f"RSS growth       {rss_mb() - before:10.2f} MB")
+        index.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
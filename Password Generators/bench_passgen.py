@@ -0,0 +1,44 @@
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+from passgen_bulk import generate_stream
+
+# Benchmark: passwords per minute, old random.choice loop vs the bulk
+# generator with and without a process pool.
+# Run: python bench_passgen.py [count]
+
+LENGTH = 16
+CHARACTERS = string.ascii_letters + string.digits + string.punctuation
+
+
+def bench_random_choice(count):
+    start = time.perf_counter()
+    for _ in range(count):
+        ''.join(random.choice(CHARACTERS) for _ in range(LENGTH))
+    return count / (time.perf_counter() - start)
+
+
+def bench_bulk(count, workers, path):
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        for chunk in generate_stream(count, LENGTH, workers=workers):
+            f.write(chunk)
+    return count / (time.perf_counter() - start)
+
+
+def main(count=2000000):
+    workers = [0, 2, os.cpu_count() or 1]
+    print(f"{'random.choice':<22}{bench_random_choice(count // 20) * 60:>16,.0f} passwords/min")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "passwords.txt")
+        for n in sorted(set(workers)):
+            rate = bench_bulk(count, n, path)
+            print(f"{f'bulk, workers={n}':<22}{rate * 60:>16,.0f} passwords/min")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000)
@@ -0,0 +1,61 @@
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+# Benchmark: cold start of the password generator.
+# Run: python bench_startup.py [runs]
+# passgen.py builds its window as it is imported, so this imports what it
+# imports, in a fresh interpreter under -X importtime, and reports the
+# median time on top of a bare interpreter and the slowest modules. The
+# network check and the optional NumPy scoring must not be imported at
+# startup at all. Exits with status 1 if they are, or if startup takes
+# longer than the budget.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = "passgen.py"
+BUDGET_MS = 60
+LAZY = ("requests", "numpy", "concurrent", "argparse")
+SHOWN = 5
+
+
+def script_imports(path):
+    """The import statements at the top level of a script, as source."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_times(code):
+    """[(module, cumulative µs, depth)] for one run of `code`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE,
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(total), (len(name) - len(name.lstrip()) - 1) // 2))
+    return times
+
+
+def main(runs=7):
+    code = script_imports(os.path.join(HERE, SCRIPT))
+    base = {name for name, _, _ in import_times("pass")}
+    totals = []
+    for _ in range(runs):
+        times = [entry for entry in import_times(code) if entry[0] not in base]
+        totals.append(sum(total for _, total, depth in times if depth == 0))
+    ms = statistics.median(totals) / 1e3
+    lazy = sorted({name.split(".")[0] for name, _, _ in times} & set(LAZY))
+    print(f"{SCRIPT:<20}{ms:7.1f} ms   budget {BUDGET_MS} ms   {'OVER' if ms > BUDGET_MS else 'ok'}")
+    for name, total, _ in sorted((t for t in times if t[2] == 0), key=lambda t: -t[1])[:SHOWN]:
+        print(f"    {name:<24}{total / 1e3:7.1f} ms")
+    if lazy:
+        print(f"    imported at startup: {', '.join(lazy)}")
+    sys.exit(1 if ms > BUDGET_MS or lazy else 0)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
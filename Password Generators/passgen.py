@@ -1,8 +1,10 @@
 import tkinter as tk
 from tkinter import messagebox
-import string
-import random
-import requests
+import threading
+import passgen_bulk
+import passgen_strength
+import passgen_breach
+import passgen_policy
 
 # ------------------------ VERSION ------------------------
 CURRENT_VERSION = "1.0"
@@ -14,8 +16,15 @@ def generate_password():
         if length < 6:
             raise ValueError("Password must be at least 6 characters.")
 
-        characters = string.ascii_letters + string.digits + string.punctuation
-        password = ''.join(random.choice(characters) for _ in range(length))
+        if require_var.get() or ambiguous_var.get():
+            policy = passgen_policy.Policy(
+                length,
+                require=tuple(passgen_policy.CLASSES) if require_var.get() else (),
+                exclude_ambiguous=ambiguous_var.get())
+            password = policy.generate()
+        else:
+            # Cryptographically secure (os.urandom) and free of modulo bias
+            password = passgen_bulk.generate_password(length)
         password_var.set(password)
         update_strength(password)
 
@@ -24,45 +33,65 @@ def generate_password():
         password_var.set("")
         strength_var.set("")
 
+BAND_COLORS = {"Weak": "red", "Moderate": "orange", "Strong": "green"}
+
+# Optional breached-password index (see passgen_breach.py build),
+# opened when the first password is scored rather than at startup
+breach_index = None
+breach_checked = False
+
 def update_strength(password):
-    score = 0
-    if len(password) >= 8: score += 1
-    if any(c.islower() for c in password): score += 1
-    if any(c.isupper() for c in password): score += 1
-    if any(c.isdigit() for c in password): score += 1
-    if any(c in string.punctuation for c in password): score += 1
-
-    if score <= 2:
-        strength_var.set("Weak")
+    global breach_index, breach_checked
+    if not breach_checked:
+        breach_index = passgen_breach.open_default()
+        breach_checked = True
+    if breach_index is not None and password in breach_index:
+        strength_var.set("Weak (found in breach list)")
         strength_label.config(fg="red")
-    elif score in [3, 4]:
-        strength_var.set("Moderate")
-        strength_label.config(fg="orange")
-    else:
-        strength_var.set("Strong")
-        strength_label.config(fg="green")
+        return
+    band = passgen_strength.score_password(password).band
+    strength_var.set(band)
+    strength_label.config(fg=BAND_COLORS[band])
 
 
-def check_for_update():
+def fetch_latest_version(result):
+    # Runs on a worker thread: importing requests and waiting on the network
+    # would otherwise hold up the window
     try:
+        import requests
         response = requests.get(VERSION_URL, timeout=5)
         if response.status_code == 200:
-            latest_version = response.text.strip()
-            if latest_version != CURRENT_VERSION:
-                update = messagebox.askyesno(
-                    "Update Available",
-                    f"A new version ({latest_version}) is available. Do you want to update?"
-                )
-                if update:
-                    import webbrowser
-                    webbrowser.open("https://github.com/YourUsername/YourRepo/releases")  # Change this
-    except:
+            result.append(response.text.strip())
+    except Exception:
         pass  # Fail silently if offline or URL not available
+    finally:
+        result.append(None)
+
+
+def check_for_update():
+    result = []
+    threading.Thread(target=fetch_latest_version, args=(result,), daemon=True).start()
+    root.after(200, show_update, result)
+
+
+def show_update(result):
+    if not result:
+        root.after(200, show_update, result)  # Tk calls must stay on this thread, so poll
+        return
+    latest_version = result[0]
+    if latest_version is not None and latest_version != CURRENT_VERSION:
+        update = messagebox.askyesno(
+            "Update Available",
+            f"A new version ({latest_version}) is available. Do you want to update?"
+        )
+        if update:
+            import webbrowser
+            webbrowser.open("https://github.com/YourUsername/YourRepo/releases")  # Change this
 
 
 root = tk.Tk()
 root.title(f"Password Generator v{CURRENT_VERSION}")
-root.geometry("400x300")
+root.geometry("400x360")
 root.resizable(False, False)
 root.configure(bg="#1e1e1e")
 
@@ -70,6 +99,8 @@ root.configure(bg="#1e1e1e")
 password_var = tk.StringVar()
 length_var = tk.StringVar(value="12")
 strength_var = tk.StringVar(value="")
+require_var = tk.BooleanVar(value=False)
+ambiguous_var = tk.BooleanVar(value=False)
 
 
 tk.Label(root, text="Smart Password Generator", font=("Arial", 16, "bold"), bg="#1e1e1e", fg="white").pack(pady=10)
@@ -77,6 +108,11 @@ tk.Label(root, text="Smart Password Generator", font=("Arial", 16, "bold"), bg="
 tk.Label(root, text="Password Length (min 6):", font=("Arial", 12), bg="#1e1e1e", fg="white").pack()
 tk.Entry(root, textvariable=length_var, font=("Arial", 12), justify="center", width=5).pack(pady=5)
 
+tk.Checkbutton(root, text="Use every character type", variable=require_var, font=("Arial", 10),
+               bg="#1e1e1e", fg="white", selectcolor="#1e1e1e", activebackground="#1e1e1e").pack()
+tk.Checkbutton(root, text="Avoid ambiguous characters (Il1O0o...)", variable=ambiguous_var, font=("Arial", 10),
+               bg="#1e1e1e", fg="white", selectcolor="#1e1e1e", activebackground="#1e1e1e").pack()
+
 tk.Button(root, text="Generate Password", font=("Arial", 12), bg="#4caf50", fg="white", command=generate_password).pack(pady=10)
 
 tk.Entry(root, textvariable=password_var, font=("Courier", 14), justify="center", width=30, bd=2, relief="sunken", state="readonly").pack(pady=10)
@@ -0,0 +1,137 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+
+# Breached / common password check backed by a memory-mapped Bloom filter.
+# The word list is compiled once into an index file; lookups then hash the
+# password and test k bits straight from the mapped file, so a list of
+# hundreds of millions of entries costs microseconds per check and almost
+# no resident memory.
+#   python passgen_breach.py build rockyou.txt breach.bloom --fp 0.001
+#   python passgen_breach.py check breach.bloom "Password123!"
+#
+# File layout: MAGIC, then m (bits), k (hashes), n (entries) as
+# little-endian uint64, then the m-bit array.
+
+MAGIC = b"PGBLOOM1"
+HEADER = struct.Struct("<8sQQQ")
+DEFAULT_INDEX = os.environ.get(
+    "PASSGEN_BREACH_INDEX", os.path.join(os.path.expanduser("~"), ".passgen_breach.bloom"))
+DEFAULT_FP_RATE = 0.001
+
+
+def _hashes(password):
+    # Two 64-bit hashes; bit i is (h1 + i*h2) mod m (Kirsch-Mitzenmacher)
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    digest = hashlib.blake2b(password, digest_size=16).digest()
+    return struct.unpack("<QQ", digest)
+
+
+def filter_size(count, fp_rate=DEFAULT_FP_RATE):
+    """(m bits, k hashes) for `count` entries at the given false positive rate."""
+    count = max(count, 1)
+    bits = math.ceil(-count * math.log(fp_rate) / math.log(2) ** 2)
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / count * math.log(2)))
+    return bits, hashes
+
+
+class BreachIndex:
+    """Read-only, memory-mapped Bloom filter of breached passwords."""
+
+    def __init__(self, path=DEFAULT_INDEX):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits, self.hashes, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or len(self.map) < HEADER.size + self.bits // 8:
+            self.map.close()
+            raise ValueError(f"{path} is not a breach index")
+
+    def __contains__(self, password):
+        h1, h2 = _hashes(password)
+        m = self.bits
+        data = self.map
+        base = HEADER.size
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % m
+            if not data[base + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def close(self):
+        self.map.close()
+
+
+def open_default():
+    """The default index if one has been built, else None."""
+    try:
+        return BreachIndex(DEFAULT_INDEX)
+    except (OSError, ValueError):
+        return None
+
+
+def _words(path):
+    with open(path, "rb") as f:
+        for line in f:
+            word = line.rstrip(b"\r\n")
+            if word:
+                yield word
+
+
+def build_index(wordlist, path, fp_rate=DEFAULT_FP_RATE, count=None):
+    """Compile a word list (one password per line) into an index file.
+
+    The bit array is written through a memory map of the output file, so
+    building needs no more RAM than the OS chooses to cache.
+    """
+    if count is None:
+        count = sum(1 for _ in _words(wordlist))
+    bits, hashes = filter_size(count, fp_rate)
+    size = HEADER.size + bits // 8
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.truncate(size)
+    with open(tmp_path, "r+b") as f, mmap.mmap(f.fileno(), size) as data:
+        data[:HEADER.size] = HEADER.pack(MAGIC, bits, hashes, count)
+        base = HEADER.size
+        for word in _words(wordlist):
+            h1, h2 = _hashes(word)
+            for i in range(hashes):
+                bit = (h1 + i * h2) % bits
+                data[base + (bit >> 3)] |= 1 << (bit & 7)
+        data.flush()
+    os.replace(tmp_path, path)
+    return count
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or query a breached-password index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="compile a word list into an index")
+    build.add_argument("wordlist")
+    build.add_argument("index", nargs="?", default=DEFAULT_INDEX)
+    build.add_argument("--fp", type=float, default=DEFAULT_FP_RATE, help="false positive rate")
+    build.add_argument("--count", type=int, help="entries in the list (skips the counting pass)")
+    check = sub.add_parser("check", help="check passwords (arguments or stdin) against an index")
+    check.add_argument("index")
+    check.add_argument("passwords", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_index(args.wordlist, args.index, args.fp, args.count)
+        print(f"Indexed {count} passwords into {args.index}")
+        return
+    index = BreachIndex(args.index)
+    passwords = args.passwords or (line.rstrip("\r\n") for line in sys.stdin)
+    for password in passwords:
+        print(f"{'breached' if password in index else 'ok'}\t{password}")
+
+
+if __name__ == "__main__":
+    main()
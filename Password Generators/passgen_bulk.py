@@ -0,0 +1,113 @@
+import os
+import string
+import sys
+from collections import deque
+from functools import lru_cache
+
+# Headless bulk password generator.
+# Random bytes come from os.urandom in large blocks. Each byte maps to an
+# alphabet character through one bytes.translate() call; bytes at or above
+# the largest multiple of the alphabet size are deleted instead of mapped
+# (rejection sampling), so every character is equally likely.
+#   python passgen_bulk.py 1000000 --length 16 -o passwords.txt --workers 4
+
+DEFAULT_ALPHABET = string.ascii_letters + string.digits + string.punctuation
+DEFAULT_LENGTH = 12
+MIN_LENGTH = 6
+CHUNK_SIZE = 10000  # passwords per chunk
+
+
+@lru_cache(maxsize=32)
+def translation(alphabet):
+    """(table, rejected bytes) mapping random bytes uniformly onto alphabet."""
+    chars = alphabet.encode("ascii")
+    size = len(chars)
+    if not 1 < size <= 256 or len(set(chars)) != size:
+        raise ValueError("Alphabet must hold 2 to 256 distinct ASCII characters.")
+    limit = 256 - 256 % size
+    table = bytes(chars[b % size] for b in range(limit)) + bytes(256 - limit)
+    return table, bytes(range(limit, 256))
+
+
+def random_chars(count, alphabet=DEFAULT_ALPHABET):
+    """`count` uniformly random characters from alphabet, as bytes."""
+    table, rejected = translation(alphabet)
+    # Expected share of bytes kept, plus some slack to avoid a second round
+    keep = (256 - len(rejected)) / 256
+    out = b""
+    while len(out) < count:
+        need = count - len(out)
+        out += os.urandom(int(need / keep * 1.05) + 16).translate(table, rejected)
+    return out[:count]
+
+
+def generate_password(length=DEFAULT_LENGTH, alphabet=DEFAULT_ALPHABET):
+    if length < MIN_LENGTH:
+        raise ValueError(f"Password must be at least {MIN_LENGTH} characters.")
+    return random_chars(length, alphabet).decode("ascii")
+
+
+def generate_chunk(count, length=DEFAULT_LENGTH, alphabet=DEFAULT_ALPHABET):
+    """`count` passwords, one per line, as a single bytes block."""
+    raw = random_chars(count * length, alphabet)
+    lines = [raw[i:i + length] for i in range(0, len(raw), length)]
+    return b"\n".join(lines) + b"\n"
+
+
+def _chunk_sizes(total, chunk_size):
+    while total > 0:
+        yield min(chunk_size, total)
+        total -= chunk_size
+
+
+def generate_stream(total, length=DEFAULT_LENGTH, alphabet=DEFAULT_ALPHABET, workers=0,
+                    chunk_size=CHUNK_SIZE):
+    """Yield chunks (bytes, one password per line) until `total` are made.
+
+    With workers > 0 chunks come from a process pool, at most two per
+    worker in flight, so memory stays flat for any total.
+    """
+    if length < MIN_LENGTH:
+        raise ValueError(f"Password must be at least {MIN_LENGTH} characters.")
+    translation(alphabet)  # validate before starting any workers
+    if not workers:
+        for count in _chunk_sizes(total, chunk_size):
+            yield generate_chunk(count, length, alphabet)
+        return
+    from concurrent.futures import ProcessPoolExecutor  # slow to import; only bulk runs need it
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for count in _chunk_sizes(total, chunk_size):
+            pending.append(pool.submit(generate_chunk, count, length, alphabet))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate passwords in bulk.")
+    parser.add_argument("count", type=int, help="number of passwords")
+    parser.add_argument("-l", "--length", type=int, default=DEFAULT_LENGTH)
+    parser.add_argument("-a", "--alphabet", default=DEFAULT_ALPHABET)
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: none)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="passwords per chunk")
+    args = parser.parse_args(argv)
+
+    dst = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in generate_stream(args.count, args.length, args.alphabet, args.workers, args.chunk):
+            dst.write(chunk)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if dst is not sys.stdout.buffer:
+            dst.close()
+        else:
+            dst.flush()
+
+
+if __name__ == "__main__":
+    main()
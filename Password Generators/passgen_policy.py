@@ -0,0 +1,167 @@
+import secrets
+import string
+
+# Policy-driven password and passphrase generation.
+# A Policy is compiled once into per-class alphabets and a placement plan:
+# one position per required class is picked with a partial shuffle, the
+# rest draw from the combined alphabet, and a character that would break
+# the repeat limit is skipped over in the draw instead of redrawn. Every
+# password therefore costs the same fixed work, however strict the policy.
+#   python passgen_policy.py -l 10 --require lower,upper,digits,symbols --no-ambiguous --max-repeat 1
+#   python passgen_policy.py --wordlist eff_large_wordlist.txt --words 6
+
+CLASSES = {
+    "lower": string.ascii_lowercase,
+    "upper": string.ascii_uppercase,
+    "digits": string.digits,
+    "symbols": string.punctuation,
+}
+AMBIGUOUS = "Il1O0o|`'\""
+MIN_LENGTH = 6
+
+
+class Policy:
+    """Compiled password policy."""
+
+    def __init__(self, length=12, classes=tuple(CLASSES), require=(), exclude="",
+                 exclude_ambiguous=False, max_repeat=None, symbols=None):
+        if length < MIN_LENGTH:
+            raise ValueError(f"Password must be at least {MIN_LENGTH} characters.")
+        excluded = set(exclude) | (set(AMBIGUOUS) if exclude_ambiguous else set())
+        alphabets = {}
+        for name in classes:
+            if name not in CLASSES:
+                raise ValueError(f"Unknown character class {name!r}.")
+            chars = symbols if name == "symbols" and symbols is not None else CLASSES[name]
+            chars = "".join(c for c in chars if c not in excluded)
+            if not chars:
+                raise ValueError(f"No {name} characters left after exclusions.")
+            alphabets[name] = chars
+        for name in require:
+            if name not in alphabets:
+                raise ValueError(f"Required class {name!r} is not enabled.")
+        if len(require) > length:
+            raise ValueError("More required classes than characters.")
+        if max_repeat is not None:
+            if max_repeat < 1:
+                raise ValueError("max_repeat must be at least 1.")
+            for name, chars in alphabets.items():
+                if len(chars) < 2:
+                    raise ValueError(f"max_repeat needs at least 2 {name} characters.")
+
+        self.length = length
+        self.max_repeat = max_repeat
+        self.alphabet = "".join(alphabets.values())
+        # Placement plan: the alphabet each required slot draws from
+        self.required = [alphabets[name] for name in require]
+        # Position of each character in each alphabet, for skip-over draws
+        self.positions = {chars: {c: i for i, c in enumerate(chars)}
+                          for chars in [self.alphabet, *self.required]}
+
+    def generate(self):
+        length = self.length
+        slots = [self.alphabet] * length
+        # Partial Fisher-Yates: a distinct random position per required class
+        order = list(range(length))
+        for i, chars in enumerate(self.required):
+            j = i + secrets.randbelow(length - i)
+            order[i], order[j] = order[j], order[i]
+            slots[order[i]] = chars
+
+        out = []
+        run = 0
+        for chars in slots:
+            if self.max_repeat is not None and run >= self.max_repeat:
+                # The previous character is used up: draw from the others
+                pos = self.positions[chars].get(out[-1])
+                if pos is not None:
+                    i = secrets.randbelow(len(chars) - 1)
+                    out.append(chars[i + (i >= pos)])
+                    run = 1
+                    continue
+            c = chars[secrets.randbelow(len(chars))]
+            run = run + 1 if out and out[-1] == c else 1
+            out.append(c)
+        return "".join(out)
+
+    def generate_many(self, count):
+        return [self.generate() for _ in range(count)]
+
+    def check(self, password):
+        """Whether a password satisfies the policy (for naive generators)."""
+        if len(password) != self.length:
+            return False
+        if any(c not in self.positions[self.alphabet] for c in password):
+            return False
+        # Required classes must be satisfiable as distinct positions; with
+        # disjoint classes (the built-in ones) "present" is enough
+        if any(not any(c in chars for c in password) for chars in self.required):
+            return False
+        if self.max_repeat is not None:
+            run = 0
+            for i, c in enumerate(password):
+                run = run + 1 if i and password[i - 1] == c else 1
+                if run > self.max_repeat:
+                    return False
+        return True
+
+
+# -------------------- Passphrases --------------------
+
+def load_wordlist(path):
+    """Words from a file, one per line. Diceware files ("11111\tword") work too."""
+    words = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                words.append(parts[-1])
+    if len(words) < 2:
+        raise ValueError("Word list needs at least 2 words.")
+    return words
+
+
+def generate_passphrase(words, count=6, separator="-", capitalize=False, digit=False):
+    """Diceware-style passphrase: `count` words picked uniformly from `words`."""
+    picked = [words[secrets.randbelow(len(words))] for _ in range(count)]
+    if capitalize:
+        picked = [w.capitalize() for w in picked]
+    if digit:
+        i = secrets.randbelow(count)
+        picked[i] += string.digits[secrets.randbelow(10)]
+    return separator.join(picked)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate passwords or passphrases from a policy.")
+    parser.add_argument("-n", "--count", type=int, default=1)
+    parser.add_argument("-l", "--length", type=int, default=12)
+    parser.add_argument("--classes", default=",".join(CLASSES), help="enabled classes")
+    parser.add_argument("--require", default="", help="classes that must appear")
+    parser.add_argument("--symbols", help="symbol set to use instead of all punctuation")
+    parser.add_argument("--exclude", default="", help="characters never to use")
+    parser.add_argument("--no-ambiguous", action="store_true", help=f"exclude {AMBIGUOUS}")
+    parser.add_argument("--max-repeat", type=int, help="max identical characters in a row")
+    parser.add_argument("--wordlist", help="generate passphrases from this word list")
+    parser.add_argument("--words", type=int, default=6, help="words per passphrase")
+    parser.add_argument("--separator", default="-")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.wordlist:
+            words = load_wordlist(args.wordlist)
+            for _ in range(args.count):
+                print(generate_passphrase(words, args.words, args.separator))
+            return
+        policy = Policy(args.length, [c for c in args.classes.split(",") if c],
+                        [c for c in args.require.split(",") if c], args.exclude,
+                        args.no_ambiguous, args.max_repeat, args.symbols)
+    except ValueError as e:
+        parser.error(str(e))
+    for _ in range(args.count):
+        print(policy.generate())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import math
+import string
+import sys
+from collections import Counter, deque, namedtuple
+
+# Headless password strength scoring for large password lists.
+# Every byte is classified through one 256-entry table (bytes.translate, or
+# a NumPy lookup over a whole block of passwords at once). Each class is a
+# bit, so the classes in a password are the OR of its bytes.
+#   python passgen_strength.py dump.txt --workers 4 --summary
+
+LOWER, UPPER, DIGIT, PUNCT, OTHER = 1, 2, 4, 8, 16
+CLASS_SIZES = {LOWER: 26, UPPER: 26, DIGIT: 10, PUNCT: 32, OTHER: 64}  # OTHER: spaces, non-ASCII
+MIN_LENGTH = 8
+BLOCK_SIZE = 1024 * 1024
+
+Strength = namedtuple("Strength", "length classes score entropy band")
+_np = False  # numpy once looked for, None if it isn't installed
+
+
+def _class_of(byte):
+    c = chr(byte)
+    if byte >= 128:
+        return OTHER
+    if c in string.ascii_lowercase:
+        return LOWER
+    if c in string.ascii_uppercase:
+        return UPPER
+    if c in string.digits:
+        return DIGIT
+    if c in string.punctuation:
+        return PUNCT
+    return OTHER
+
+
+CLASS_TABLE = bytes(_class_of(b) for b in range(256))
+CONTINUATION = bytes(range(0x80, 0xC0))  # UTF-8 continuation bytes
+
+# Per class mask: number of classes, and entropy bits per character
+CLASS_COUNT = [bin(mask).count("1") for mask in range(32)]
+BITS_PER_CHAR = [
+    math.log2(sum(size for bit, size in CLASS_SIZES.items() if mask & bit)) if mask else 0.0
+    for mask in range(32)
+]
+
+
+def band(score):
+    if score <= 2:
+        return "Weak"
+    if score <= 4:
+        return "Moderate"
+    return "Strong"
+
+
+def _strength(length, mask):
+    # Same 5 points as the GUI meter: length >= 8, lower, upper, digit, punctuation
+    score = (length >= MIN_LENGTH) + CLASS_COUNT[mask & ~OTHER]
+    return Strength(length, mask, score, round(length * BITS_PER_CHAR[mask], 1), band(score))
+
+
+def score_password(password):
+    """Strength of one password (str or UTF-8 bytes)."""
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    mask = sum(set(password.translate(CLASS_TABLE)))  # distinct bits, so sum == OR
+    return _strength(len(password.translate(None, CONTINUATION)), mask)
+
+
+def score_many(passwords):
+    """Strengths for an iterable of passwords, in order."""
+    return [score_password(p) for p in passwords]
+
+
+def _numpy():
+    # Imported on first use: the GUI scores one password at a time and
+    # starts faster without it
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def score_block(block, use_numpy=None):
+    """Strengths for a block of newline-separated passwords (bytes).
+
+    With NumPy the whole block is classified in a few vectorized passes.
+    """
+    np = None if use_numpy is False else _numpy()
+    if use_numpy is None:
+        use_numpy = np is not None
+    if not block:
+        return []
+    if not use_numpy:
+        lines = block.split(b"\n")
+        if not lines[-1]:
+            lines.pop()
+        return score_many(line.rstrip(b"\r") for line in lines)
+    buf = np.frombuffer(block, dtype=np.uint8)
+    if block[-1:] != b"\n":
+        buf = np.append(buf, np.uint8(10))
+    # Newlines (and CRs) count as nothing, so empty lines need no special case
+    breaks = (buf == 10) | (buf == 13)
+    ends = np.flatnonzero(buf == 10)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    classes = np.frombuffer(CLASS_TABLE, dtype=np.uint8)[buf]
+    classes[breaks] = 0
+    is_char = ((buf & 0xC0) != 0x80) & ~breaks
+    masks = np.bitwise_or.reduceat(classes, starts)
+    chars = np.add.reduceat(is_char.astype(np.int64), starts)
+    return [_strength(int(n), int(m)) for n, m in zip(chars, masks)]
+
+
+def read_blocks(f, size=BLOCK_SIZE):
+    """Yield blocks of whole lines from a binary file, about `size` bytes each."""
+    rest = b""
+    while True:
+        data = f.read(size)
+        if not data:
+            if rest:
+                yield rest
+            return
+        data = rest + data
+        cut = data.rfind(b"\n") + 1
+        if cut:
+            yield data[:cut]
+            rest = data[cut:]
+        else:
+            rest = data
+
+
+def score_file(f, workers=0):
+    """Yield strengths for every line of a binary file, in order.
+
+    Memory stays at a few blocks; with workers > 0 blocks are scored in a
+    process pool, at most two per worker in flight.
+    """
+    if not workers:
+        for block in read_blocks(f):
+            yield from score_block(block)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for block in read_blocks(f):
+            pending.append(pool.submit(score_block, block))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Score password strength for a list of passwords.")
+    parser.add_argument("input", nargs="?", default="-", help="one password per line (default: stdin)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: none)")
+    parser.add_argument("--summary", action="store_true", help="only print counts per band")
+    args = parser.parse_args(argv)
+
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    out = sys.stdout
+    bands = Counter()
+    try:
+        if not args.summary:
+            out.write("length\tscore\tentropy\tband\n")
+        for s in score_file(src, args.workers):
+            bands[s.band] += 1
+            if not args.summary:
+                out.write(f"{s.length}\t{s.score}\t{s.entropy}\t{s.band}\n")
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+    if args.summary:
+        for name in ("Weak", "Moderate", "Strong"):
+            out.write(f"{name}\t{bands[name]}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmark and regression suite for every tool in the repository.
+# Run: python bench_suite.py [--sizes 4K,1M,64M,1G] [--cases serpad] [-o out.json] [--compare old.json]
+# Every case runs in a fresh interpreter started in its tool's folder, with
+# HOME pointed at a temporary directory so history files, breach indexes
+# and backups stay out of the real one. A case takes a synthetic input of
+# each size (files, expression lists, password lists) and reports seconds
+# plus case-specific figures; the suite adds the peak RSS of its process
+# (pages of memory-mapped files count once they are read).
+# The Tk scripts are run up to their mainloop and their functions called
+# directly: on a display if there is one (an Xvfb server is started when
+# one is installed), otherwise on a Tcl interpreter with stand-in widgets,
+# which is enough for everything but Serpad's Text viewport.
+# Results are written as JSON. Given an older result file, any case that
+# got slower or bigger than the tolerances below is reported and the exit
+# status is 1.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FOLDERS = {
+    "calc": "Calculators",
+    "passgen": "Password Generators",
+    "serpad": os.path.join("Code Editor", "Serpad_v.1.1"),
+}
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+DEFAULT_SIZES = "4K,1M,64M"
+RESULTS_DIR = os.path.join(ROOT, "bench_results")
+TIME_TOLERANCE = 0.25  # slower than the baseline by more than this is a regression
+MEMORY_TOLERANCE = 0.20
+TIME_FLOOR = 0.005  # seconds; differences below this are noise
+MEMORY_FLOOR = 8  # MB
+REPEAT = 5  # runs per timing below LARGE, at least; the median is kept
+MIN_TIME = 0.5  # seconds to keep repeating a fast timing for
+LARGE = 64 * 1024 ** 2
+DIALOGS = ("showinfo", "showwarning", "showerror", "askyesno", "askokcancel", "askyesnocancel", "askretrycancel")
+WIDGETS = ("Label", "Entry", "Button", "Checkbutton", "OptionMenu", "Frame", "Scrollbar", "Text", "Menu")
+
+CASES = {}  # name -> (function, largest size or None for cases without one)
+
+
+def case(name, max_size=None):
+    def register(fn):
+        CASES[name] = (fn, max_size)
+        return fn
+    return register
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1:] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit in "GMK":
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return str(size)
+
+
+def timed(fn, size=0, repeat=REPEAT):
+    """Median seconds of fn(), repeated for at least MIN_TIME; large inputs
+    are timed once."""
+    times = []
+    while not times or (size < LARGE and (len(times) < repeat or sum(times) < MIN_TIME)):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def has_display():
+    return bool(os.environ.get("DISPLAY")) or sys.platform in ("win32", "darwin")
+
+
+# -------------------- Tk scripts --------------------
+
+class FakeWidget:
+    """Stands in for a Tk widget when there is no display; every method
+    call is accepted and does nothing."""
+
+    def __init__(self, *args, **options):
+        self.options = options
+
+    def config(self, **options):
+        self.options.update(options)
+
+    configure = config
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeRoot(FakeWidget):
+    def after(self, ms, fn=None, *args):
+        return None  # update checks and timers never fire in a benchmark
+
+
+def load_app(script):
+    """Run a Tk script up to its mainloop and return its globals, so the
+    functions behind its buttons can be called directly. Dialogs answer
+    no at once instead of waiting for a click."""
+    import tkinter
+    from tkinter import messagebox
+    for name in DIALOGS:
+        setattr(messagebox, name, lambda *args, **kwargs: False)
+    tkinter.Misc.mainloop = lambda self, n=0: None
+    if not has_display():
+        tkinter._default_root = tkinter.Tcl()  # Tk variables work without a display
+        tkinter.Tk = FakeRoot
+        for name in WIDGETS:
+            setattr(tkinter, name, FakeWidget)
+    with open(script, encoding="utf-8") as f:
+        code = compile(f.read(), script, "exec")
+    namespace = {"__name__": "__app__", "__file__": os.path.abspath(script)}
+    exec(code, namespace)
+    return namespace
+
+
+# -------------------- Synthetic inputs --------------------
+
+LOG_LINE = b"2025-06-29 12:00:00,123 INFO [worker-7] request %08x handled in %dms path=/api/v1/items\n"
+OPS = "+-*/"
+
+
+def log_file(path, size, rng):
+    """A log file of about `size` bytes, written a repeated block at a time."""
+    block = b"".join(LOG_LINE % (rng.getrandbits(32), rng.randrange(100)) for _ in range(10000))
+    with open(path, "wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+        f.write(block[:size % len(block)].rpartition(b"\n")[0] + b"\n")
+    return path
+
+
+def expressions(size, rng):
+    """Calculator expressions adding up to about `size` characters."""
+    exprs, total = [], 0
+    while total < size:
+        parts = [str(rng.randint(1, 999))]
+        for _ in range(rng.randint(1, 7)):
+            parts += [rng.choice(OPS), str(rng.randint(1, 999)) if rng.random() < 0.7 else f"{rng.uniform(1, 99):.3f}"]
+        exprs.append("".join(parts))
+        total += len(exprs[-1])
+    return exprs
+
+
+def password_file(path, size):
+    from passgen_bulk import generate_stream
+    with open(path, "wb") as f:
+        for chunk in generate_stream(max(1, size // 13), length=12):
+            f.write(chunk)
+    return path
+
+
+# -------------------- Calculators --------------------
+
+@case("calc.calculate", max_size=4 * 1024 ** 2)
+def calc_calculate(size, tmp):
+    # The smart calculator's "=": history lookup, evaluation, history record
+    app = load_app("smart_app.py")
+    exprs = expressions(size, random.Random(1))
+    start = time.perf_counter()  # once: a second pass would come from the history cache
+    for e in exprs:
+        app["calculate"](e)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "exprs_per_s": len(exprs) / seconds}
+
+
+@case("calc.keypress", max_size=64 * 1024)
+def calc_keypress(size, tmp):
+    # Typing an expression key by key, live preview included, then "="
+    app = load_app("smart_app.py")
+    text = "+".join(expressions(size, random.Random(2)))[:size].rstrip(OPS + ".")
+    keys = []
+
+    def run():
+        app["clear"]()
+        for key in text:
+            start = time.perf_counter()
+            app["press"](key)
+            keys.append(time.perf_counter() - start)
+    seconds = timed(run, size)
+    start = time.perf_counter()
+    app["equal"]()
+    keys.sort()
+    return {"seconds": seconds, "key_median_us": keys[len(keys) // 2] * 1e6,
+            "key_p95_us": keys[int(len(keys) * 0.95)] * 1e6, "equal_s": time.perf_counter() - start}
+
+
+@case("calc.evaluate_many", max_size=64 * 1024 ** 2)
+def calc_evaluate_many(size, tmp):
+    from calc_engine import evaluate_many
+    values = [i * 0.001 for i in range(max(1, size // 8))]
+    return {"seconds": timed(lambda: evaluate_many("x*x + 2*x - sqrt(x) / 3", values), size)}
+
+
+# -------------------- Password generators --------------------
+
+@case("passgen.generate")
+def passgen_generate(size, tmp):
+    # The Generate Password button, without and with a policy
+    app = load_app("passgen.py")
+    app["length_var"].set("16")
+    plain = timed(lambda: [app["generate_password"]() for _ in range(1000)])
+    app["require_var"].set(True)
+    app["ambiguous_var"].set(True)
+    policy = timed(lambda: [app["generate_password"]() for _ in range(1000)])
+    return {"seconds": plain / 1000, "policy_s": policy / 1000}
+
+
+@case("passgen.strength", max_size=16 * 1024 ** 2)
+def passgen_strength(size, tmp):
+    # Strength shown for a new password, checked against a breach index
+    # built from a `size` byte word list
+    from passgen_breach import DEFAULT_INDEX, build_index
+    count = build_index(password_file(os.path.join(tmp, "breached.txt"), size), DEFAULT_INDEX)
+    app = load_app("passgen.py")
+    start = time.perf_counter()
+    app["update_strength"]("first")  # opens the index
+    first = time.perf_counter() - start
+    words = [f"Password{i}!" for i in range(1000)]
+    seconds = timed(lambda: [app["update_strength"](w) for w in words])
+    return {"seconds": seconds / len(words), "first_s": first, "index_entries": count}
+
+
+@case("passgen.bulk", max_size=UNITS["G"])
+def passgen_bulk(size, tmp):
+    from passgen_bulk import generate_stream
+    count = max(1, size // 17)
+
+    def run(workers):
+        for _ in generate_stream(count, length=16, workers=workers):
+            pass
+    result = {"seconds": timed(lambda: run(0), size)}
+    if size >= UNITS["M"]:
+        result["parallel_s"] = timed(lambda: run(os.cpu_count()), size)
+    return result
+
+
+@case("passgen.score_file", max_size=UNITS["G"])
+def passgen_score_file(size, tmp):
+    from passgen_strength import score_file
+    path = password_file(os.path.join(tmp, "passwords.txt"), size)
+
+    def run():
+        with open(path, "rb") as f:
+            for _ in score_file(f):
+                pass
+    return {"seconds": timed(run, size)}
+
+
+# -------------------- Serpad --------------------
+
+def open_log(size, tmp):
+    from piece_table import PieceTable
+    return PieceTable.open(log_file(os.path.join(tmp, "big.log"), size, random.Random(3)))
+
+
+def edit(doc, rng, count=5):
+    for _ in range(count):
+        doc.insert(doc.line_start(rng.randrange(doc.line_count(estimate=True))), b"edited\n")
+
+
+@case("serpad.open", max_size=UNITS["G"])
+def serpad_open(size, tmp):
+    # Opening a file: map it and read the lines of the first screen
+    from piece_table import PieceTable
+    from viewport import WINDOW_LINES
+    path = log_file(os.path.join(tmp, "big.log"), size, random.Random(3))
+
+    def run():
+        doc = PieceTable.open(path)
+        doc.read(0, doc.line_start(WINDOW_LINES))
+        doc.close()
+    return {"seconds": timed(run, size)}
+
+
+@case("serpad.save", max_size=UNITS["G"])
+def serpad_save(size, tmp):
+    # A save after a few edits (journaled), and a full rewrite as done when
+    # the journal is folded into the file
+    import threading
+    from journal import Journal
+    from serpad_io import write_temp
+    doc = open_log(size, tmp)
+    rng = random.Random(4)
+    journal = Journal.start(doc, doc.path)
+    saves = []
+    for _ in range(20):
+        edit(doc, rng)
+        start = time.perf_counter()
+        journal.append(doc.snapshot(), len(doc.added), doc.version)
+        saves.append(time.perf_counter() - start)
+    journal.discard()
+
+    def rewrite():
+        snapshot = doc.snapshot()
+        tmp_path = write_temp(doc.path + ".new", doc.chunks(snapshot=snapshot), snapshot[1],
+                              lambda done, total: None, threading.Event())
+        os.remove(tmp_path)
+    result = {"seconds": statistics.median(saves), "journal_kb": journal.size / 1e3,
+              "rewrite_s": timed(rewrite, size)}
+    doc.close()
+    return result
+
+
+@case("serpad.replace_all", max_size=UNITS["G"])
+def serpad_replace_all(size, tmp):
+    # Replace All of a term on about one line in 256, as one edit
+    from find_engine import compile_search, replace_spans
+    doc = open_log(size, tmp)
+    pattern = compile_search("request 00")
+    before = doc.snapshot()
+    spans = []
+
+    def run():
+        doc.restore(before)
+        spans[:] = replace_spans(doc, pattern, "request 11")
+        doc.replace_spans(spans)
+    result = {"seconds": timed(run, size), "matches": len(spans)}
+    doc.close()
+    return result
+
+
+@case("serpad.undo", max_size=UNITS["G"])
+def serpad_undo(size, tmp):
+    # Undo and redo of a Replace All recorded in the undo history, with the
+    # delta written to its log as on a save
+    from find_engine import compile_search, replace_spans
+    from undo_history import UndoHistory, fingerprint
+    doc = open_log(size, tmp)
+    spans = replace_spans(doc, compile_search("request 00"), "request 11")
+    history = UndoHistory(os.path.join(tmp, "big.undo"))
+    start = time.perf_counter()
+    read = doc.reader()
+    history.record_spans([(at, read(at, end), data) for at, end, data in spans])
+    recorded = time.perf_counter() - start
+    doc.replace_spans(spans)
+    history.saved_at(history.current, fingerprint(doc), history.log)
+
+    def run():
+        history.undo(doc)
+        history.redo(doc)
+    result = {"seconds": timed(run, size), "record_s": recorded, "matches": len(spans),
+              "log_mb": history.written / 1e6}
+    history.close()
+    doc.close()
+    return result
+
+
+@case("serpad.find_in_files", max_size=UNITS["G"])
+def serpad_find_in_files(size, tmp):
+    # Find in Files over a tree of logs adding up to `size`, on every core
+    from find_engine import compile_search
+    from project_search import WORKERS, compile_literal, search_tree
+    root = os.path.join(tmp, "tree")
+    rng = random.Random(3)
+    for i in range(max(1, size // (256 * 1024))):
+        os.makedirs(os.path.join(root, f"d{i % 16}"), exist_ok=True)
+        log_file(os.path.join(root, f"d{i % 16}", f"{i}.log"), min(size, 256 * 1024), rng)
+    pattern = compile_search("request 00")
+    literal = compile_literal("request 00")
+    found = []
+
+    def run():
+        found.clear()
+        search_tree(root, pattern, literal, found.append, WORKERS)
+    return {"seconds": timed(run, size), "files": len(found), "workers": WORKERS}
+
+
+@case("serpad.backup", max_size=UNITS["G"])
+def serpad_backup(size, tmp):
+    # The first auto backup of a file stores all of it; later ones only
+    # what changed
+    from backup_store import BackupStore
+    doc = open_log(size, tmp)
+    store = BackupStore(os.path.join(tmp, "store"))
+    start = time.perf_counter()
+    store.backup(doc, doc.snapshot(), doc.path, now=1)
+    first = time.perf_counter() - start
+    edit(doc, random.Random(5))
+    start = time.perf_counter()
+    store.backup(doc, doc.snapshot(), doc.path, now=2)
+    result = {"seconds": time.perf_counter() - start, "first_s": first,
+              "disk_mb": store.disk_usage() / 1e6}
+    doc.close()
+    return result
+
+
+@case("serpad.view", max_size=UNITS["G"])
+def serpad_view(size, tmp):
+    # Rendering the viewport window around the middle of the file
+    if not has_display():
+        return {"skipped": "no display"}
+    import tkinter as tk
+    from viewport import TextViewport
+    doc = open_log(size, tmp)
+    root = tk.Tk()
+    view = TextViewport(root, doc)
+    view.pack()
+    seconds = timed(lambda: (view.show(len(doc) // 2, render=True), root.update()), size)
+    root.destroy()
+    doc.close()
+    return {"seconds": seconds}
+
+
+# -------------------- Running --------------------
+
+def run_case(name, size):
+    """Child process: run one case here and print its result as JSON."""
+    fn, _ = CASES[name]
+    sys.path.insert(0, os.getcwd())
+    with tempfile.TemporaryDirectory(dir=os.environ["HOME"]) as tmp:
+        result = fn(size, tmp)
+    result["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    print(json.dumps(result))
+
+
+def spawn(name, size, env):
+    folder = os.path.join(ROOT, FOLDERS[name.split(".")[0]])
+    with tempfile.TemporaryDirectory() as home:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", name, str(size)],
+                              cwd=folder, env={**env, "HOME": home}, capture_output=True, text=True)
+    if proc.returncode:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def start_xvfb(env):
+    """Start an Xvfb server for the Tk cases if there is no display; the
+    process, or None."""
+    if has_display() or not shutil.which("Xvfb"):
+        return None
+    display = f":{90 + os.getpid() % 100}"
+    xvfb = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    env["DISPLAY"] = display
+    return xvfb
+
+
+def commit():
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return head + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def regressions(result, base, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """What got worse in `result` compared with `base`, as text."""
+    found = []
+    old, new = base.get("seconds"), result.get("seconds")
+    if old and new and new - old > max(TIME_FLOOR, old * time_tolerance):
+        found.append(f"time {old:.4g} s -> {new:.4g} s")
+    old, new = base.get("rss_mb"), result.get("rss_mb")
+    if old and new and new - old > max(MEMORY_FLOOR, old * memory_tolerance):
+        found.append(f"memory {old:.0f} MB -> {new:.0f} MB")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every tool and compare with earlier results.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"input sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--cases", default="", help="comma-separated case names or prefixes (default: all)")
+    parser.add_argument("-o", "--output", help="result file (default: bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE,
+                        help=f"allowed slowdown as a fraction (default: {TIME_TOLERANCE})")
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE,
+                        help=f"allowed memory growth as a fraction (default: {MEMORY_TOLERANCE})")
+    parser.add_argument("--run", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.run:
+        run_case(args.run[0], int(args.run[1]))
+        return 0
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    wanted = [c for c in args.cases.split(",") if c]
+    names = [n for n in CASES if not wanted or any(n == c or n.startswith(c.rstrip(".") + ".") for c in wanted)]
+    base = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = {(r["case"], r["size"]): r for r in json.load(f)["results"]}
+
+    env = dict(os.environ)
+    xvfb = start_xvfb(env)
+    report = {"commit": commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "platform": platform.platform(), "cpus": os.cpu_count(), "results": []}
+    worse = []
+    try:
+        for name in names:
+            _, max_size = CASES[name]
+            for size in ([0] if max_size is None else [s for s in sizes if s <= max_size]):
+                result = {"case": name, "size": size, **spawn(name, size, env)}
+                report["results"].append(result)
+                label = f"{name:<22}{format_size(size) if size else '':>6}"
+                if "error" in result or "skipped" in result:
+                    print(f"{label}   {result.get('error') or 'skipped: ' + result['skipped']}")
+                    continue
+                found = regressions(result, base.get((name, size), {}), args.time_tolerance,
+                                    args.memory_tolerance)
+                worse += [f"{name} {format_size(size)}: {f}" for f in found]
+                print(f"{label}  {result['seconds']:10.4g} s  {result['rss_mb']:7.0f} MB"
+                      + ("   REGRESSION" if found else ""))
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"results written to {output}")
+    for line in worse:
+        print(f"regression: {line}")
+    failed = any("error" in r for r in report["results"])
+    return 1 if worse or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())